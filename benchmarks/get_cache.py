@@ -0,0 +1,100 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+# how long get_cache takes against a db that answers every round trip after `latency` seconds, from the repo root:
+#   python -m benchmarks.get_cache [guilds] [latency] [per_doc]
+# loads one collection after the other (like before), all of them at once, and from a snapshot.
+
+import asyncio
+import copy
+import os
+import random
+import sys
+import tempfile
+import time
+
+from tests.memory_db import MemoryDatabase
+from utils.bot import EpicBot
+from utils.migrations import default_guild_config, default_user_profile, stamp
+
+
+def make_db(guilds: int, latency: float, per_doc: float) -> MemoryDatabase:
+    rng = random.Random(0)
+    db = MemoryDatabase(latency, per_doc)
+    for i in range(guilds):
+        guild_id = rng.getrandbits(63)
+        db['prefixes'].docs.append(stamp("prefixes", {"_id": guild_id, "prefix": ["e!"]}))
+        db['serverconfig'].docs.append(stamp("serverconfig", default_guild_config(guild_id)))
+        for _ in range(20):
+            db['leveling'].docs.append({"id": rng.getrandbits(63), "guild_id": guild_id, "xp": rng.randrange(10 ** 6), "messages": rng.randrange(10 ** 4)})
+    for _ in range(guilds * 5):
+        db['user_profile'].docs.append(stamp("user_profile", default_user_profile(rng.getrandbits(63))))
+    db['reminders'].docs.extend({"_id": str(i), "user_id": i, "time": 0, "set_time": 0, "reminder": "hi"} for i in range(guilds // 10))
+    db['blacklisted'].docs.extend({"_id": i, "reason": "spam"} for i in range(guilds // 100))
+    return db
+
+
+def make_bot(db) -> EpicBot:
+    # everything the cache loading needs, without EpicBot.__init__ connecting and loading the cogs
+    bot = EpicBot.__new__(EpicBot)
+    bot.shard_ids = None
+    bot.shard_count = 1
+    bot.cluster_id = None
+    bot.cluster_count = 1
+    bot.loop = asyncio.get_running_loop()
+    bot.init_caches(db)
+    return bot
+
+
+async def load_sequentially(bot):
+    for loader in (
+        bot.load_prefixes, bot.load_serverconfig, bot.load_reminders,
+        bot.load_leveling, bot.load_user_profiles, bot.get_blacklisted_users
+    ):
+        await loader()
+    await bot.replay_journal()
+
+
+async def main(guilds: int, latency: float, per_doc: float):
+    db = make_db(guilds, latency, per_doc)
+    print(f"{guilds} guilds, {len(db['leveling'].docs)} leveling rows, {latency * 1000}ms per round trip + {per_doc * 1e6}us per document")
+    results = {}
+    for name in ("sequential", "concurrent", "snapshot"):
+        bot = make_bot(copy.deepcopy(db))
+        start = time.perf_counter()
+        if name == "sequential":
+            await load_sequentially(bot)
+        else:
+            await bot.get_cache(use_snapshot=name == "snapshot")
+        results[name] = time.perf_counter() - start
+        if name == "concurrent":
+            await bot.save_snapshot()
+        while bot.reconciling:
+            await asyncio.sleep(0.01)
+        bot.journal.close()
+    print()
+    for name, took in results.items():
+        print(f"{name:<12} {took:7.3f}s  ({results['sequential'] / took:.1f}x)")
+
+
+if __name__ == '__main__':
+    guilds = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.005
+    per_doc = float(sys.argv[3]) if len(sys.argv) > 3 else 0.00002
+    # the journal and the snapshot go to the current directory, keep them out of the repo
+    os.chdir(tempfile.mkdtemp())
+    asyncio.run(main(guilds, latency, per_doc))
@@ -0,0 +1,57 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+# the old level loop against utils.levels, from the repo root:
+#   python -m benchmarks.levels
+
+import random
+import timeit
+
+from utils.levels import level_for_xp, progress_in_level
+
+
+def old_get_level(xp):
+    lvl = 0
+    while True:
+        if xp < ((50 * (lvl ** 2)) + 50 * lvl):
+            break
+        lvl += 1
+    return lvl
+
+
+def old_progress(xp):
+    lvl = old_get_level(xp)
+    return xp - ((50 * ((lvl - 1) ** 2)) + (50 * (lvl - 1))), int(200 * ((1 / 2) * lvl))
+
+
+def bench(name, func, values, number=5):
+    took = min(timeit.repeat(lambda: [func(xp) for xp in values], number=number, repeat=3)) / number
+    print(f"{name:<28} {took * 1000:9.2f}ms for {len(values)} values ({took / len(values) * 1e9:8.0f}ns each)")
+    return took
+
+
+if __name__ == '__main__':
+    rng = random.Random(0)
+    # roughly what the leaderboards look like: most people low, a few very active ones
+    for label, top in (("casual (xp < 10k)", 10 ** 4), ("active (xp < 1M)", 10 ** 6), ("whales (xp < 100M)", 10 ** 8)):
+        values = [rng.randrange(top) for _ in range(2000)]
+        print(label)
+        old = bench("  old get_level loop", old_get_level, values)
+        new = bench("  level_for_xp", level_for_xp, values)
+        bench("  old rank card progress", old_progress, values)
+        bench("  progress_in_level", progress_in_level, values)
+        print(f"  {old / new:.1f}x faster")
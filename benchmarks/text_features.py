@@ -0,0 +1,124 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+# the per-check scans automod and global chat did on every message against utils.text_features, from the repo root:
+#   python -m benchmarks.text_features
+
+import random
+import re
+import timeit
+import urllib.parse
+
+from collections import Counter
+
+import emojis
+
+from utils.text_features import TextFeatures
+
+zalgo_regex = re.compile(r"%CC%", re.MULTILINE)
+
+
+def old_checks(content):
+    # caps, duplicate text and zalgo from automod, then the language and spam checks of global chat,
+    # each one going over the whole message again
+    upper_count = 0
+    for h in content:
+        if h.isupper():
+            upper_count += 1
+    upper = upper_count / len(content)
+
+    duplicate = False
+    for c, n in Counter(content.lower()).most_common(None):
+        if c != ' ' and len(content) / n < 9:
+            duplicate = True
+            break
+
+    zalgo = bool(zalgo_regex.search(urllib.parse.quote(content.encode("utf-8"))))
+
+    try:
+        emojis.decode(content).encode(encoding='utf-8').decode('ascii')
+        english = True
+    except UnicodeDecodeError:
+        english = False
+
+    spam = False
+    if len(content) > 150:
+        for c, n in Counter(content.lower()).most_common(None):
+            if c != ' ' and len(content) / n < 8:
+                spam = True
+                break
+    return upper, duplicate, zalgo, english, spam
+
+
+def new_checks(content):
+    f = TextFeatures(content)
+    duplicate = f.max_char_count > 0 and f.length / f.max_char_count < 9
+    spam = f.length > 150 and f.max_char_count > 0 and f.length / f.max_char_count < 8
+    return f.upper_ratio, duplicate, f.combining_marks > 0, not f.non_ascii_text, spam
+
+
+WORDS = (
+    "the a to and you i it is that of in for on lol lmao bruh ok yeah no what why how when this "
+    "game play bot server discord help pls thanks gg wp nice cool idk tbh imo ngl fr"
+).split()
+
+
+def corpus(n, rng):
+    # roughly what a busy server looks like: mostly short chatter, some shouting, emojis,
+    # mentions, other languages and the occasional wall of spam or zalgo
+    out = []
+    for _ in range(n):
+        kind = rng.random()
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randrange(1, 25)))
+        if kind < 0.10:
+            text = text.upper()
+        elif kind < 0.20:
+            text += " " + "😂" * rng.randrange(1, 6) + " <:pog:123456789012345678>"
+        elif kind < 0.25:
+            text = "<@123456789012345678> " + text + " @here"
+        elif kind < 0.30:
+            text = "こんにちは " + text + " café"
+        elif kind < 0.33:
+            text = rng.choice("abcxyz!") * rng.randrange(150, 2000)
+        elif kind < 0.35:
+            text = "".join(c + "̤͔ͧ̑" for c in text)
+        elif kind < 0.45:
+            text = " ".join(text for _ in range(rng.randrange(4, 20)))
+        out.append(text)
+    return out
+
+
+def bench(name, func, values, number=5):
+    took = min(timeit.repeat(lambda: [func(content) for content in values], number=number, repeat=3)) / number
+    print(f"{name:<28} {took * 1000:9.2f}ms for {len(values)} messages ({took / len(values) * 1e6:8.2f}us each)")
+    return took
+
+
+if __name__ == '__main__':
+    rng = random.Random(0)
+    messages = corpus(5000, rng)
+    mismatches = sum(old_checks(m) != new_checks(m) for m in messages)
+    print(f"{len(messages)} messages, {sum(map(len, messages)) // len(messages)} characters on average, {mismatches} different results")
+    old = bench("old per-check scans", old_checks, messages)
+    new = bench("TextFeatures", new_checks, messages)
+    print(f"{old / new:.1f}x faster")
+    for label, top in (("short (< 100 chars)", 100), ("long (>= 500 chars)", None)):
+        subset = [m for m in messages if (len(m) < top if top else len(m) >= 500)]
+        print(label)
+        old = bench("  old per-check scans", old_checks, subset)
+        new = bench("  TextFeatures", new_checks, subset)
+        print(f"  {old / new:.1f}x faster")
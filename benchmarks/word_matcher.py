@@ -0,0 +1,96 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+# the old banned word loops against utils.word_matcher for growing word lists, from the repo root:
+#   python -m benchmarks.word_matcher
+# the list size where the automaton starts winning is roughly what AUTOMOD_AUTOMATON_MIN_WORDS should be.
+# on the realistic mix it just about breaks even around 100 words and is well ahead by 150, while on
+# the rare very long messages 150 is still close to even, that margin is why the threshold isn't lower.
+
+import random
+import timeit
+
+from config import AUTOMOD_AUTOMATON_MIN_WORDS, DEFAULT_BANNED_WORDS
+from utils.word_matcher import WordMatcher
+
+
+def old_find(words, content):
+    # automod's loop, lowering the message again for every word
+    for w in words:
+        if w in content.lower():
+            return w
+    return None
+
+
+def word_list(n, rng):
+    # the default words and then made up ones, like a guild's custom list
+    words = list(DEFAULT_BANNED_WORDS)[:n]
+    while len(words) < n:
+        words.append("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randrange(4, 10))))
+    return words
+
+
+def messages(n, length, rng):
+    # normal chat, nearly all of it clean, so the loops usually have to go through every word
+    words = "the a to and you i it is that of in for on lol lmao bruh ok yeah what why this game play bot server help pls gg nice".split()
+    return [" ".join(rng.choice(words) for _ in range(rng.randrange(max(1, length // 2), length * 3 // 2 + 1))) for _ in range(n)]
+
+
+def bench(func, values, number=3):
+    return min(timeit.repeat(lambda: [func(content) for content in values], number=number, repeat=3)) / number
+
+
+def mixed(n, rng):
+    # how long messages really are: mostly a few words, some sentences, rarely a wall of text
+    out = []
+    for length, share in ((5, 0.6), (25, 0.3), (100, 0.08), (300, 0.02)):
+        out += messages(round(n * share), length, rng)
+    return out
+
+
+def compare(corpus):
+    lowered = [content.lower() for content in corpus]
+    print(f"{len(corpus)} clean messages, {sum(map(len, corpus)) // len(corpus)} characters on average")
+    print(f"{'words':>6} {'old loop':>12} {'substring':>12} {'automaton':>12}  automaton vs substring")
+    crossover = None
+    for n in (10, 25, 50, 75, 100, 125, 150, 200, 300, 500, 1000):
+        words = word_list(n, random.Random(n))
+        plain = WordMatcher(words, automaton_min_words=n + 1)
+        automaton = WordMatcher(words, automaton_min_words=0)
+        old = bench(lambda content: old_find(words, content), corpus)
+        sub = bench(plain.find, lowered)
+        auto = bench(automaton.find, lowered)
+        if auto >= sub:
+            crossover = None
+        elif crossover is None:
+            crossover = n
+        print(
+            f"{n:>6} {old / len(corpus) * 1e6:>10.2f}us {sub / len(corpus) * 1e6:>10.2f}us {auto / len(corpus) * 1e6:>10.2f}us"
+            f"  {sub / auto:.2f}x"
+        )
+    print(f"the automaton wins from {crossover} words on\n")
+    return crossover
+
+
+if __name__ == '__main__':
+    rng = random.Random(0)
+    # the substring checks run in C, so the longer the message the more words it takes for the automaton to win
+    for length in (5, 25, 100, 300):
+        compare(messages(500, length, rng))
+    print("a realistic mix of the above")
+    crossover = compare(mixed(2000, rng))
+    print(f"AUTOMOD_AUTOMATON_MIN_WORDS is {AUTOMOD_AUTOMATON_MIN_WORDS}, the mix says {crossover}")
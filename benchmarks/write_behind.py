@@ -0,0 +1,87 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+# the server config cache before and after it was keyed by guild id and got change tracking, from the repo root:
+#   python -m benchmarks.write_behind [configs]
+# the flush times are only building the updates, the saving is mostly in how many of them go to the db
+
+import random
+import sys
+import time
+
+from pymongo import UpdateOne
+from utils.migrations import default_guild_config
+from utils.write_behind import DirtyTracker
+
+
+def timed(func, number=1):
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - start) / number
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    rng = random.Random(0)
+    configs = [default_guild_config(rng.getrandbits(63)) for _ in range(count)]
+    by_id = {e['_id']: e for e in configs}
+    lookups = [rng.choice(configs)['_id'] for _ in range(200)]
+    fields = [k for k in configs[0] if k != "_id"]
+
+    def old_lookup():
+        for guild_id in lookups:
+            for e in configs:
+                if e['_id'] == guild_id:
+                    break
+
+    def new_lookup():
+        for guild_id in lookups:
+            by_id.get(guild_id)
+
+    old = timed(old_lookup)
+    new = timed(new_lookup, 100)
+    print(f"get_guild_config, {count} configs: {old / len(lookups) * 1e6:.1f}us -> {new / len(lookups) * 1e6:.3f}us per lookup")
+
+    def old_flush():
+        return [UpdateOne({"_id": e['_id']}, {"$set": {k: e[k] for k in fields}}, upsert=True) for e in configs]
+
+    tracker = DirtyTracker("serverconfig")
+    for e in configs:
+        tracker.seed(e['_id'], {k: e[k] for k in fields})
+
+    def new_flush():
+        tracker.start_flush()
+        out = []
+        for e in configs:
+            update = tracker.diff(e['_id'], {k: e[k] for k in fields})
+            if update is not None:
+                out.append(UpdateOne({"_id": e['_id']}, update, upsert=True))
+        tracker.end_flush()
+        return out
+
+    old = timed(old_flush, 3)
+    print(f"flush, everything: {len(old_flush())} UpdateOnes built in {old * 1000:.1f}ms")
+    for percent in (0, 1, 10):
+        def touch():
+            for e in rng.sample(configs, count * percent // 100):
+                e['disabled_cmds'] = e['disabled_cmds'] + ["ping"]
+        touch()
+        start = time.perf_counter()
+        written = len(new_flush())
+        took = time.perf_counter() - start
+        print(f"flush, {percent}% changed: {written} UpdateOnes built in {took * 1000:.1f}ms")
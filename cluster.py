@@ -0,0 +1,135 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+# runs the bot as several processes, each one with its own range of shards:
+#   python cluster.py --clusters 4 --shards 16
+# and locally without discord or the db, to check the shard split and the ipc:
+#   python cluster.py --clusters 3 --shards 8 --fake-gateway
+
+import argparse
+import asyncio
+import multiprocessing
+import random
+import signal
+
+from config import SHARD_COUNT, CLUSTER_COUNT, CLUSTER_IPC_HOST, CLUSTER_IPC_PORT, SHUTDOWN_TIMEOUT
+from utils.cluster import ClusterClient, ClusterHub, shard_id_for, split_shards
+
+
+def run_worker(cluster_id, shard_ids, shard_count, cluster_count, guilds):
+    from config import BOT_TOKEN, BOT_TOKEN_BETA
+    from main import create_client
+
+    client = create_client(shard_ids=shard_ids, shard_count=shard_count, cluster_id=cluster_id, cluster_count=cluster_count)
+    client.run(BOT_TOKEN if not client.beta else BOT_TOKEN_BETA)
+
+
+def run_fake_worker(cluster_id, shard_ids, shard_count, cluster_count, guilds):
+    asyncio.run(fake_worker(cluster_id, shard_ids, shard_count, cluster_count, guilds))
+
+
+async def fake_worker(cluster_id, shard_ids, shard_count, cluster_count, guilds):
+    # instead of the gateway: the same `guilds` made up guild ids in every worker, each one keeps
+    # the ones on its shards and then talks to the others the way the real bot does
+    events = []
+    ipc = ClusterClient(cluster_id, cluster_count, CLUSTER_IPC_HOST, CLUSTER_IPC_PORT, lambda event, data: events.append(event))
+    rng = random.Random(0)
+    mine = [g for g in (rng.getrandbits(63) for _ in range(guilds)) if shard_id_for(g, shard_count) in shard_ids]
+
+    async def stats(data=None):
+        return {"cluster": cluster_id, "shards": shard_ids, "guilds": len(mine)}
+    ipc.handlers["stats"] = stats
+
+    task = asyncio.ensure_future(ipc.run())
+    await ipc.connected.wait()
+    await asyncio.sleep(1)  # everyone else connecting
+
+    ipc.send("blacklist_add", {"_id": cluster_id, "reason": "fake gateway"})
+    ipc.send("global_chat", {"content": f"hello from cluster {cluster_id}", "channel_id": cluster_id})
+    replies = await ipc.request("stats")
+    await asyncio.sleep(1)
+
+    print(
+        f"[cluster {cluster_id}] shards {shard_ids}: {len(mine)}/{guilds} guilds, "
+        f"{len(replies)}/{cluster_count - 1} clusters answered stats ({sum(r['guilds'] for r in replies) + len(mine)} guilds in total), "
+        f"got {events.count('cluster_blacklist_add')} blacklist and {events.count('cluster_global_chat')} global chat messages"
+    )
+    ipc.close()
+    task.cancel()
+
+
+async def launch(args):
+    layout = split_shards(args.shards, args.clusters)
+    if not all(layout):
+        raise SystemExit(f"Can't split {args.shards} shards across {args.clusters} clusters.")
+
+    hub = ClusterHub(CLUSTER_IPC_HOST, CLUSTER_IPC_PORT)
+    await hub.start()
+
+    mp = multiprocessing.get_context("spawn")
+    target = run_fake_worker if args.fake_gateway else run_worker
+
+    def spawn(cluster_id):
+        p = mp.Process(
+            target=target, name=f"cluster-{cluster_id}",
+            args=(cluster_id, layout[cluster_id], args.shards, args.clusters, args.guilds)
+        )
+        p.start()
+        print(f"Started cluster {cluster_id} with shards {layout[cluster_id]} (pid {p.pid})")
+        return p
+
+    processes = {i: spawn(i) for i in range(args.clusters)}
+
+    loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except NotImplementedError:
+            pass  # windows
+
+    while processes and not stopping.is_set():
+        for cluster_id, p in list(processes.items()):
+            if p.is_alive():
+                continue
+            if args.fake_gateway:
+                del processes[cluster_id]
+                continue
+            print(f"Cluster {cluster_id} exited with code {p.exitcode}, restarting it")
+            processes[cluster_id] = spawn(cluster_id)
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=1)
+        except asyncio.TimeoutError:
+            pass
+
+    # SIGTERM makes every worker flush its caches (EpicBot.close), they get as long as that's allowed to take
+    for p in processes.values():
+        p.terminate()
+    for cluster_id, p in processes.items():
+        await loop.run_in_executor(None, p.join, SHUTDOWN_TIMEOUT + 10)
+        if p.is_alive():
+            print(f"Cluster {cluster_id} didn't stop in time, killing it")
+            p.kill()
+    await hub.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run EpicBot as several processes.")
+    parser.add_argument("--clusters", type=int, default=CLUSTER_COUNT, help="the number of worker processes")
+    parser.add_argument("--shards", type=int, default=SHARD_COUNT, help="the total number of shards")
+    parser.add_argument("--fake-gateway", action="store_true", help="don't connect to discord or the db, just test the clustering")
+    parser.add_argument("--guilds", type=int, default=1000, help="how many guilds the fake gateway makes up")
+    asyncio.run(launch(parser.parse_args()))
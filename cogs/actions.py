@@ -76,6 +76,7 @@ class actions(commands.Cog, description="Interact with someone, UwU!~"):
         if user is not None and user != ctx.author:
             p = await self.client.get_user_profile_(user.id)
             p.update({"bites": p['bites'] + 1})
+            self.client.journal.mark("user_profile", p['_id'], "bites")
         else:
             p = None
         if user:
@@ -106,6 +107,7 @@ class actions(commands.Cog, description="Interact with someone, UwU!~"):
         if user is not None and user != ctx.author:
             p = await self.client.get_user_profile_(user.id)
             p.update({"cuddles": p['cuddles'] + 1})
+            self.client.journal.mark("user_profile", p['_id'], "cuddles")
         else:
             p = None
         if user:
@@ -136,6 +138,7 @@ class actions(commands.Cog, description="Interact with someone, UwU!~"):
         if user is not None and user != ctx.author:
             p = await self.client.get_user_profile_(user.id)
             p.update({"winks": p['winks'] + 1})
+            self.client.journal.mark("user_profile", p['_id'], "winks")
         else:
             p = None
         if user:
@@ -166,6 +169,7 @@ class actions(commands.Cog, description="Interact with someone, UwU!~"):
         if user is not None and user != ctx.author:
             p = await self.client.get_user_profile_(user.id)
             p.update({"hugs": p['hugs'] + 1})
+            self.client.journal.mark("user_profile", p['_id'], "hugs")
         else:
             p = None
         if user:
@@ -196,6 +200,7 @@ class actions(commands.Cog, description="Interact with someone, UwU!~"):
         if user is not None and user != ctx.author:
             p = await self.client.get_user_profile_(user.id)
             p.update({"kisses": p['kisses'] + 1})
+            self.client.journal.mark("user_profile", p['_id'], "kisses")
         else:
             p = None
         if user:
@@ -226,6 +231,7 @@ class actions(commands.Cog, description="Interact with someone, UwU!~"):
         if user is not None and user != ctx.author:
             p = await self.client.get_user_profile_(user.id)
             p.update({"pats": p['pats'] + 1})
+            self.client.journal.mark("user_profile", p['_id'], "pats")
         else:
             p = None
         if user:
@@ -256,6 +262,7 @@ class actions(commands.Cog, description="Interact with someone, UwU!~"):
         if user is not None and user != ctx.author:
             p = await self.client.get_user_profile_(user.id)
             p.update({"slaps": p['slaps'] + 1})
+            self.client.journal.mark("user_profile", p['_id'], "slaps")
         else:
             p = None
         if user:
@@ -286,6 +293,7 @@ class actions(commands.Cog, description="Interact with someone, UwU!~"):
         if user is not None and user != ctx.author:
             p = await self.client.get_user_profile_(user.id)
             p.update({"tickles": p['tickles'] + 1})
+            self.client.journal.mark("user_profile", p['_id'], "tickles")
         else:
             p = None
         if user:
@@ -316,6 +324,7 @@ class actions(commands.Cog, description="Interact with someone, UwU!~"):
         if user is not None and user != ctx.author:
             p = await self.client.get_user_profile_(user.id)
             p.update({"licks": p['licks'] + 1})
+            self.client.journal.mark("user_profile", p['_id'], "licks")
         else:
             p = None
         if user:
@@ -346,6 +355,7 @@ class actions(commands.Cog, description="Interact with someone, UwU!~"):
         if user is not None and user != ctx.author:
             p = await self.client.get_user_profile_(user.id)
             p.update({"feeds": p['feeds'] + 1})
+            self.client.journal.mark("user_profile", p['_id'], "feeds")
         else:
             p = None
         if user:
@@ -379,6 +389,7 @@ class actions(commands.Cog, description="Interact with someone, UwU!~"):
             user_mention = None
         p = await self.client.get_user_profile_(ctx.author.id)
         p.update({"facepalms": p['facepalms'] + 1})
+        self.client.journal.mark("user_profile", p['_id'], "facepalms")
         facepalm_text = f"You have facepalmed `{p['facepalms']}` times."
         await ctx.send(
             embed=await self.optional_actions_msg(
@@ -402,6 +413,7 @@ class actions(commands.Cog, description="Interact with someone, UwU!~"):
             user_name = None
         p = await self.client.get_user_profile_(ctx.author.id)
         p.update({"blushes": p['blushes'] + 1})
+        self.client.journal.mark("user_profile", p['_id'], "blushes")
         blush_text = f"You have blushed `{p['blushes']}` times. >///<"
         await ctx.send(
             embed=await self.optional_actions_msg(
@@ -425,6 +437,7 @@ class actions(commands.Cog, description="Interact with someone, UwU!~"):
             user_name = None
         p = await self.client.get_user_profile_(ctx.author.id)
         p.update({"tail_wags": p['tail_wags'] + 1})
+        self.client.journal.mark("user_profile", p['_id'], "tail_wags")
         tail_text = f"You have wagged your tail `{p['tail_wags']}` times."
         await ctx.send(
             embed=await self.optional_actions_msg(
@@ -448,6 +461,7 @@ class actions(commands.Cog, description="Interact with someone, UwU!~"):
             user_name = None
         p = await self.client.get_user_profile_(ctx.author.id)
         p.update({"cries": p['cries'] + 1})
+        self.client.journal.mark("user_profile", p['_id'], "cries")
         cries_text = f"You have cried `{p['cries']}` times."
         await ctx.send(
             embed=await self.optional_actions_msg(
@@ -21,6 +21,7 @@ from typing import Union, Optional
 from utils.embed import error_embed, success_embed
 from config import EMOJIS, MAIN_COLOR, SUPPORT_SERVER_LINK
 from utils.bot import EpicBot
+from utils.message_pipeline import MessageContext
 from utils.ui import Confirm, Paginator, PaginatorText
 from utils.converters import Lower
 from utils.flags import StickerFlags
@@ -30,6 +31,10 @@ from io import BytesIO
 class emojis(commands.Cog, description="Emoji related commands!"):
     def __init__(self, client: EpicBot):
         self.client = client
+        self.client.message_pipeline.register("nqn", self.nqn_message, order=60, background=True)
+
+    def cog_unload(self):
+        self.client.message_pipeline.unregister("nqn")
 
     @commands.cooldown(2, 10, commands.BucketType.user)
     @commands.command(help="Enlarge an emoji.")
@@ -206,20 +211,14 @@ class emojis(commands.Cog, description="Emoji related commands!"):
             ctx.command.reset_cooldown(ctx)
             return await ctx.reply(f"Sticker upload failed. Error: `{e}`\n\nIf this was unexpected please report it in our support server {SUPPORT_SERVER_LINK}")
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.author.bot:
-            return
-        if not message.guild:
-            return
+    async def nqn_message(self, message: discord.Message, mctx: MessageContext):
         # checking if nqn is enabled or not
-        guild_config = await self.client.get_guild_config(message.guild.id)
+        guild_config = mctx.guild_config
         if not guild_config['nqn']:
             return
         # checking for blacklisted users
-        for e in self.client.blacklisted_cache:
-            if message.author.id == e['_id']:
-                return
+        if mctx.blacklisted:
+            return
         # spliting the message content
         pain = message.content.split(" ")
 
@@ -37,6 +37,7 @@ from owotext import OwO
 from dadjokes import Dadjoke
 from discord.utils import escape_markdown
 from utils.bot import EpicBot
+from utils.message_pipeline import MessageContext
 from epicbot_images.effects import ascii
 from io import BytesIO
 
@@ -82,6 +83,10 @@ class fun(commands.Cog, description="Wanna have some fun?"):
         self.sniped_msgs = {}
         self.edited_msgs = {}
         self.embed_snipes = {}
+        self.client.message_pipeline.register("chatbot", self.chatbot_lmao, order=80, background=True)
+
+    def cog_unload(self):
+        self.client.message_pipeline.unregister("chatbot")
 
     @commands.cooldown(1, 86400, commands.BucketType.user)
     @commands.cooldown(1, 120, commands.BucketType.guild)
@@ -631,15 +636,10 @@ Another Example: `{prefix}shouldi Study OR Procrastinate`
                 color=MAIN_COLOR
             ))
 
-    @commands.Cog.listener("on_message")
-    async def chatbot_lmao(self, message: discord.Message):
-        if message.author.bot:
-            return
+    async def chatbot_lmao(self, message: discord.Message, mctx: MessageContext):
         if message.content == "":
             return
-        if not message.guild:
-            return
-        g_conf = await self.client.get_guild_config(message.guild.id)
+        g_conf = mctx.guild_config
         if g_conf['chatbot'] != message.channel.id:
             return
         if message.channel.slowmode_delay < 5:
@@ -767,6 +767,7 @@ Another Example: `{prefix}shouldi Study OR Procrastinate`
 
         user_profile = await self.client.get_user_profile_(user.id)
         user_profile.update({"times_simped": user_profile['times_simped'] + 1})
+        self.client.journal.mark("user_profile", user_profile['_id'], "times_simped")
 
         embed = discord.Embed(
             title="Wow, what a simp!",
@@ -915,7 +916,7 @@ Another Example: `{prefix}shouldi Study OR Procrastinate`
                 return await ctx.reply(f"{EMOJIS['tick_no']}Only `png` format is allowed.")
 
         if isinstance(text, discord.Member):
-            file_bytes = await text.display_avatar.replace(format='png', size=256).read()
+            file_bytes = await self.client.avatar_cache.read(text.display_avatar, size=256)
 
         if isinstance(text, str):
             res = pyfiglet.figlet_format(text)
@@ -50,7 +50,7 @@ class image(commands.Cog, description="Cool image commands!"):
         if intensity > 25 or intensity < -25:
             ctx.command.reset_cooldown(ctx)
             return await ctx.reply(f"{EMOJIS['tick_no']}The blur intensity can't be greater than `25`")
-        avatar_bytes = await user.display_avatar.replace(format='png', size=256).read()
+        avatar_bytes = await self.client.avatar_cache.read(user.display_avatar, size=256)
         async with ctx.channel.typing():
             await ctx.reply(
                 file=discord.File(await self.client.loop.run_in_executor(None, functools.partial(effects.blur, avatar_bytes, intensity)))
@@ -95,7 +95,7 @@ class image(commands.Cog, description="Cool image commands!"):
                     avatar_bytes = await attachment.read()
                     break
         else:
-            avatar_bytes = await user.display_avatar.replace(format='png', size=512).read()
+            avatar_bytes = await self.client.avatar_cache.read(user.display_avatar, size=512)
         async with ctx.channel.typing():
             await ctx.reply(file=discord.File(await self.client.loop.run_in_executor(None, functools.partial(effects.enhance, avatar_bytes, **amogus))))
 
@@ -107,16 +107,16 @@ class image(commands.Cog, description="Cool image commands!"):
         thingy_bytes = None
 
         if not thing and len(ctx.message.attachments) == 0:
-            thingy_bytes = await ctx.author.display_avatar.replace(format='png', size=128).read()
+            thingy_bytes = await self.client.avatar_cache.read(ctx.author.display_avatar, size=128)
         elif not thing and len(ctx.message.attachments) != 0:
             for attachment in ctx.message.attachments:
                 if attachment.content_type == "image/png":
                     thingy_bytes = await attachment.read()
                     break
-            thingy_bytes = thingy_bytes or await ctx.author.display_avatar.replace(format='png', size=128).read()
+            thingy_bytes = thingy_bytes or await self.client.avatar_cache.read(ctx.author.display_avatar, size=128)
         else:
             if isinstance(thing, discord.Member):
-                thingy_bytes = await thing.display_avatar.replace(format='png', size=128).read()
+                thingy_bytes = await self.client.avatar_cache.read(thing.display_avatar, size=128)
             else:
                 thingy_bytes = await thing.read()
 
@@ -140,6 +140,7 @@ Database : {round((db_time2-db_time1)*1000)}ms
 
         user_profile = await self.client.get_user_profile_(ctx.author.id)
         user_profile.update({"suggestions_submitted": user_profile['suggestions_submitted'] + 1})
+        self.client.journal.mark("user_profile", user_profile['_id'], "suggestions_submitted")
 
         files = []
         for file in ctx.message.attachments:
@@ -166,6 +167,7 @@ Database : {round((db_time2-db_time1)*1000)}ms
             return await ctx.message.reply(embed=error_embed("Incorrect Usage", f"Please use it like this: `{prefix}bug <bug>`"))
         user_profile = await self.client.get_user_profile_(ctx.author.id)
         user_profile.update({"bugs_reported": user_profile['bugs_reported'] + 1})
+        self.client.journal.mark("user_profile", user_profile['_id'], "bugs_reported")
         embed = discord.Embed(
             title="Bug",
             description=f"""
@@ -126,7 +126,7 @@ class config(commands.Cog, description="Configure your server with amazing EpicB
     async def actual_autoposting_lmao(self):
         image_cache = {}
 
-        for e in self.client.serverconfig_cache:
+        for e in list(self.client.serverconfig_cache.values()):
             for ee in e['autoposting']:
                 channel = self.client.get_channel(ee['channel_id'])
                 if channel is not None:
@@ -730,10 +730,9 @@ You can also use `@{self.client.user.name}`
             if len(current_prefixes) == 1:
                 ctx.command.reset_cooldown(ctx)
                 return await ctx.reply(f"{EMOJIS['tick_no']}You only have 1 prefix. You cannot remove this prefix until you add another one first.")
-            for e in self.client.prefixes_cache:
-                if e['_id'] == ctx.guild.id:
-                    e['prefix'].remove(prefix)
-                    return await ctx.reply(f"{EMOJIS['tick_yes']}The prefix `{prefix}` was removed.")
+            self.client.prefixes_cache[ctx.guild.id]['prefix'].remove(prefix)
+            self.client.invalidate_prefix(ctx.guild.id)
+            return await ctx.reply(f"{EMOJIS['tick_yes']}The prefix `{prefix}` was removed.")
 
         if len(current_prefixes) >= 10:
             ctx.command.reset_cooldown(ctx)
@@ -750,12 +749,9 @@ You can also use `@{self.client.user.name}`
                 "The maximum length of the prefix is **20**"
             ))
 
-        prefix_cache = self.client.prefixes_cache
-
-        for ee in prefix_cache:
-            if ee['_id'] == ctx.guild.id:
-                ee['prefix'].append(prefix)
-                return await ctx.reply(f"{EMOJIS['tick_yes']}The prefix `{prefix}` has been added.")
+        self.client.prefixes_cache[ctx.guild.id]['prefix'].append(prefix)
+        self.client.invalidate_prefix(ctx.guild.id)
+        return await ctx.reply(f"{EMOJIS['tick_yes']}The prefix `{prefix}` has been added.")
 
     @commands.has_guild_permissions(manage_guild=True)
     @commands.cooldown(1, 15, commands.BucketType.user)
@@ -2532,11 +2528,13 @@ Counting is currently **{'Disabled' if not enabled else 'set in <#'+str(g['count
                 "last_user": None,
                 "count_msg": None
             }})
+            self.client.journal.mark("serverconfig", ctx.guild.id, "counting")
             await setting.send(f"This channel is now set as the counting channel.\nThe current count is `{g['counting']['count']}`")
             await setting.edit(slowmode_delay=5)
             return await ctx.reply(f"{EMOJIS['tick_yes']} The counting channel has been updated to: {setting.mention}")
         if setting.lower() == 'disable':
             g.update({"counting": None})
+            self.client.journal.mark("serverconfig", ctx.guild.id, "counting")
             return await ctx.reply(f"{EMOJIS['tick_yes']} Counting has now been disabled.")
         return await ctx.reply(embed=info_embed)
 
@@ -2560,6 +2558,7 @@ Counting is currently **{'Disabled' if not enabled else 'set in <#'+str(g['count
             ))
         before_count = g['counting']['count']
         g['counting'].update({"count": number})
+        self.client.journal.mark("serverconfig", ctx.guild.id, "counting")
         return await ctx.reply(f"The count has been updated: `{before_count}` ➜ `{number}`")
 
     # @commands.command(help="Setup server counters!")
@@ -2583,7 +2582,7 @@ Counting is currently **{'Disabled' if not enabled else 'set in <#'+str(g['count
 
         available_modules = []
         am_modules_text = ""
-        cancer = ['ignored_channels', 'allowed_roles']
+        cancer = ['ignored_channels', 'allowed_roles', 'dry_run']
 
         for e in DEFAULT_AUTOMOD_CONFIG:
             if e not in cancer:
@@ -2597,7 +2596,14 @@ Counting is currently **{'Disabled' if not enabled else 'set in <#'+str(g['count
 
         for e in am:
             if e not in cancer:
-                am_settings += f"**{e.replace('_', ' ').title()}:** {tick_yes+'  Enabled' if am[e]['enabled'] else tick_no+'  Disabled'}\n"
+                dry_run = am[e]['enabled'] and (am.get('dry_run') or am[e].get('dry_run'))
+                am_settings += f"**{e.replace('_', ' ').title()}:** {tick_yes+'  Enabled' if am[e]['enabled'] else tick_no+'  Disabled'}{' (dry run)' if dry_run else ''}\n"
+
+        dry_run_text = ""
+        automod_cog = self.client.get_cog("Automod")
+        if automod_cog is not None and ctx.guild.id in automod_cog.dry_run_hits:
+            for e, n in automod_cog.dry_run_hits[ctx.guild.id].most_common():
+                dry_run_text += f"`{e}`: {n} "
 
         good_roles = ""
         good_channels = ""
@@ -2614,11 +2620,14 @@ Counting is currently **{'Disabled' if not enabled else 'set in <#'+str(g['count
 **Here are the available modules:**```{am_modules_text}```
 **Allowed Roles:** {good_roles if good_roles != "" else "None"}
 **Ignored Channels:** {good_channels if good_channels != "" else "None"}
+**Caught in dry run (since the bot started):** {dry_run_text if dry_run_text != "" else "None"}
 
 **In order to configure a module you can use:**
 
 - `{prefix}automod <module> enable/disable` - Enable or disable a specific module.
 - `{prefix}automod all enable/disable` - Enable or disable all modules.
+- `{prefix}automod <module> dryrun/live` - Only count what a module would catch, without deleting anything.
+- `{prefix}automod all dryrun/live` - Put the whole automod in dry run or back to normal.
 
 - `{prefix}automod roles add/remove <role>` - To add/remove a role from whitelist.
 - `{prefix}automod channel add/remove <channel>` - To add/remove a channel from whitelist.
@@ -2664,6 +2673,7 @@ Counting is currently **{'Disabled' if not enabled else 'set in <#'+str(g['count
                 old_roles_list = am['allowed_roles']
                 old_roles_list.append(other.id)
                 am.update({"allowed_roles": old_roles_list})
+                self.client.dispatch("automod_config_update", ctx.guild.id)
                 return await ctx.reply(embed=success_embed(
                     f"{EMOJIS['tick_yes']} Role added!",
                     f"Users with role {other.mention} will no longer trigger automod."
@@ -2672,6 +2682,7 @@ Counting is currently **{'Disabled' if not enabled else 'set in <#'+str(g['count
                 old_roles_list = am['allowed_roles']
                 old_roles_list.remove(other.id)
                 am.update({"allowed_roles": old_roles_list})
+                self.client.dispatch("automod_config_update", ctx.guild.id)
                 return await ctx.reply(embed=success_embed(
                     f"{EMOJIS['tick_yes']} Role removed!",
                     f"Users with role {other.mention} will now trigger automod."
@@ -2702,6 +2713,7 @@ Counting is currently **{'Disabled' if not enabled else 'set in <#'+str(g['count
                 old_roles_list = am['ignored_channels']
                 old_roles_list.append(other.id)
                 am.update({"ignored_channels": old_roles_list})
+                self.client.dispatch("automod_config_update", ctx.guild.id)
                 return await ctx.reply(embed=success_embed(
                     f"{EMOJIS['tick_yes']} Channel added!",
                     f"Users in channel {other.mention} will no longer trigger automod."
@@ -2710,6 +2722,7 @@ Counting is currently **{'Disabled' if not enabled else 'set in <#'+str(g['count
                 old_roles_list = am['ignored_channels']
                 old_roles_list.remove(other.id)
                 am.update({"ignored_channels": old_roles_list})
+                self.client.dispatch("automod_config_update", ctx.guild.id)
                 return await ctx.reply(embed=success_embed(
                     f"{EMOJIS['tick_yes']} Role removed!",
                     f"Users in channel {other.mention} will now trigger automod."
@@ -2723,15 +2736,33 @@ Counting is currently **{'Disabled' if not enabled else 'set in <#'+str(g['count
                 f"{EMOJIS['tick_no']} Incorrect Usage!",
                 f"Correct Usage: `{prefix}automod {module.lower()} enable/disable`"
             ))
-        if setting.lower() not in ['enable', 'disable']:
+        if setting.lower() not in ['enable', 'disable', 'dryrun', 'live']:
             return await ctx.reply(embed=error_embed(
                 f"{EMOJIS['tick_no']} Incorrect Usage!",
                 f"Correct Usage: `{prefix}automod {module.lower()} enable/disable`"
             ))
+        if setting.lower() in ['dryrun', 'live']:
+            dry_run = setting.lower() == 'dryrun'
+            if module.lower() != "all":
+                module_dict = am[module.lower()]
+                module_dict.update({"dry_run": dry_run})
+                am.update({module.lower(): module_dict})
+            else:
+                am.update({"dry_run": dry_run})
+                if not dry_run:
+                    for e in available_modules:
+                        am[e].update({"dry_run": False})
+            self.client.dispatch("automod_config_update", ctx.guild.id)
+            return await ctx.reply(embed=success_embed(
+                f"{EMOJIS['tick_yes']} {'Dry run' if dry_run else 'Live mode'}",
+                f"{'All automod modules' if module.lower() == 'all' else f'The automod module `{module.lower()}`'} will now "
+                + ("only count what would be caught, nothing will be deleted." if dry_run else "delete what gets caught again.")
+            ))
         if module.lower() != "all":
             module_dict = am[module.lower()]
             module_dict.update({"enabled": True if setting.lower() == 'enable' else False})
             am.update({module.lower(): module_dict})
+            self.client.dispatch("automod_config_update", ctx.guild.id)
             return await ctx.reply(embed=success_embed(
                 f"{EMOJIS['tick_yes']} Module {'Enabled' if setting.lower() == 'enable' else 'Disabled'}",
                 f"The automod module `{module.lower()}` has been **{tick_yes+'  Enabled' if setting.lower() == 'enable' else tick_no+'  Disabled'}**"
@@ -2740,6 +2771,7 @@ Counting is currently **{'Disabled' if not enabled else 'set in <#'+str(g['count
             module_dict = am[module.lower()]
             module_dict.update({"enabled": True if setting.lower() == 'enable' else False})
             am.update({module.lower(): module_dict})
+        self.client.dispatch("automod_config_update", ctx.guild.id)
         return await ctx.reply(embed=success_embed(
             f"{EMOJIS['tick_yes']} All modules {'Enabled' if setting.lower() == 'enable' else 'Disabled'}",
             f"All automod modules have been **{tick_yes+'  Enabled' if setting.lower() == 'enable' else tick_no+'  Disabled'}**"
@@ -2838,6 +2870,7 @@ Bump reminders are currently **{'Enabled' if enabled else 'Disabled'}** for this
                     "reward": None
                 }
             })
+            self.client.journal.mark("serverconfig", ctx.guild.id, "bump_reminders")
             return await ctx.reply(embed=success_embed(
                 f"{EMOJIS['disboard']} Bump Reminders Enabled!",
                 f"Bump reminders have been enabled!\n\nYou can also set a bump role using `{prefix}bumpreminder role @role`\nThis role will get pinged when a bump is available.\nAnd you can use `{prefix}bumpreminder reward @role` to reward a role to bumpers!"
@@ -2850,6 +2883,7 @@ Bump reminders are currently **{'Enabled' if enabled else 'Disabled'}** for this
                     "Bump reminders are already disabled for this server."
                 ))
             g.update({"bump_reminders": None})
+            self.client.journal.mark("serverconfig", ctx.guild.id, "bump_reminders")
             return await ctx.reply(embed=success_embed(
                 f"{EMOJIS['disboard']} Bump Reminders Disabled!",
                 "Bump reminders have been disabled."
@@ -2874,6 +2908,7 @@ Bump reminders are currently **{'Enabled' if enabled else 'Disabled'}** for this
                 g['bump_reminders'].update({
                     "role": role.id
                 })
+                self.client.journal.mark("serverconfig", ctx.guild.id, "bump_reminders")
                 return await ctx.reply(embed=success_embed(
                     f"{EMOJIS['tick_yes']} Bump role updated!",
                     f"The role {role.mention} will be pinged when a bump is available."
@@ -2881,6 +2916,7 @@ Bump reminders are currently **{'Enabled' if enabled else 'Disabled'}** for this
             g['bump_reminders'].update({
                 "role": None
             })
+            self.client.journal.mark("serverconfig", ctx.guild.id, "bump_reminders")
             return await ctx.reply(embed=success_embed(
                 f"{EMOJIS['tick_yes']} Bump role removed!",
                 "The role won't be pinged when a bump is available."
@@ -2911,6 +2947,7 @@ Bump reminders are currently **{'Enabled' if enabled else 'Disabled'}** for this
                 g['bump_reminders'].update({
                     "reward": role.id
                 })
+                self.client.journal.mark("serverconfig", ctx.guild.id, "bump_reminders")
                 return await ctx.reply(embed=success_embed(
                     f"{EMOJIS['tick_yes']} Reward role updated!",
                     f"The role {role.mention} will be rewarded to bumpers!"
@@ -2918,6 +2955,7 @@ Bump reminders are currently **{'Enabled' if enabled else 'Disabled'}** for this
             g['bump_reminders'].update({
                 "reward": None
             })
+            self.client.journal.mark("serverconfig", ctx.guild.id, "bump_reminders")
             return await ctx.reply(embed=success_embed(
                 f"{EMOJIS['tick_yes']} Reward role removed!",
                 "The role won't be given to bumpers."
@@ -30,7 +30,7 @@ from config import (
     BIG_PP_GANG, NO_PP_GANG, BADGE_EMOJIS, DEFAULT_BANNED_WORDS,
     PINK_COLOR_2, RED_COLOR, ORANGE_COLOR
 )
-from cogs_hidden.leveling import rank_card_templates
+from utils.rank_cards import rank_card_templates
 from humanfriendly import format_timespan
 from utils.custom_checks import check_voter, check_supporter
 from utils.bot import EpicBot
@@ -206,6 +206,7 @@ class user(commands.Cog, description="Commands related to the user!"):
                     f"Please use `{prefix}rankcard discover` to find valid templates!"
                 ))
             user_profile.update({"rank_card_template": card.lower()})
+            self.client.journal.mark("user_profile", user_profile['_id'], "rank_card_template")
             return await ctx.reply(embed=success_embed(
                 f"{EMOJIS['tick_yes']} Card template updated!",
                 f"Your rank card template has now been set to: `{card}`"
@@ -319,6 +320,7 @@ Make sure to upload image as an attachment.
 
         user_profile = await self.client.get_user_profile_(user_.id)
         user_profile.update({"times_thanked": user_profile['times_thanked'] + 1})
+        self.client.journal.mark("user_profile", user_profile['_id'], "times_thanked")
 
         return await ctx.reply(embed=success_embed(
             f"{EMOJIS['heawt']} Thank you!",
@@ -520,6 +522,7 @@ Make sure to upload image as an attachment.
                     if impostor is not None:
                         return await ctx.reply("Stop trying to impersonate people.")
             profile_.update({"gc_nick": new_thing})
+            self.client.journal.mark("user_profile", profile_['_id'], "gc_nick")
             return await ctx.reply(f"You global chat nickname has been updated to `{new_thing}`")
 
         if thing.lower() in ['bio', 'description']:
@@ -531,6 +534,7 @@ Make sure to upload image as an attachment.
                 if word in new_thing.lower():
                     return await ctx.reply(embed=error_embed(f"{EMOJIS['tick_no']} No Bad Words!", "Your bio cannot contain bad words."))
             profile_.update({"description": new_thing})
+            self.client.journal.mark("user_profile", profile_['_id'], "description")
             return await ctx.reply("Your bio has been updated.")
 
         if thing.lower() in ['avatar', 'pfp', 'av']:
@@ -546,14 +550,17 @@ Make sure to upload image as an attachment.
             files.append(await ctx.message.attachments[0].to_file())
             msg = await self.client.get_channel(864000707798761513).send(f"{ctx.author.mention} {ctx.author.id}", files=files)
             profile_.update({"gc_avatar": msg.attachments[0].url})
+            self.client.journal.mark("user_profile", profile_['_id'], "gc_avatar")
             return await ctx.reply("Your global chat avatar has been updated.")
 
         if thing.lower() in ['resetnick']:
             profile_.update({"gc_nick": None})
+            self.client.journal.mark("user_profile", profile_['_id'], "gc_nick")
             return await ctx.reply("Your global chat nickname has been reset.")
 
         if thing.lower() in ['resetavatar', 'resetav', 'resetpfp']:
             profile_.update({"gc_avatar": None})
+            self.client.journal.mark("user_profile", profile_['_id'], "gc_avatar")
             return await ctx.reply("Your global chat avatar has been reset.")
 
         return await ctx.reply(embed=info_embed)
@@ -614,7 +621,9 @@ Make sure to upload image as an attachment.
                 view=None
             )
         user_profile.update({"married_to": user.id, "married_at": round(time.time())})
+        self.client.journal.mark("user_profile", user_profile['_id'], "married_to", "married_at")
         victim_profile.update({"married_to": ctx.author.id, "married_at": round(time.time())})
+        self.client.journal.mark("user_profile", victim_profile['_id'], "married_to", "married_at")
         return await msg.edit(
             content="WOOOO!!!",
             embed=discord.Embed(
@@ -648,7 +657,9 @@ Make sure to upload image as an attachment.
         victim_profile = await self.client.get_user_profile_(user_profile['married_to'])
         time_ = user_profile['married_at']
         user_profile.update({"married_to": None, "married_at": None})
+        self.client.journal.mark("user_profile", user_profile['_id'], "married_to", "married_at")
         victim_profile.update({"married_to": None, "married_at": None})
+        self.client.journal.mark("user_profile", victim_profile['_id'], "married_to", "married_at")
         return await msg.edit(
             embed=discord.Embed(
                 title="<a:cute_cry:868791322574745600>",
@@ -716,6 +727,7 @@ Make sure to upload image as an attachment.
 
         snipe = user_profile['snipe']
         user_profile.update({"snipe": False if snipe else True})
+        self.client.journal.mark("user_profile", user_profile['_id'], "snipe")
 
         pain = "\n\nYou also won't be able to use the snipe commands."
 
@@ -31,6 +31,7 @@ from discord.utils import escape_markdown
 from utils.ui import Confirm, Paginator
 from utils.bot import EpicBot
 from utils.message import wait_for_msg
+from utils.message_pipeline import MessageContext
 
 afk_users = []
 afk_reasons = {}
@@ -41,8 +42,12 @@ class utility(commands.Cog, description="Commands that make your Discord experie
     def __init__(self, client: EpicBot):
         self.client = client
         self.reminding.start()
+        self.client.message_pipeline.register("afk", self.afk_message, order=40, dms=True, background=True)
         self.regex = re.compile(r"(\w*)\s*(?:```)(\w*)?([\s\S]*)(?:```$)")
 
+    def cog_unload(self):
+        self.client.message_pipeline.unregister("afk")
+
     @property
     def session(self):
         return self.client.http._HTTPClient__session  # type: ignore
@@ -56,19 +61,28 @@ class utility(commands.Cog, description="Commands that make your Discord experie
 
     @tasks.loop(seconds=1)
     async def reminding(self):
-        for e in self.client.reminders:
+        for e in list(self.client.reminders):
+            # every cluster knows every reminder, only one of them sends it
+            if not self.client.owns_user(e['user_id']):
+                continue
             if round(e['time']) <= round(time.time()):
-                user = self.client.get_user(e['user_id'])
                 embed = success_embed(
                     f"{EMOJIS['reminder']} Reminder!",
                     f"{e['reminder']}\n\nYou set this reminder <t:{round(e['set_time'])}:R>"
                 )
                 try:
+                    # the user might only be cached on the clusters that share a guild with them
+                    user = self.client.get_user(e['user_id']) or await self.client.fetch_user(e['user_id'])
                     await user.send(embed=embed)
+                except (discord.Forbidden, discord.NotFound):
+                    pass  # dms closed or the account is gone, it's never going to work
                 except Exception as e_:
+                    # anything else might work next time, so the reminder stays
                     print(e_)
-                index = self.client.reminders.index(e)
-                self.client.reminders.pop(index)
+                    continue
+                if e in self.client.reminders:
+                    self.client.reminders.remove(e)
+                self.client.cluster_send("reminder_remove", {"_id": e['_id'], "user_id": e['user_id']})
                 await self.client.reminders_db.delete_one({"_id": e['_id'], "user_id": e['user_id']})
 
     @commands.cooldown(2, 30, commands.BucketType.user)
@@ -133,6 +147,7 @@ class utility(commands.Cog, description="Commands that make your Discord experie
         ).set_footer(text=f"You can use {prefix}reminders to check your remiders."))
 
         self.client.reminders.append(aaaaaa_pain)
+        self.client.cluster_send("reminder_add", aaaaaa_pain)
         await self.client.reminders_db.insert_one(aaaaaa_pain)
 
     @commands.cooldown(1, 15, commands.BucketType.user)
@@ -152,6 +167,7 @@ class utility(commands.Cog, description="Commands that make your Discord experie
                     f"The reminder with ID: `{id_}` has been deleted."
                 ).add_field(name="More Info:", value=f"```yaml\nReminder: {e['reminder']}\nTime: {time.ctime(e['time'])}\n```"))
                 self.client.reminders.pop(self.client.reminders.index(e))
+                self.client.cluster_send("reminder_remove", {"_id": id_, "user_id": ctx.author.id})
                 await self.client.reminders_db.delete_one({"_id": id_, "user_id": ctx.author.id})
                 return
         return await ctx.reply(embed=error_embed(
@@ -482,10 +498,7 @@ class utility(commands.Cog, description="Commands that make your Discord experie
         afk_reasons.update({ctx.author.id: reason})
         afk_guilds.update({ctx.author.id: ctx.guild.id})
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
-            return
+    async def afk_message(self, message, mctx: MessageContext):
         if message.author.id in afk_users:
             afk_users.remove(message.author.id)
             if message.author.id in afk_guilds:
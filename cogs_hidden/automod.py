@@ -15,15 +15,81 @@ limitations under the License.
 """
 
 import discord
+import json
 import re
-import urllib
-
-from discord.ext import commands
-from config import DEFAULT_BANNED_WORDS, EMOJIS, RED_COLOR
+import time
+
+from discord.ext import commands, tasks
+from config import (
+    DEFAULT_BANNED_WORDS, EMOJIS, RED_COLOR,
+    AUTOMOD_SPAM_WINDOW, AUTOMOD_SPAM_THRESHOLD, AUTOMOD_SPAM_MAX_USERS, AUTOMOD_SPAM_MAX_PER_USER, AUTOMOD_MOD_CACHE_MAX,
+    AUTOMOD_ACTION_WINDOW
+)
 from datetime import datetime
+from collections import OrderedDict, Counter
+from io import BytesIO
 from re import search
-from collections import Counter
 from utils.bot import EpicBot
+from utils.message_pipeline import MessageContext
+from utils.metrics import Histogram
+from utils.enforcement_queue import EnforcementQueue
+from utils.spam_tracker import SpamTracker
+from utils.text_features import TextFeatures
+from utils.word_matcher import compile_words
+
+
+# the order the modules are checked in, the first one that matches decides what happens to the message
+AUTOMOD_MODULES = [
+    "banned_words", "all_caps", "duplicate_text", "message_spam", "invites",
+    "links", "mass_mentions", "emoji_spam", "zalgo_text"
+]
+
+AUTOMOD_WARNINGS = {
+    "banned_words": "Watch your language.",
+    "all_caps": "Too many caps.",
+    "duplicate_text": "No spamming.",
+    "message_spam": "Stop spamming.",
+    "invites": "No invite links.",
+    "links": "No links allowed.",
+    "mass_mentions": "Don't spam mentions.",
+    "zalgo_text": "No zalgo allowed.",
+}
+
+
+class AutomodRules:
+    # everything automod needs from a guild's config, built once when the config changes
+    def __init__(self, am: dict):
+        self.source = am
+        self.modules = [module for module in AUTOMOD_MODULES if am.get(module, {}).get('enabled')]
+        # modules that only count what they would have done, without deleting or warning
+        self.dry_run = frozenset(
+            module for module in self.modules
+            if am.get('dry_run') or am.get(module, {}).get('dry_run')
+        )
+        self.ignored_channels = frozenset(am['ignored_channels'])
+        self.allowed_roles = frozenset(am['allowed_roles'])
+        self.banned_words = compile_words(tuple(DEFAULT_BANNED_WORDS + list(am.get('banned_words', {}).get('words', []))))
+
+    def is_exempt_here(self, msg) -> bool:
+        if msg.channel.id in self.ignored_channels:
+            return True
+        return bool(self.allowed_roles) and not self.allowed_roles.isdisjoint(r.id for r in msg.author.roles)
+
+
+class ModuleMetrics:
+    def __init__(self):
+        self.evaluations = 0
+        self.hits = 0
+        self.dry_run_hits = 0
+        self.latency = Histogram()
+
+    def to_dict(self) -> dict:
+        return {
+            "evaluations": self.evaluations,
+            "hits": self.hits,
+            "dry_run_hits": self.dry_run_hits,
+            "latency": self.latency.to_dict(),
+        }
 
 
 class Automod(commands.Cog):
@@ -37,283 +103,229 @@ class Automod(commands.Cog):
         )
         self.url_regex = r"(?i)\b((?:https?://|www\d{0,3}[.]|[a-z0-9.\-]+[.][a-z]{2,4}/)(?:[^\s()<>]+|\(([^\s()<>]+|(\([^\s()<>]+\)))*\))+(?:\(([^\s()<>]+|(\([^\s()<>]+\)))*\)|[^\s`!()\[\]{};:'\".,<>?«»“”‘’]))"
         self.invite_regex = re.compile(r'((http(s|):\/\/|)(discord)(\.(gg|io|me)\/|app\.com\/invite\/)([0-z]+))')
-        self.zalgo_regex = re.compile(r"%CC%", re.MULTILINE)
 
-    async def is_enabled(self, guild_id, module):
+        self.rules = {}
+        # it has to remember at least as many messages as it takes to count as spam
+        self.spam_tracker = SpamTracker(
+            window=AUTOMOD_SPAM_WINDOW,
+            max_per_user=max(AUTOMOD_SPAM_MAX_PER_USER, AUTOMOD_SPAM_THRESHOLD),
+            max_users=AUTOMOD_SPAM_MAX_USERS
+        )
+        # (guild_id, member_id) -> (role version of the guild, is a mod or not)
+        # the member's entry is dropped when their roles change, the whole guild's
+        # entries go stale when a role or the owner changes (role_versions goes up)
+        self.mod_cache = OrderedDict()
+        self.role_versions = {}
+
+        self.metrics = {module: ModuleMetrics() for module in AUTOMOD_MODULES}
+        self.enforcement = EnforcementQueue(window=AUTOMOD_ACTION_WINDOW, allowed_mentions=self.peng)
+        # guild_id -> Counter of module -> messages it would have caught, for guilds using dry run
+        self.dry_run_hits = {}
+        self.checks = {
+            "banned_words": self.bad_word_automod,
+            "all_caps": self.all_caps,
+            "duplicate_text": self.duplicate_text,
+            "message_spam": self.fast_msg_spam,
+            "invites": self.discord_invites,
+            "links": self.links,
+            "mass_mentions": self.mass_mentions,
+            "emoji_spam": self.emoji_spam,
+            "zalgo_text": self.zalgo_text,
+        }
+        # runs before everything else, a message that gets deleted here isn't seen by the other handlers
+        self.client.message_pipeline.register("automod", self.run_automod, order=10)
+        self.prune_spam_tracker.start()
+
+    def cog_unload(self):
+        self.client.message_pipeline.unregister("automod")
+        self.prune_spam_tracker.cancel()
+
+    @tasks.loop(minutes=1)
+    async def prune_spam_tracker(self):
+        self.spam_tracker.prune()
+
+    def get_rules(self, g) -> AutomodRules:
+        rules = self.rules.get(g['_id'])
+        if rules is None or rules.source is not g['automod']:
+            rules = self.rules[g['_id']] = AutomodRules(g['automod'])
+        return rules
+
+    @commands.Cog.listener()
+    async def on_automod_config_update(self, guild_id):
         g = await self.client.get_guild_config(guild_id)
-        am = g['automod']
-
-        if not am[module]['enabled']:
-            return False
-
-        return [am[module], g]
-
-    def mod_perms(self, m):
-        p = m.author.guild_permissions
+        # guilds that never touched automod can share the same default config dict,
+        # so everything built from that dict has to go, not just this guild's rules
+        for gid, rules in list(self.rules.items()):
+            if gid == guild_id or rules.source is g['automod']:
+                self.rules.pop(gid, None)
+
+    def is_mod(self, msg, mctx: MessageContext) -> bool:
+        key = (msg.guild.id, msg.author.id)
+        version = self.role_versions.get(msg.guild.id, 0)
+        cached = self.mod_cache.get(key)
+        if cached is not None and cached[0] == version:
+            self.mod_cache.move_to_end(key)
+            return cached[1]
+        verdict = mctx.is_mod
+        self.mod_cache[key] = (version, verdict)
+        self.mod_cache.move_to_end(key)
+        if len(self.mod_cache) > AUTOMOD_MOD_CACHE_MAX:
+            self.mod_cache.popitem(last=False)
+        return verdict
+
+    def bump_role_version(self, guild_id):
+        self.role_versions[guild_id] = self.role_versions.get(guild_id, 0) + 1
+
+    @commands.Cog.listener("on_member_update")
+    async def forget_mod_status(self, before: discord.Member, after: discord.Member):
+        if before.roles != after.roles:
+            self.mod_cache.pop((after.guild.id, after.id), None)
+
+    @commands.Cog.listener("on_member_remove")
+    async def forget_member(self, member: discord.Member):
+        self.mod_cache.pop((member.guild.id, member.id), None)
+
+    @commands.Cog.listener("on_guild_role_update")
+    async def role_perms_changed(self, before: discord.Role, after: discord.Role):
+        if before.permissions != after.permissions:
+            self.bump_role_version(after.guild.id)
+
+    @commands.Cog.listener("on_guild_role_delete")
+    async def role_deleted(self, role: discord.Role):
+        self.bump_role_version(role.guild.id)
+
+    @commands.Cog.listener("on_guild_update")
+    async def owner_changed(self, before: discord.Guild, after: discord.Guild):
+        if before.owner_id != after.owner_id:
+            self.bump_role_version(after.id)
+
+    @commands.is_owner()
+    @commands.command(aliases=['automodstats'])
+    async def automod_stats(self, ctx, export: str = None):
+        if export is not None and export.lower() == "json":
+            data = {
+                "modules": {module: m.to_dict() for module, m in self.metrics.items()},
+                "dry_run_guilds": {str(gid): dict(hits) for gid, hits in self.dry_run_hits.items()},
+                "spam_tracker": self.spam_tracker.stats(),
+                "invite_cache": self.client.invite_cache.stats(),
+                "enforcement": self.enforcement.stats(),
+                "compiled_rule_sets": len(self.rules),
+                "cached_mod_checks": len(self.mod_cache),
+            }
+            return await ctx.reply(file=discord.File(BytesIO(json.dumps(data, indent=4).encode()), filename="automod_stats.json"))
+
+        modules = "\n".join(
+            f"{module}: {m.evaluations} evals, {m.hits} hits, {m.dry_run_hits} dry run hits, "
+            f"{round(m.latency.total_ms / m.latency.count, 3) if m.latency.count else 0}ms avg, "
+            f"{m.latency.percentile(99)}ms p99, {round(m.latency.max_ms, 3)}ms max"
+            for module, m in self.metrics.items()
+        )
+        enforcement = self.enforcement.stats()
+        latency = enforcement.pop("latency")
+        enforcement = "\n".join(f"{k}: {v}" for k, v in enforcement.items())
+        enforcement += f"\nlatency: {latency['avg_ms']}ms avg, {latency['p99_ms']}ms p99, {latency['max_ms']}ms max"
+        stats = "\n".join(f"{k}: {v}" for k, v in self.spam_tracker.stats().items())
+        invites = "\n".join(f"{k}: {v}" for k, v in self.client.invite_cache.stats().items())
+        return await ctx.reply(
+            f"**Compiled rule sets:** `{len(self.rules)}`\n"
+            f"**Cached mod checks:** `{len(self.mod_cache)}`\n"
+            f"**Guilds in dry run:** `{len(self.dry_run_hits)}`\n"
+            f"**Modules:**\n```yaml\n{modules}\n```"
+            f"**Enforcement queue:**\n```yaml\n{enforcement}\n```"
+            f"**Spam tracker:**\n```yaml\n{stats}\n```"
+            f"**Invite cache:**\n```yaml\n{invites}\n```"
+            f"Use `{ctx.clean_prefix}automod_stats json` for the full histograms."
+        )
 
-        if p.kick_members or p.administrator or p.ban_members or p.manage_guild or m.author == m.guild.owner:
-            return True
+    async def run_automod(self, msg, mctx: MessageContext):
+        rules = self.get_rules(mctx.guild_config)
+        if not rules.modules:
+            return
+        if rules.is_exempt_here(msg) or self.is_mod(msg, mctx):
+            return
+
+        if "message_spam" in rules.modules:
+            # every message has to be counted, even the ones an earlier module catches
+            self.spam_tracker.add(msg.guild.id, msg.author.id, msg.channel.id, msg.id, msg.created_at.timestamp())
+
+        features = mctx.text_features
+        for module in rules.modules:
+            metrics = self.metrics[module]
+            start = time.perf_counter()
+            try:
+                hit = await self.checks[module](msg, features, rules)
+            finally:
+                metrics.evaluations += 1
+                metrics.latency.record(time.perf_counter() - start)
+            if not hit:
+                continue
+            if module in rules.dry_run:
+                # only counted, the message goes on to the next module like nothing happened
+                metrics.dry_run_hits += 1
+                self.dry_run_hits.setdefault(msg.guild.id, Counter())[module] += 1
+                continue
+            metrics.hits += 1
+            mctx.stop()
+            return self.take_action(msg, module)
+
+    def take_action(self, msg, module):
+        # the deletions and the warning happen a moment later, together with everything else caught in the channel
+        if module == "message_spam":
+            self.delete_spam(msg)
         else:
-            return False
-
-    @commands.Cog.listener("on_message")
-    async def bad_word_automod(self, msg):
-        if msg.author.bot or msg.content == "" or not msg.guild:
-            return
-
-        m_ = await self.is_enabled(msg.guild.id, "banned_words")
-        if not m_:
-            return
-
-        m = m_[0]
-        g = m_[1]
-
-        if self.mod_perms(msg):
-            return
-
-        if msg.channel.id in g['automod']['ignored_channels']:
-            return
-
-        for r in msg.author.roles:
-            if r.id in g['automod']['allowed_roles']:
-                return
-
-        for w in DEFAULT_BANNED_WORDS:
-            if w in msg.content.lower():
-                await msg.delete()
-                return await msg.channel.send(
-                    f"{msg.author.mention}, Watch your language.",
-                    delete_after=5,
-                    allowed_mentions=self.peng
-                )
-
-        for w in m['words']:
-            if w in msg.content.lower():
-                await msg.delete()
-                return await msg.channel.send(
-                    f"{msg.author.mention}, Watch your language.",
-                    delete_after=5,
-                    allowed_mentions=self.peng
-                )
-
-    @commands.Cog.listener("on_message")
-    async def all_caps(self, msg):
-        if msg.author.bot or msg.content == "" or not msg.guild or len(msg.content) < 5:
-            return
-        m_ = await self.is_enabled(msg.guild.id, "all_caps")
-        if not m_:
-            return
-        g = m_[1]
-
-        if self.mod_perms(msg):
-            return
-
-        if msg.channel.id in g['automod']['ignored_channels']:
-            return
+            self.enforcement.enqueue(msg.channel, [msg.id])
+        self.enforcement.enqueue(msg.channel, [], msg.author.mention, AUTOMOD_WARNINGS[module])
 
-        for r in msg.author.roles:
-            if r.id in g['automod']['allowed_roles']:
-                return
+    async def bad_word_automod(self, msg, features: TextFeatures, rules: AutomodRules):
+        if msg.content == "":
+            return False
+        return rules.banned_words.find(features.lower) is not None
 
+    async def all_caps(self, msg, features: TextFeatures, rules: AutomodRules):
+        if msg.content == "" or len(msg.content) < 5:
+            return False
         if msg.content.isupper():
-            await msg.delete()
-            return await msg.channel.send(
-                f"{msg.author.mention}, Too many caps.",
-                delete_after=5,
-                allowed_mentions=self.peng
-            )
-
-        upper_count = 0
-        lower_count = 0
-
-        for h in msg.content:
-            if h.isupper():
-                upper_count += 1
-            else:
-                lower_count += 1
-
-        if (upper_count / len(msg.content)) * 100 > 70:
-            await msg.delete()
-            return await msg.channel.send(
-                f"{msg.author.mention}, Too many caps.",
-                delete_after=5,
-                allowed_mentions=self.peng
-            )
-
-    @commands.Cog.listener("on_message")
-    async def duplicate_text(self, msg):
-        if msg.author.bot or not msg.guild or len(msg.content) < 100:
-            return
-        m_ = await self.is_enabled(msg.guild.id, "duplicate_text")
-        if not m_:
-            return
-        g = m_[1]
-        if self.mod_perms(msg):
-            return
-        if msg.channel.id in g['automod']['ignored_channels']:
-            return
-        for r in msg.author.roles:
-            if r.id in g['automod']['allowed_roles']:
-                return
-
-        c_ = Counter(msg.content.lower())
-        for c, n in c_.most_common(None):
-            if c != ' ' and len(msg.content) / n < 9:
-                await msg.delete()
-                return await msg.channel.send(
-                    f"{msg.author.mention}, No spamming.",
-                    delete_after=5,
-                    allowed_mentions=self.peng
-                )
-
-    @commands.Cog.listener("on_message")
-    async def fast_msg_spam(self, msg):
-        def _check(m):
-            return (m.author == msg.author and (datetime.utcnow() - m.created_at.replace(tzinfo=None)).seconds < 7)
-        if msg.author.bot or not msg.guild:
-            return
-        m_ = await self.is_enabled(msg.guild.id, "message_spam")
-        if not m_:
-            return
-        g = m_[1]
-        if self.mod_perms(msg):
-            return
-        if msg.channel.id in g['automod']['ignored_channels']:
-            return
-        for r in msg.author.roles:
-            if r.id in g['automod']['allowed_roles']:
-                return
-
-        h = list(filter(lambda m: _check(m), self.client.cached_messages))
-
-        if len(h) >= 5:
-            await msg.channel.purge(limit=5, check=_check)
-            return await msg.channel.send(
-                f"{msg.author.mention}, Stop spamming.",
-                delete_after=5,
-                allowed_mentions=self.peng
-            )
-
-    @commands.Cog.listener("on_message")
-    async def discord_invites(self, msg):
-        if msg.author.bot or not msg.guild:
-            return
-        m_ = await self.is_enabled(msg.guild.id, 'invites')
-        if not m_:
-            return
-        g = m_[1]
-        if self.mod_perms(msg):
-            return
-        if msg.channel.id in g['automod']['ignored_channels']:
-            return
-        for r in msg.author.roles:
-            if r.id in g['automod']['allowed_roles']:
-                return
-
-        invite_match = self.invite_regex.findall(msg.content)
-        if invite_match:
-            for e in invite_match:
-                try:
-                    invite = await self.client.fetch_invite(e[-1])
-                except discord.NotFound:
-                    pass
-                else:
-                    if not invite.guild.id == msg.guild.id:
-                        await msg.delete()
-                        return await msg.channel.send(
-                            f"{msg.author.mention}, No invite links.",
-                            delete_after=5,
-                            allowed_mentions=self.peng
-                        )
-
-    @commands.Cog.listener("on_message")
-    async def links(self, msg):
-        if msg.author.bot or not msg.guild:
-            return
-        m_ = await self.is_enabled(msg.guild.id, "links")
-        if not m_:
-            return
-        g = m_[1]
-        if self.mod_perms(msg):
-            return
-        if msg.channel.id in g['automod']['ignored_channels']:
-            return
-        for r in msg.author.roles:
-            if r.id in g['automod']['allowed_roles']:
-                return
-
-        if search(self.url_regex, msg.content):
-            await msg.delete()
-            return await msg.channel.send(
-                f"{msg.author.mention}, No links allowed.",
-                delete_after=5,
-                allowed_mentions=self.peng
-            )
-
-    @commands.Cog.listener("on_message")
-    async def mass_mentions(self, msg):
-        if msg.author.bot or not msg.guild:
-            return
-        m_ = await self.is_enabled(msg.guild.id, "mass_mentions")
-        if not m_:
-            return
-        g = m_[1]
-        if self.mod_perms(msg):
-            return
-        if msg.channel.id in g['automod']['ignored_channels']:
-            return
-        for r in msg.author.roles:
-            if r.id in g['automod']['allowed_roles']:
-                return
-
-        if len(msg.mentions) >= 3:
-            await msg.delete()
-            return await msg.channel.send(
-                f"{msg.author.mention}, Don't spam mentions.",
-                delete_after=5,
-                allowed_mentions=self.peng
-            )
-
-    @commands.Cog.listener("on_message")
-    async def emoji_spam(self, msg):
-        if msg.author.bot or not msg.guild:
-            return
-        m_ = await self.is_enabled(msg.guild.id, "emoji_spam")
-        if not m_:
-            return
-        g = m_[1]
-        if self.mod_perms(msg):
-            return
-        if msg.channel.id in g['automod']['ignored_channels']:
-            return
-        for r in msg.author.roles:
-            if r.id in g['automod']['allowed_roles']:
-                return
+            return True
+        return features.upper_ratio * 100 > 70
 
-    @commands.Cog.listener("on_message")
-    async def zalgo_text(self, msg):
-        if msg.author.bot or not msg.guild:
-            return
-        m_ = await self.is_enabled(msg.guild.id, "zalgo_text")
-        if not m_:
-            return
-        g = m_[1]
-        if self.mod_perms(msg):
-            return
-        if msg.channel.id in g['automod']['ignored_channels']:
-            return
-        for r in msg.author.roles:
-            if r.id in g['automod']['allowed_roles']:
-                return
-
-        x = self.zalgo_regex.search(urllib.parse.quote(msg.content.encode("utf-8")))
-        if x:
-            await msg.delete()
-            return await msg.channel.send(
-                f"{msg.author.mention}, No zalgo allowed.",
-                delete_after=5,
-                allowed_mentions=self.peng
-            )
+    async def duplicate_text(self, msg, features: TextFeatures, rules: AutomodRules):
+        if len(msg.content) < 100:
+            return False
+        return features.max_char_count > 0 and features.length / features.max_char_count < 9
+
+    def delete_spam(self, msg):
+        # deletes everything the user sent in the window by id, no need to go through the channel history
+        by_channel = {}
+        for channel_id, message_id in self.spam_tracker.pop(msg.guild.id, msg.author.id):
+            by_channel.setdefault(channel_id, []).append(message_id)
+        by_channel.setdefault(msg.channel.id, []).append(msg.id)
+        for channel_id, message_ids in by_channel.items():
+            channel = msg.channel if channel_id == msg.channel.id else msg.guild.get_channel_or_thread(channel_id)
+            if channel is not None:
+                self.enforcement.enqueue(channel, message_ids)
+
+    async def fast_msg_spam(self, msg, features: TextFeatures, rules: AutomodRules):
+        return self.spam_tracker.count(msg.guild.id, msg.author.id) >= AUTOMOD_SPAM_THRESHOLD
+
+    async def discord_invites(self, msg, features: TextFeatures, rules: AutomodRules):
+        codes = dict.fromkeys(e[-1] for e in self.invite_regex.findall(msg.content))
+        for code in codes:
+            guild_id = await self.client.invite_cache.resolve(code)
+            if guild_id is not None and guild_id != msg.guild.id:
+                return True
+        return False
+
+    async def links(self, msg, features: TextFeatures, rules: AutomodRules):
+        return bool(search(self.url_regex, msg.content))
+
+    async def mass_mentions(self, msg, features: TextFeatures, rules: AutomodRules):
+        return len(msg.mentions) >= 3
+
+    async def emoji_spam(self, msg, features: TextFeatures, rules: AutomodRules):
+        return False
+
+    async def zalgo_text(self, msg, features: TextFeatures, rules: AutomodRules):
+        return features.combining_marks > 0
 
     @commands.Cog.listener("on_message_delete")
     async def ghostping_delete(self, msgobj):
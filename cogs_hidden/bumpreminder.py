@@ -22,6 +22,7 @@ from utils.embed import success_embed
 from discord.ext import commands, tasks
 from config import ERROR_LOG_CHANNEL
 from utils.bot import EpicBot
+from utils.message_pipeline import MessageContext
 
 
 class BumpReminder(commands.Cog):
@@ -37,14 +38,17 @@ class BumpReminder(commands.Cog):
             replied_user=False
         )
         self.bumploop.start()
+        self.client.message_pipeline.register("bump_reminders", self.on_bump_message, order=50, bots=True, background=True)
 
-    @commands.Cog.listener("on_message")
-    async def on_bump_message(self, message):
-        if message.author.id != self.disboard_id or len(message.embeds) == 0 or not message.guild:
+    def cog_unload(self):
+        self.client.message_pipeline.unregister("bump_reminders")
+
+    async def on_bump_message(self, message, mctx: MessageContext):
+        if message.author.id != self.disboard_id or len(message.embeds) == 0:
             return
         if self.auth_str not in str(message.embeds[0].description).lower():
             return
-        g = await self.client.get_guild_config(message.guild.id)
+        g = mctx.guild_config
         if not g['bump_reminders']:
             return
         next_bump_time = time.time() + 60 * 60 * 2
@@ -59,6 +63,7 @@ class BumpReminder(commands.Cog):
             'time': next_bump_time,
             'bumper': message.author.id if bumper is None else bumper
         })
+        self.client.journal.mark("serverconfig", message.guild.id, "bump_reminders")
         await message.add_reaction("⏱️")
 
         reward_id = g['bump_reminders'].get('reward')
@@ -84,9 +89,9 @@ class BumpReminder(commands.Cog):
         await self.client.wait_until_ready()
         try:
             time_now = time.time()
-            for e in self.client.serverconfig_cache:
-                if e['bump_reminders']:
-                    e = e['bump_reminders']
+            for g in list(self.client.serverconfig_cache.values()):
+                if g['bump_reminders']:
+                    e = g['bump_reminders']
 
                     if e['time'] is not None:
                         if round(e['time']) <= round(time_now):
@@ -96,6 +101,7 @@ class BumpReminder(commands.Cog):
                                 allowed_mentions=self.peng
                             )
                             e.update({"time": None})
+                            self.client.journal.mark("serverconfig", g['_id'], "bump_reminders")
                             role_id = e.get("reward")
                             if role_id is not None:
                                 channel = self.client.get_channel(e['channel_id'])
@@ -17,17 +17,19 @@ limitations under the License.
 import discord
 from discord.ext import commands
 from utils.bot import EpicBot
+from utils.message_pipeline import MessageContext
 
 
 class Counting(commands.Cog):
     def __init__(self, client: EpicBot):
         self.client = client
+        self.client.message_pipeline.register("counting", self.count_go_brr, order=20, background=True)
 
-    @commands.Cog.listener("on_message")
-    async def count_go_brr(self, message: discord.Message):
-        if message.author.bot or not message.guild:
-            return
-        g = await self.client.get_guild_config(message.guild.id)
+    def cog_unload(self):
+        self.client.message_pipeline.unregister("counting")
+
+    async def count_go_brr(self, message: discord.Message, mctx: MessageContext):
+        g = mctx.guild_config
         if not g['counting']:
             return
         if message.channel.id != g['counting']['channel']:
@@ -47,6 +49,7 @@ class Counting(commands.Cog):
             "last_user": message.author.id,
             "count_msg": message.id
         })
+        self.client.journal.mark("serverconfig", message.guild.id, "counting")
         await message.add_reaction('✅')
 
     @commands.Cog.listener("on_message_delete")
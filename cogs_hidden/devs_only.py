@@ -43,7 +43,8 @@ class Devsonly(commands.Cog):
     async def get_cache(self, ctx: commands.Context):
         msg = await ctx.reply(f"{EMOJIS['loading']} Working on it...")
         await self.client.get_cache()
-        await msg.edit(content="Done!")
+        stats = "\n".join(f"{k}: {v['count']} in {v['seconds']}s" for k, v in self.client.cache_load_stats.items())
+        await msg.edit(content=f"Done!\n```yaml\n{stats}\n```")
 
     @commands.is_owner()
     @commands.command(aliases=['updatedb'], help="Update the database!")
@@ -65,6 +66,21 @@ Please select a database next time:
     @bot_mods_only()
     @commands.command(help="Check when the database was last updated.")
     async def lastdb(self, ctx: commands.Context):
+        flush_stats = "\n".join(
+            f"{t.name}: {t.last_flush_size}/{t.last_scanned_count} written, {t.last_dirty_count} dirty, {round(t.last_flush_duration * 1000, 2)}ms"
+            for t in (
+                self.client.prefixes_tracker, self.client.serverconfig_tracker,
+                self.client.leveling_tracker, self.client.user_profile_tracker
+            )
+        )
+        profile_stats = "\n".join(f"{k}: {v}" for k, v in self.client.user_profile_cache.stats().items())
+        if self.client.profile_sync is not None:
+            profile_stats += "\n" + "\n".join(f"other_clusters_{k}: {v}" for k, v in self.client.profile_sync.stats().items())
+        snapshot_stats = "\n".join(f"{k}: {v}" for k, v in self.client.snapshot_stats.items()) or "none yet"
+        journal = self.client.journal.stats()
+        fsync = journal.pop("fsync")
+        journal_stats = "\n".join(f"{k}: {v}" for k, v in journal.items())
+        journal_stats += f"\nfsync: {fsync['p50_ms']}ms p50, {fsync['p99_ms']}ms p99, {fsync['max_ms']}ms max"
         await ctx.reply(embed=success_embed(
             f"{EMOJIS['tick_yes']} Database info!",
             f"""
@@ -73,10 +89,64 @@ Prefix DB: {round(time.time() - self.client.last_updated_prefixes_db)} seconds a
 Serverconfig DB: {round(time.time() - self.client.last_updated_serverconfig_db)} seconds ago
 Leveling DB: {round(time.time() - self.client.last_updated_leveling_db)} seconds ago
 User profile DB: {round(time.time() - self.client.last_updated_user_profile_db)} seconds ago
+```
+**Last flush:**
+```yaml
+{flush_stats}
+```
+**User profile cache:**
+```yaml
+{profile_stats}
+```
+**Cache snapshot:**
+```yaml
+{snapshot_stats}
+```
+**Journal:**
+```yaml
+{journal_stats}
 ```
             """
         ).set_footer(text=f"Database is updated every {DB_UPDATE_INTERVAL} seconds."))
 
+    @commands.is_owner()
+    @commands.command(aliases=['avatarcache'], help="Check the avatar cache stats!")
+    async def avatar_cache(self, ctx: commands.Context):
+        stats = "\n".join(f"{k}: {v}" for k, v in self.client.avatar_cache.stats().items())
+        await ctx.reply(f"```yaml\n{stats}\n```")
+
+    @commands.is_owner()
+    @commands.command(aliases=['pipeline'], help="Check how long the message handlers take!")
+    async def message_pipeline(self, ctx: commands.Context):
+        stats = "\n".join(
+            f"{name}: {s['calls']} calls, {s['avg_ms']}ms avg, {s['max_ms']}ms max, {s['errors']} errors, {s['stops']} stops"
+            for name, s in self.client.message_pipeline.stats().items()
+        )
+        await ctx.reply(f"```yaml\n{stats}\n```")
+
+    @commands.is_owner()
+    @commands.command(aliases=['clusters'], help="Check every cluster of the bot!")
+    async def cluster(self, ctx: commands.Context):
+        if self.client.ipc is None:
+            return await ctx.reply("Not running as a cluster.")
+        stats = [await self.client.cluster_stats()] + await self.client.ipc.request("stats")
+        text = "\n".join(
+            f"Cluster {s['cluster']}: shards {s['shards']}, {s['guilds']} guilds, {s['users']} users, {s['latency_ms']}ms, "
+            f"{s['server_configs']} configs, {s['leveling_rows']} leveling rows"
+            for s in sorted(stats, key=lambda s: s['cluster'])
+        )
+        missing = self.client.cluster_count - len(stats)
+        if missing:
+            text += f"\n{missing} cluster(s) didn't answer"
+        await ctx.reply(f"```yaml\n{text}\n```")
+
+    @commands.is_owner()
+    @commands.command(aliases=['reloadall'], help="Reload a cog on every cluster!")
+    async def reload_everywhere(self, ctx: commands.Context, name: str):
+        self.client.reload_extension(name)
+        self.client.cluster_send("reload_extension", {"name": name})
+        await ctx.reply(f"{EMOJIS['tick_yes']} Reloaded `{name}` on every cluster.")
+
     @bot_mods_only()
     @commands.command(help="Blacklist some kid.")
     @commands.cooldown(3, 120, commands.BucketType.user)
@@ -90,18 +160,14 @@ User profile DB: {round(time.time() - self.client.last_updated_user_profile_db)}
             ))
         if user == ctx.author or user.id in OWNERS:
             return await ctx.reply("no")
-        for e in self.client.blacklisted_cache:
-            if e['_id'] == user.id:
-                ctx.command.reset_cooldown(ctx)
-                return await ctx.reply(embed=error_embed(
-                    f"{EMOJIS['tick_no']} Error!",
-                    f"This kid is already blacklisted.\n```yaml\nReason: {e['reason']}\n```"
-                ))
-        await self.client.blacklisted.insert_one({
-            "_id": user.id,
-            "reason": reason
-        })
-        await self.client.get_blacklisted_users()
+        e = self.client.blacklisted_cache.get(user.id)
+        if e is not None:
+            ctx.command.reset_cooldown(ctx)
+            return await ctx.reply(embed=error_embed(
+                f"{EMOJIS['tick_no']} Error!",
+                f"This kid is already blacklisted.\n```yaml\nReason: {e['reason']}\n```"
+            ))
+        await self.client.add_to_blacklist(user.id, reason)
         return await ctx.reply(embed=success_embed(
             f"{EMOJIS['tick_yes']} Kid Blacklisted!",
             f"Done! I have blacklisted **{escape_markdown(str(user))}**."
@@ -118,16 +184,12 @@ User profile DB: {round(time.time() - self.client.last_updated_user_profile_db)}
                 f"{EMOJIS['tick_no']} Invalid Usage!",
                 f"Mention who you wanna unblacklist next time.\nExample: `{prefix}unblacklist @egirl`"
             ))
-        for e in self.client.blacklisted_cache:
-            if e['_id'] == user.id:
-                await self.client.blacklisted.delete_one({
-                    "_id": user.id
-                })
-                await self.client.get_blacklisted_users()
-                return await ctx.message.reply(embed=success_embed(
-                    f"{EMOJIS['tick_yes']} Kid Unblacklisted!",
-                    f"Done! I have unblacklisted **{escape_markdown(str(user))}**.\n```yaml\nReason: {e['reason']}\n```"
-                ))
+        if self.client.is_blacklisted(user.id):
+            e = await self.client.remove_from_blacklist(user.id)
+            return await ctx.message.reply(embed=success_embed(
+                f"{EMOJIS['tick_yes']} Kid Unblacklisted!",
+                f"Done! I have unblacklisted **{escape_markdown(str(user))}**.\n```yaml\nReason: {e['reason']}\n```"
+            ))
         ctx.command.reset_cooldown(ctx)
         return await ctx.message.reply(embed=error_embed(
             f"{EMOJIS['tick_yes']} Kid Not Found!",
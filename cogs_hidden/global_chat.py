@@ -15,18 +15,18 @@ limitations under the License.
 """
 
 import discord
-import urllib
 import re
-import emojis
 from discord.ext import commands
 from config import (
     DEFAULT_BANNED_WORDS, GLOBAL_CHAT_RULES,
     EMOJIS, RED_COLOR, EMPTY_CHARACTER, OWNERS
 )
 from utils.embed import success_embed, error_embed
-from collections import Counter
 from utils.ui import Confirm
 from utils.bot import EpicBot
+from utils.message_pipeline import MessageContext
+from utils.text_features import TextFeatures
+from utils.word_matcher import compile_words, make_stripper
 
 
 class GlobalChat(commands.Cog):
@@ -34,12 +34,12 @@ class GlobalChat(commands.Cog):
         self.client = client
         self.url_regex = r"(?i)\b((?:https?://|www\d{0,3}[.]|[a-z0-9.\-]+[.][a-z]{2,4}/)(?:[^\s()<>]+|\(([^\s()<>]+|(\([^\s()<>]+\)))*\))+(?:\(([^\s()<>]+|(\([^\s()<>]+\)))*\)|[^\s`!()\[\]{};:'\".,<>?«»“”‘’]))"
         self.invite_regex = re.compile(r'((http(s|):\/\/|)(discord)(\.(gg|io|me)\/|app\.com\/invite\/)([0-z]+))')
-        self.zalgo_regex = re.compile(r"%CC%", re.MULTILINE)
 
         self.cooldown = commands.CooldownMapping.from_cooldown(1, 2, commands.BucketType.user)
         self.peng = discord.AllowedMentions.none()
 
         self.confirmation_cooldown = commands.CooldownMapping.from_cooldown(1, 60, commands.BucketType.user)
+        self.client.message_pipeline.register("global_chat", self.global_chat, order=70, background=True)
 
         self.replace_stuff = [
             '\n', ' ', '~', '.', ',', '!', EMPTY_CHARACTER,
@@ -48,36 +48,24 @@ class GlobalChat(commands.Cog):
             '}', '\'', '"', '<', '>', '?', '`', '|', '\t', '\r',
             '​'
         ]
+        self.strip_separators = make_stripper(self.replace_stuff)
+        self.banned_words = compile_words(tuple(DEFAULT_BANNED_WORDS))
 
-    def isinglish(self, s: str):
-        s = emojis.decode(s)
-        try:
-            s.encode(encoding='utf-8').decode('ascii')
-        except UnicodeDecodeError:
-            return False
-        else:
-            return True
-
-    async def check_message(self, content: str, user_id: int) -> bool:
-        temp_cont = content
+    async def check_message(self, features: TextFeatures, user_id: int) -> bool:
+        content = features.text
+        temp_cont = self.strip_separators(features.lower)
 
-        for stuff in self.replace_stuff:
-            temp_cont = temp_cont.replace(stuff, "")
-
-        for w in DEFAULT_BANNED_WORDS:
-            if w in temp_cont.lower():
-                return False
+        if self.banned_words.find(temp_cont) is not None:
+            return False
 
-        if not self.isinglish(content):
+        # emojis are fine, anything else that isn't english isn't
+        if features.non_ascii_text:
             return False
 
-        if len(content) > 150:
-            c_ = Counter(content.lower())
-            for c, n in c_.most_common(None):
-                if c != ' ' and len(content) / n < 8:
-                    return False
+        if features.length > 150 and features.max_char_count and features.length / features.max_char_count < 8:
+            return False
 
-        if len(content) > 500:
+        if features.length > 500:
             return False
 
         invite_match = self.invite_regex.findall(content)
@@ -87,36 +75,34 @@ class GlobalChat(commands.Cog):
         if re.search(self.url_regex, content) and user_id not in OWNERS:
             return False
 
-        if self.zalgo_regex.search(urllib.parse.quote(content.encode("utf-8"))):
+        if features.combining_marks:
             return False
 
         return True
 
-    @commands.Cog.listener("on_message")
-    async def global_chat(self, message: discord.Message):
-        if message.author.bot or not message.guild:
-            return
+    def cog_unload(self):
+        self.client.message_pipeline.unregister("global_chat")
 
+    async def global_chat(self, message: discord.Message, mctx: MessageContext):
         bucket = self.cooldown.get_bucket(message)
         retry_after = bucket.update_rate_limit()
 
         if retry_after and message.author.id != 558861606063308822:
             return
 
-        g = await self.client.get_guild_config(message.guild.id)
-        p = await self.client.get_user_profile_(message.author.id)
+        g = mctx.guild_config
         if not g['globalchat']:
             return
         if message.channel != self.client.get_channel(g['globalchat']):
             return
+        p = await mctx.get_profile()
 
-        if not await self.check_message(message.content, message.author.id) or message.content == "":
+        if not await self.check_message(mctx.text_features, message.author.id) or message.content == "":
             await message.add_reaction('❌')
             return
 
-        for e in self.client.blacklisted_cache:
-            if message.author.id == e['_id']:
-                return
+        if mctx.blacklisted:
+            return
 
         if message.edited_at is not None:
             return
@@ -140,22 +126,40 @@ class GlobalChat(commands.Cog):
             if not v.value:
                 return await msg__.edit(content="", embed=discord.Embed(title=f"{EMOJIS['tick_no']} Cancelled.", color=RED_COLOR), view=None)
             p.update({"gc_rules_accepted": True})
+            self.client.journal.mark("user_profile", p['_id'], "gc_rules_accepted")
             return await msg__.edit(content="", embed=success_embed("Thank you.", "Enjoy chatting with people :D"), view=None)
 
-        for g in self.client.serverconfig_cache:
+        data = {
+            "content": message.content,
+            "channel_id": message.channel.id,
+            "author": str(message.author),
+            "author_avatar": message.author.display_avatar.url,
+            "nick": p['gc_nick'],
+            "avatar": p['gc_avatar'],
+        }
+        # the other clusters send it to the global chat channels of their guilds
+        self.client.cluster_send("global_chat", data)
+        await self.send_to_channels(data)
+
+    @commands.Cog.listener()
+    async def on_cluster_global_chat(self, data):
+        await self.send_to_channels(data)
+
+    async def send_to_channels(self, data: dict):
+        for g in list(self.client.serverconfig_cache.values()):
             if g['globalchat']:
                 channel = self.client.get_channel(g['globalchat'])
-                if channel and channel != message.channel:
+                if channel and channel.id != data['channel_id']:
                     webhooks = await channel.webhooks()
                     webhook = discord.utils.get(webhooks, name="EpicBot Global Chat", user=self.client.user)
                     if webhook is None:
                         webhook = await channel.create_webhook(name="EpicBot Global Chat")
 
                     await webhook.send(
-                        message.content,
+                        data['content'],
                         allowed_mentions=self.peng,
-                        username=str(message.author) if p['gc_nick'] is None or channel.id == 863375202284077066 else p['gc_nick'],
-                        avatar_url=message.author.display_avatar.url if p['gc_avatar'] is None or channel.id == 863375202284077066 else p['gc_avatar']
+                        username=data['author'] if data['nick'] is None or channel.id == 863375202284077066 else data['nick'],
+                        avatar_url=data['author_avatar'] if data['avatar'] is None or channel.id == 863375202284077066 else data['avatar']
                     )
 
 
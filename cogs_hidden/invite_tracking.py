@@ -36,12 +36,14 @@ class InviteTracking(commands.Cog):
 
     @commands.Cog.listener(name="on_invite_delete")
     async def updating_guild_invites_on_delete(self, invite: discord.Invite):
+        self.client.invite_cache.put(invite.code, None)
         g = await self.client.get_guild_config(invite.guild.id)
         if g['welcome']['channel_id'] is not None:
             await self.client.update_guild_before_invites(invite.guild.id)
 
     @commands.Cog.listener(name="on_invite_create")
     async def updating_guild_invites_on_create(self, invite: discord.Invite):
+        self.client.invite_cache.put(invite.code, invite.guild.id)
         g = await self.client.get_guild_config(invite.guild.id)
         if g['welcome']['channel_id'] is not None:
             await self.client.update_guild_before_invites(invite.guild.id)
@@ -19,6 +19,7 @@ import discord
 from discord.ext import commands
 from utils.embed import success_embed, error_embed
 from utils.bot import EpicBot
+from utils.message_pipeline import MessageContext
 from config import (
     COOLDOWN_BYPASS, EMOJIS, OWNERS,
     PREFIX, MAIN_COLOR, EMPTY_CHARACTER, WEBSITE_LINK,
@@ -29,11 +30,16 @@ from config import (
 class Logs(commands.Cog):
     def __init__(self, client: EpicBot):
         self.client = client
+        self.client.message_pipeline.register("dm_logs", self.dm_logs, order=90, dms=True, guilds=False, background=True)
+
+    def cog_unload(self):
+        self.client.message_pipeline.unregister("dm_logs")
 
     @commands.Cog.listener(name="on_command_completion")
     async def add_cmd_used_count_user_profile(self, ctx: commands.Context):
         user_profile = await self.client.get_user_profile_(ctx.author.id)
         user_profile.update({"cmds_used": user_profile['cmds_used'] + 1})
+        self.client.journal.mark("user_profile", user_profile['_id'], "cmds_used")
 
     @commands.Cog.listener()
     async def on_command(self, ctx: commands.Context):
@@ -53,10 +59,7 @@ class Logs(commands.Cog):
         webhook = webhooks.get("cmd_uses")
         await webhook.send(embed=embed)
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.author.bot:
-            return
+    async def dm_logs(self, message: discord.Message, mctx: MessageContext):
         if str(message.channel.type) == 'private':
             files = []
             for e in message.attachments:
@@ -147,11 +150,9 @@ I hope you have a fun time with me, UwU!~
         ).set_author(name=guild.owner, icon_url=guild.owner.display_avatar.url)
         if guild.icon is not None:
             embed.set_thumbnail(url=guild.icon.url)
-        for e in self.client.serverconfig_cache:
-            if e['_id'] == guild.id:
-                self.client.serverconfig_cache.remove(e)
-                await self.client.serverconfig.delete_one({"_id": guild.id})
-                break
+        if self.client.serverconfig_cache.pop(guild.id, None) is not None:
+            self.client.serverconfig_tracker.forget(guild.id)
+            await self.client.serverconfig.delete_one({"_id": guild.id})
         webhook = self.client.get_cog("Webhooks").webhooks.get("add_remove")
         await webhook.send(embed=embed)
 
@@ -59,7 +59,7 @@ class TwitchNotifs(commands.Cog):
     @tasks.loop(minutes=2)
     async def live_notifs_loop(self):
         await self.client.wait_until_ready()
-        for e in self.client.serverconfig_cache:
+        for e in list(self.client.serverconfig_cache.values()):
             if e['twitch']['username'] is not None and e['twitch']['channel_id'] is not None:
                 channel = self.client.get_channel(e['twitch']['channel_id'])
                 if channel is not None:
@@ -20,6 +20,7 @@ import random
 from discord.ext import commands
 from config import CUTE_EMOJIS
 from utils.bot import EpicBot
+from utils.message_pipeline import MessageContext
 
 
 class VoteTracking(commands.Cog):
@@ -28,9 +29,12 @@ class VoteTracking(commands.Cog):
         self.vote_tracking_bot_id = 702134514637340702
         self.vote_scraping_channel_id = 851658500118413313
         self.vote_sending_channel_id = 776015595354325002
+        self.client.message_pipeline.register("vote_tracking", self.haha_vot_go_brr, order=51, bots=True, background=True)
 
-    @commands.Cog.listener("on_message")
-    async def haha_vot_go_brr(self, message: discord.Message):
+    def cog_unload(self):
+        self.client.message_pipeline.unregister("vote_tracking")
+
+    async def haha_vot_go_brr(self, message: discord.Message, mctx: MessageContext):
         if message.author.id != self.vote_tracking_bot_id:
             return
         if message.channel.id != self.vote_scraping_channel_id:
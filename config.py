@@ -24,6 +24,38 @@ BOT_TOKEN_BETA = os.environ.get("TOKEN_BETA")  # the token of the beta bot (opti
 MONGO_DB_URL = os.environ.get("MONGO")  # your mongodb database connection url string
 MONGO_DB_URL_BETA = os.environ.get("MONGO_BETA")  # database for the beta bot (optional)
 DB_UPDATE_INTERVAL = 60  # the interval at which the database is updated
+RANK_CARD_WORKERS = 2  # the number of processes used to render rank cards
+RANK_CARD_PRELOAD = None  # the rank card templates loaded when a render process starts (None = all of them)
+AVATAR_CACHE_MAX_ITEMS = 1024  # the max number of avatars kept in memory
+AVATAR_CACHE_MAX_BYTES = 64 * 1024 * 1024  # the max total size of the avatars kept in memory
+AVATAR_CACHE_TTL = 300  # the number of seconds an avatar is kept in memory
+INVITE_CACHE_MAX_ITEMS = 4096  # the max number of resolved invite codes kept in memory
+INVITE_CACHE_TTL = 3600  # the number of seconds a resolved invite code is remembered
+INVITE_CACHE_NEGATIVE_TTL = 600  # the number of seconds an invalid invite code is remembered
+SNAPSHOT_PATH = "cache_snapshot.bin"  # where the caches are saved locally so a restart doesn't have to load everything from the db
+SNAPSHOT_INTERVAL = 300  # the interval at which that file is written
+SNAPSHOT_MAX_AGE = 24 * 60 * 60  # snapshots older than this many seconds are ignored and everything is loaded from the db
+JOURNAL_PATH = "journal"  # the folder where cache changes are written until the next db flush
+JOURNAL_COMMIT_INTERVAL = 0.05  # the number of seconds changes are collected before they're written with one fsync
+JOURNAL_SEGMENT_MAX_BYTES = 4 * 1024 * 1024  # the size at which a journal file is closed and a new one is started
+SHUTDOWN_TIMEOUT = 30  # the max number of seconds the bot waits for the final db flush when it's shutting down
+SHARD_COUNT = 2  # the total number of shards, set this to 1 if your bot is under 1000 servers
+CLUSTER_COUNT = 1  # the number of processes cluster.py splits the shards across
+CLUSTER_IPC_HOST = "127.0.0.1"  # where cluster.py listens for its workers
+CLUSTER_IPC_PORT = 20000  # and on which port
+CLUSTER_PROFILE_SYNC_DELAY = 0.1  # the number of seconds profile changes are collected before they're sent to the other clusters
+CLUSTER_PROFILE_TIMEOUT = 2  # the number of seconds a cluster waits for the one that owns a user profile to answer
+PROFILE_MIRROR_TTL = 300  # the number of seconds an unused copy of another cluster's user profile is kept in memory
+PROFILE_CACHE_MAX_ITEMS = 20000  # the max number of user profiles kept in memory
+PROFILE_CACHE_MAX_BYTES = 32 * 1024 * 1024  # the max total (bson) size of the user profiles kept in memory
+PROFILE_CACHE_TTL = 1800  # the number of seconds an unused user profile is kept in memory
+AUTOMOD_SPAM_WINDOW = 7  # the number of seconds automod looks back when checking for message spam
+AUTOMOD_SPAM_THRESHOLD = 5  # the number of messages within that window that count as spam
+AUTOMOD_SPAM_MAX_USERS = 50000  # the max number of users whose recent messages are kept for the spam check
+AUTOMOD_SPAM_MAX_PER_USER = 50  # the max number of recent messages kept per user, the spam check deletes at most this many
+AUTOMOD_MOD_CACHE_MAX = 50000  # the max number of members whose moderator status automod remembers
+AUTOMOD_ACTION_WINDOW = 1  # the number of seconds automod collects deletions in a channel before doing them together
+AUTOMOD_AUTOMATON_MIN_WORDS = 150  # banned word lists at least this long are matched with an automaton instead of one substring check per word
 
 PREFIX = "e!"  # the default prefix for the bot
 OWNERS = [558861606063308822]  # the bot owners
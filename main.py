@@ -21,13 +21,12 @@ from os import environ
 
 basicConfig(level=INFO)
 
-client = EpicBot()
 environ.setdefault("JISHAKU_HIDE", "1")
 environ.setdefault("JISHAKU_NO_UNDERSCORE", "1")
 
 
-@client.check
 async def check_commands(ctx):
+    client = ctx.bot
     if client.beta:
         if ctx.message.author.id not in OWNERS:
             return False  # if running beta version, then only allow owners
@@ -42,5 +41,13 @@ async def check_commands(ctx):
     return (ctx.command.name not in dc) and (ctx.channel.id not in dch) and (ctx.command.cog not in dcc_cogs)
 
 
+def create_client(**kwargs) -> EpicBot:
+    # cluster.py makes one of these in every worker process
+    client = EpicBot(**kwargs)
+    client.add_check(check_commands)
+    return client
+
+
 if __name__ == '__main__':
+    client = create_client()
     client.run(BOT_TOKEN if not client.beta else BOT_TOKEN_BETA)
@@ -0,0 +1,152 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+# a stand-in for the motor collections the cache loading uses, kept in memory. every round trip
+# (a find batch, a find_one, a bulk_write) waits `latency` seconds plus `per_doc` for every document
+# in it, so loading things at the same time is actually faster than one after the other, like it
+# is against a real db.
+
+import asyncio
+import copy
+
+from pymongo import UpdateOne
+
+
+MISSING = object()
+
+
+def matches(doc, query) -> bool:
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+            continue
+        if field.startswith("$"):
+            raise NotImplementedError(field)
+        value = doc.get(field, MISSING)
+        if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+            for op, arg in condition.items():
+                if op == "$exists":
+                    if (value is not MISSING) != arg:
+                        return False
+                elif op in ("$lt", "$gt"):
+                    if value is MISSING or not (value < arg if op == "$lt" else value > arg):
+                        return False
+                else:
+                    raise NotImplementedError(op)
+        elif value != condition:
+            return False
+    return True
+
+
+def project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    include = {k for k, v in projection.items() if v}
+    if include:
+        out = {k: doc[k] for k in include if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+    else:
+        out = {k: v for k, v in doc.items() if k not in projection}
+    return copy.deepcopy(out)
+
+
+class MemoryCursor:
+    def __init__(self, collection, query, projection):
+        self.collection = collection
+        self.query = query or {}
+        self.projection = projection
+        self.sort_key = None
+        self.size = 1000
+
+    def sort(self, key, direction=1):
+        self.sort_key = (key, direction)
+        return self
+
+    def batch_size(self, size):
+        self.size = size
+        return self
+
+    async def __aiter__(self):
+        docs = [doc for doc in self.collection.docs if matches(doc, self.query)]
+        if self.sort_key is not None:
+            docs.sort(key=lambda d: d[self.sort_key[0]], reverse=self.sort_key[1] < 0)
+        for i in range(0, len(docs), self.size):
+            await self.collection.round_trip(len(docs[i:i + self.size]))
+            for doc in docs[i:i + self.size]:
+                yield project(doc, self.projection)
+
+
+class MemoryCollection:
+    def __init__(self, docs=(), latency: float = 0, per_doc: float = 0):
+        self.docs = [copy.deepcopy(doc) for doc in docs]
+        self.latency = latency
+        self.per_doc = per_doc
+        self.round_trips = 0
+        self.indexes = set()
+
+    async def round_trip(self, count: int = 1):
+        self.round_trips += 1
+        await asyncio.sleep(self.latency + self.per_doc * count)
+
+    async def create_index(self, key):
+        await self.round_trip()
+        self.indexes.add(key)
+        return f"{key}_1"
+
+    def find(self, query=None, projection=None):
+        return MemoryCursor(self, query, projection)
+
+    async def find_one(self, query, projection=None):
+        await self.round_trip()
+        for doc in self.docs:
+            if matches(doc, query):
+                return project(doc, projection)
+        return None
+
+    async def bulk_write(self, requests, ordered=True):
+        await self.round_trip(len(requests))
+        for request in requests:
+            if not isinstance(request, UpdateOne):
+                raise NotImplementedError(type(request).__name__)
+            self.update(request._filter, request._doc, request._upsert)
+
+    def update(self, filter_, update, upsert=False):
+        for op in update:
+            if op != "$set":
+                raise NotImplementedError(op)
+        doc = next((d for d in self.docs if matches(d, filter_)), None)
+        if doc is None:
+            if not upsert:
+                return
+            doc = copy.deepcopy(filter_)
+            self.docs.append(doc)
+        doc.update(copy.deepcopy(update.get("$set", {})))
+
+
+class MemoryDatabase:
+    def __init__(self, latency: float = 0, per_doc: float = 0):
+        self.latency = latency
+        self.per_doc = per_doc
+        self.collections = {}
+
+    def __getitem__(self, name) -> MemoryCollection:
+        collection = self.collections.get(name)
+        if collection is None:
+            collection = self.collections[name] = MemoryCollection(latency=self.latency, per_doc=self.per_doc)
+        return collection
@@ -0,0 +1,71 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import asyncio
+
+import pytest
+
+from utils.coalesce import Coalescer
+
+
+def test_same_key_is_fetched_once():
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key * 2
+
+    async def run():
+        c = Coalescer()
+        results = await asyncio.gather(*(c.run(k, lambda k=k: fetch(k)) for k in (1, 1, 1, 2)))
+        return c, results
+
+    c, results = asyncio.run(run())
+    assert results == [2, 2, 2, 4]
+    assert sorted(calls) == [1, 2]
+    assert (c.started, c.joined, len(c)) == (2, 2, 0)
+
+
+def test_one_cancelled_caller_doesnt_cancel_the_others():
+    async def run():
+        c = Coalescer()
+        first = asyncio.ensure_future(c.run("k", lambda: asyncio.sleep(0.02, result="done")))
+        second = asyncio.ensure_future(c.run("k", lambda: asyncio.sleep(0.02, result="again")))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_failures_reach_everyone_and_arent_kept():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("nope")
+
+    async def run():
+        c = Coalescer()
+        results = await asyncio.gather(c.run("k", fail), c.run("k", fail), return_exceptions=True)
+        return c, results
+
+    c, results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert c.started == 1 and not c.pending
+
+    with pytest.raises(ValueError):
+        asyncio.run(Coalescer().run("k", fail))
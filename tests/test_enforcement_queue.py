@@ -0,0 +1,102 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("discord")
+
+from utils.enforcement_queue import EnforcementQueue  # noqa: E402
+
+WARNING = "watch your language."
+
+
+class FakeChannel:
+    # records what the queue asks discord to do, every request takes `delay` seconds
+    def __init__(self, channel_id: int = 1, delay: float = 0.05):
+        self.id = channel_id
+        self.delay = delay
+        self.deletes = []
+        self.warnings = []
+
+    async def delete_messages(self, messages):
+        await asyncio.sleep(self.delay)
+        self.deletes.append([m.id for m in messages])
+
+    async def send(self, content, **kwargs):
+        await asyncio.sleep(self.delay)
+        self.warnings.append(content)
+
+
+def enqueue_message(queue, channel, message_id, user_id):
+    # what automod does for one bad message
+    queue.enqueue(channel, [message_id])
+    queue.enqueue(channel, [], f"<@{user_id}>", WARNING)
+
+
+def test_lone_message_goes_out_right_away():
+    async def run():
+        queue = EnforcementQueue(window=5)
+        channel = FakeChannel()
+        enqueue_message(queue, channel, 1, 10)
+        await asyncio.sleep(channel.delay * 3)
+        return queue, channel
+
+    queue, channel = asyncio.run(run())
+    assert channel.deletes == [[1]]
+    assert channel.warnings == [f"<@10>, {WARNING}"]
+    assert queue.immediate == 1
+
+
+def test_burst_in_one_channel_is_batched():
+    async def run():
+        queue = EnforcementQueue(window=0.2)
+        channel = FakeChannel()
+        # every message comes in as its own event, so the loop runs between them
+        for i in range(30):
+            enqueue_message(queue, channel, 100 + i, 10 + i % 3)
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.5)
+        return queue, channel
+
+    queue, channel = asyncio.run(run())
+    # the first one looked like a lone message, everything after it came in while it was being
+    # deleted and has to end up in one delete and one warning
+    first, rest = channel.deletes[0], channel.deletes[1:]
+    assert first == [100]
+    assert rest == [list(range(101, 130))]
+    assert len(channel.warnings) == 2
+    assert channel.warnings[1] == f"<@11> <@12> <@10>, {WARNING}"
+    assert queue.immediate == 1
+    assert queue.deleted == 30
+    assert not queue.in_flight and not queue.batches
+
+
+def test_burst_queued_at_once_is_one_delete():
+    async def run():
+        queue = EnforcementQueue(window=0.1)
+        channel = FakeChannel()
+        for i in range(30):
+            enqueue_message(queue, channel, 100 + i, 10)
+        await asyncio.sleep(0.3)
+        return queue, channel
+
+    queue, channel = asyncio.run(run())
+    assert channel.deletes == [list(range(100, 130))]
+    assert channel.warnings == [f"<@10>, {WARNING}"]
+    assert queue.immediate == 0
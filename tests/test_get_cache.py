@@ -0,0 +1,236 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import asyncio
+import copy
+import os
+import random
+import shutil
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("motor")
+
+from memory_db import MemoryDatabase  # noqa: E402
+from utils.bot import EpicBot  # noqa: E402
+from utils.migrations import default_guild_config, default_user_profile  # noqa: E402
+
+GUILDS = list(range(1000, 1060))
+USERS = list(range(1, 121))
+
+
+def make_db(latency: float = 0) -> MemoryDatabase:
+    rng = random.Random(0)
+    db = MemoryDatabase(latency)
+    for guild_id in GUILDS:
+        # some of them from before the migrations, with pieces missing
+        prefix = "e!" if guild_id % 3 else ["e!", "?"]
+        db['prefixes'].docs.append({"_id": guild_id, "prefix": prefix})
+        config = default_guild_config(guild_id)
+        if guild_id % 4 == 0:
+            del config['antialts'], config['tickets']
+        db['serverconfig'].docs.append(config)
+    for user_id in USERS:
+        profile = default_user_profile(user_id)
+        profile['cmds_used'] = rng.randrange(100)
+        if user_id % 5 == 0:
+            del profile['married_to'], profile['badges']
+        db['user_profile'].docs.append(profile)
+        for guild_id in rng.sample(GUILDS, 3):
+            db['leveling'].docs.append({"id": user_id, "guild_id": guild_id, "xp": rng.randrange(10 ** 5), "messages": rng.randrange(1000)})
+    # a duplicate row, only the first one is ever used
+    db['leveling'].docs.append(dict(db['leveling'].docs[0], xp=1))
+    db['reminders'].docs.extend({"_id": f"r{i}", "user_id": i, "time": 10 ** 10, "set_time": 0, "reminder": "hi"} for i in range(5))
+    db['blacklisted'].docs.extend({"_id": i, "reason": "spam"} for i in (7, 8, 9))
+    return db
+
+
+def make_bot(db, journal_path) -> EpicBot:
+    # everything the cache loading needs, without EpicBot.__init__ connecting and loading the cogs
+    bot = EpicBot.__new__(EpicBot)
+    bot.shard_ids = None
+    bot.shard_count = 1
+    bot.cluster_id = None
+    bot.cluster_count = 1
+    bot.loop = asyncio.get_running_loop()
+    bot.init_caches(db)
+    os.makedirs(journal_path, exist_ok=True)
+    bot.journal.path = str(journal_path)
+    bot.cache_loaded = True
+    return bot
+
+
+async def load_sequentially(bot):
+    # what get_cache did before the loaders ran at the same time
+    for loader in (
+        bot.load_prefixes, bot.load_serverconfig, bot.load_reminders,
+        bot.load_leveling, bot.load_user_profiles, bot.get_blacklisted_users
+    ):
+        await loader()
+    await bot.replay_journal()
+    bot.journal_replayed = True
+
+
+async def flush_all(bot):
+    for loop in (bot.update_prefixes_db, bot.update_serverconfig_db, bot.update_leveling_db, bot.update_user_profile_db):
+        await loop()
+
+
+async def change(bot, rng, users, guilds, counter="cmds_used", setting="disabled_cmds"):
+    # the kind of thing the cogs do, marked in the journal like they do it
+    for user_id in users:
+        p = await bot.get_user_profile_(user_id)
+        p[counter] += rng.randrange(1, 5)
+        bot.journal.mark("user_profile", user_id, counter)
+        e = bot.get_leveling_board(rng.choice(GUILDS)).docs.get(user_id)
+        if e is not None:
+            e['xp'] += 25
+            e['messages'] += 1
+            bot.journal.mark("leveling", (user_id, e['guild_id']), "xp", "messages")
+    for guild_id in guilds:
+        g = await bot.get_guild_config(guild_id)
+        if setting == "disabled_cmds":
+            g['disabled_cmds'] = g['disabled_cmds'] + [f"cmd{rng.randrange(100)}"]
+        else:
+            g[setting] = not g[setting]
+        bot.journal.mark("serverconfig", guild_id, setting)
+        bot.prefixes_cache[guild_id]['prefix'] = ["e!", f"{guild_id}!"]
+
+
+def caches(bot) -> dict:
+    return {
+        "prefixes": bot.prefixes_cache,
+        "serverconfig": bot.serverconfig_cache,
+        "leveling": sorted((e['id'], e['guild_id'], e['xp'], e['messages']) for e in bot.leveling_cache),
+        "boards": {guild_id: sorted(board.xp.top(len(board))) for guild_id, board in bot.leveling_boards.items() if len(board)},
+        "reminders": sorted(bot.reminders, key=lambda e: e['_id']),
+        "blacklisted": bot.blacklisted_cache,
+    }
+
+
+async def profiles(bot) -> dict:
+    return {user_id: bot.user_profile_fields(await bot.get_user_profile_(user_id)) for user_id in USERS + [500, 501]}
+
+
+def contents(db) -> dict:
+    return {
+        name: sorted(
+            ({k: v for k, v in doc.items() if k != "_updated_at"} for doc in collection.docs),
+            key=lambda d: repr(sorted(d.items()))
+        )
+        for name, collection in db.collections.items()
+    }
+
+
+@pytest.fixture
+def previous_run(tmp_path, monkeypatch):
+    # a run that flushed, saved a snapshot, flushed again and then crashed with changes only in the journal
+    monkeypatch.chdir(tmp_path)
+
+    async def run():
+        rng = random.Random(1)
+        db = make_db()
+        bot = make_bot(db, tmp_path / "previous" / "journal")
+        await bot.get_cache()
+        bot.cache_loaded = True
+
+        await change(bot, rng, USERS[:30], GUILDS[:10])
+        await bot.journal.commit()
+        await flush_all(bot)
+        await bot.save_snapshot()
+
+        await asyncio.sleep(0.01)
+        # newer in the db than the snapshot, some of these get changed again below
+        await change(bot, rng, USERS[20:60], GUILDS[5:25])
+        await bot.journal.commit()
+        await flush_all(bot)
+
+        # other fields than the ones flushed above, both have to survive
+        await change(bot, rng, USERS[50:90] + [500, 501], GUILDS[20:35], counter="bites", setting="nqn")
+        # a new member, only in the journal
+        e = {"id": 502, "guild_id": GUILDS[0], "xp": 40, "messages": 2}
+        bot.leveling_cache.append(e)
+        bot.get_leveling_board(GUILDS[0]).add(e)
+        bot.journal.mark("leveling", (502, GUILDS[0]))
+        await bot.journal.commit()
+        bot.journal.close()
+        return db
+
+    return asyncio.run(run())
+
+
+def test_concurrent_and_snapshot_loads_match_a_sequential_load(previous_run, tmp_path):
+    async def run():
+        results = {}
+        for name in ("sequential", "concurrent", "snapshot"):
+            journal = tmp_path / name / "journal"
+            shutil.copytree(tmp_path / "previous" / "journal", journal)
+            db = copy.deepcopy(previous_run)
+            bot = make_bot(db, journal)
+            if name == "sequential":
+                await load_sequentially(bot)
+            else:
+                await bot.get_cache(use_snapshot=name == "snapshot")
+                assert bot.reconciling == (name == "snapshot")
+                while bot.reconciling:
+                    await asyncio.sleep(0.01)
+            cached = caches(bot)
+            cached['profiles'] = await profiles(bot)
+            await flush_all(bot)
+            results[name] = copy.deepcopy(cached), contents(db)
+        return results
+
+    results = asyncio.run(run())
+    sequential_caches, sequential_db = results["sequential"]
+    # the journal made it back: the new member and the profiles nobody had before the crash
+    assert (502, GUILDS[0], 40, 2) in sequential_caches['leveling']
+    assert 500 in sequential_caches['profiles']
+    for name in ("concurrent", "snapshot"):
+        cached, db = results[name]
+        for key in sequential_caches:
+            assert cached[key] == sequential_caches[key], (name, key)
+        assert db == sequential_db, name
+
+
+def test_runtime_getcache_doesnt_replay_again(previous_run, tmp_path):
+    async def run():
+        journal = tmp_path / "again" / "journal"
+        shutil.copytree(tmp_path / "previous" / "journal", journal)
+        bot = make_bot(copy.deepcopy(previous_run), journal)
+        await bot.get_cache()
+        replayed = bot.journal.replayed
+        segments = bot.journal.stats()['segments']
+        await bot.get_cache()
+        assert bot.journal.replayed == replayed
+        assert bot.journal.stats()['segments'] == segments
+
+    asyncio.run(run())
+
+
+def test_startup_queries_have_their_indexes(tmp_path):
+    async def run():
+        db = make_db()
+        bot = make_bot(db, tmp_path / "journal")
+        await bot.get_cache()
+        return db
+
+    db = asyncio.run(run())
+    for name in ("prefixes", "serverconfig", "leveling", "user_profile"):
+        assert "_updated_at" in db[name].indexes, name
+    for name in ("prefixes", "serverconfig", "user_profile"):
+        assert "_schema" in db[name].indexes, name
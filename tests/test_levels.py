@@ -0,0 +1,65 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from utils.levels import level_for_xp, progress_in_level, xp_for_level
+
+
+# what cogs_hidden/leveling.py used to do, kept here to compare against
+def old_get_level(xp, lvl=0):
+    while True:
+        if xp < ((50 * (lvl ** 2)) + 50 * lvl):
+            break
+        lvl += 1
+    return lvl
+
+
+def old_xp_for_level(lvl):
+    return (50 * ((lvl - 1) ** 2)) + (50 * (lvl - 1))
+
+
+def test_level_for_xp_matches_the_old_loop():
+    # the loop's condition only gets easier to meet as xp goes up, so starting it from
+    # the previous answer gives exactly what it would give starting from 0
+    lvl = 0
+    for xp in range(0, 10 ** 6 + 1):
+        lvl = old_get_level(xp, lvl)
+        assert level_for_xp(xp) == lvl, xp
+
+
+def test_level_for_xp_big_and_negative():
+    for xp in (-1, -50, -10 ** 9, 10 ** 12, 10 ** 12 + 49, 5 * 10 ** 15):
+        assert level_for_xp(xp) == old_get_level(xp), xp
+
+
+def test_xp_for_level_matches_the_old_formula():
+    for lvl in range(1, 5000):
+        assert xp_for_level(lvl) == old_xp_for_level(lvl), lvl
+    assert xp_for_level(0) == 0
+
+
+def test_progress_in_level_matches_the_rank_card():
+    lvl = 0
+    for xp in range(0, 200000, 7):
+        lvl = old_get_level(xp, lvl)
+        assert progress_in_level(xp) == (xp - old_xp_for_level(lvl), int(200 * ((1 / 2) * lvl))), xp
+
+
+def test_level_up_is_exactly_on_the_boundary():
+    # add_xp announces a level up when the xp lands exactly on xp_for_level
+    for lvl in range(1, 1000):
+        assert level_for_xp(xp_for_level(lvl)) == lvl
+        assert level_for_xp(xp_for_level(lvl + 1) - 1) == lvl
@@ -0,0 +1,61 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import random
+import re
+
+from utils.prefixes import PrefixMatcher
+
+
+def old_match(prefixes, content):
+    # what get_custom_prefix did on every message before PrefixMatcher
+    comp = re.compile("^(" + "|".join(re.escape(p) for p in prefixes) + ").*", flags=re.I)
+    match = comp.match(content)
+    if match is not None:
+        return match.group(1)
+    return None
+
+
+def test_same_matches_as_the_old_regex():
+    rng = random.Random(0)
+    pieces = ["e", "E", "!", "s", "S", "ſ", "k", "K", "K", "?", "i", "I", "İ", "ı", "x", "<@1> ", "<@!1> ", "ǆ", "ǅ", "Ǆ", "é", "É", " ", "a"]
+    for prefixes in (
+        ["<@1> ", "<@!1> ", "e!"],
+        ["<@1> ", "<@!1> ", "s!", "K?", "İx", "ſ"],
+        ["<@1> ", "<@!1> ", "Ǆ", "é!", "e"],
+    ):
+        matcher = PrefixMatcher(prefixes)
+        for _ in range(5000):
+            content = "".join(rng.choice(pieces) for _ in range(rng.randrange(0, 6)))
+            assert matcher.match(content) == old_match(prefixes, content), (prefixes, content)
+
+
+def test_case_insensitive_like_before():
+    matcher = PrefixMatcher(["e!"])
+    assert matcher.match("E!help") == "E!"
+    assert matcher.match("e!help") == "e!"
+    assert matcher.match("help") is None
+
+
+def test_empty_prefix():
+    matcher = PrefixMatcher(["<@1> ", "", "e!"])
+    # a real prefix still wins when it's there
+    assert matcher.match("e!help") == "e!"
+    assert matcher.match("help") == ""
+    assert matcher.match("") == ""
+    assert PrefixMatcher([""]).match("help") == ""
+    assert PrefixMatcher([]).match("help") is None
@@ -0,0 +1,229 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("bson")
+
+from memory_db import MemoryDatabase  # noqa: E402
+from utils.migrations import default_user_profile, stamp, upgrade  # noqa: E402
+from utils.profile_cache import ProfileCache  # noqa: E402
+from utils.profile_sync import ProfileSync  # noqa: E402
+from utils.write_behind import DirtyTracker  # noqa: E402
+
+FIELDS = [k for k in default_user_profile(0) if k != "_id"] + ["_schema"]
+COUNTERS = ["cmds_used", "hugs", "times_thanked"]
+
+
+def wire(data):
+    # everything goes through the hub as json
+    return json.loads(json.dumps(data))
+
+
+class FakeIpc:
+    # the hub and every cluster's ClusterClient in one, requests to a cluster that's down get no answer
+    def __init__(self, cluster_id, clusters):
+        self.cluster_id = cluster_id
+        self.clusters = clusters
+        self.lose_replies = False
+
+    async def request(self, op, data=None, timeout=5, to=None):
+        target = self.clusters[to]
+        if not target.up:
+            return []
+        handler = {"profile_get": target.sync.on_get, "profile_update": target.sync.on_update}[op]
+        reply = wire(await handler(wire(data)))
+        return [] if self.lose_replies else [reply]
+
+    def send(self, op, data):
+        for cluster in self.clusters.values():
+            if cluster.cluster_id != self.cluster_id and cluster.up:
+                cluster.sync.on_changed(wire(data))
+
+
+class Cluster:
+    def __init__(self, cluster_id, db, clusters):
+        self.cluster_id = cluster_id
+        self.db = db
+        self.up = True
+        self.tracker = DirtyTracker("user_profile")
+        self.fields = lambda h: {k: h[k] for k in FIELDS}
+        self.owned = ProfileCache(
+            lambda user_id: db['user_profile'].find_one({"_id": user_id}), self.tracker, self.fields,
+            lambda user_id: stamp("user_profile", default_user_profile(user_id)),
+            upgrade=lambda doc: upgrade("user_profile", doc)
+        )
+        self.sync = ProfileSync(
+            self.owned, cluster_id, 2, COUNTERS,
+            lambda user_id: db['user_profile'].find_one({"_id": user_id}),
+            lambda user_id, *fields: self.mark(user_id, *fields),
+            delay=0
+        )
+        self.sync.ipc = FakeIpc(cluster_id, clusters)
+        clusters[cluster_id] = self
+
+    def mark(self, user_id, *fields):
+        # what journal.mark does with its on_mark
+        self.sync.mark(user_id, fields)
+
+    async def flush(self):
+        # what update_user_profile_db does, without the journal
+        docs = self.owned.to_flush()
+        self.tracker.start_flush()
+        for doc in docs.values():
+            update = self.tracker.diff(doc['_id'], self.fields(doc))
+            if update is not None:
+                self.db['user_profile'].update({"_id": doc['_id']}, update, upsert=True)
+        self.tracker.end_flush()
+        self.owned.flushed(docs)
+        mirrors = self.sync.mirrors.to_flush()
+        await self.sync.forward(mirrors)
+        self.sync.mirrors.flushed(mirrors)
+
+
+def make_clusters():
+    db = MemoryDatabase()
+    for user_id in (4, 5):
+        db['user_profile'].docs.append(stamp("user_profile", dict(default_user_profile(user_id), cmds_used=10)))
+    clusters = {}
+    return db, Cluster(0, db, clusters), Cluster(1, db, clusters)
+
+
+def stored(db, user_id):
+    return next(d for d in db['user_profile'].docs if d['_id'] == user_id)
+
+
+def test_both_clusters_counting_adds_up():
+    async def run():
+        db, owner, other = make_clusters()
+        mine = await owner.sync.get(4)
+        theirs = await other.sync.get(4)
+        assert mine is owner.owned.peek(4) and other.owned.peek(4) is None
+        for _ in range(3):
+            mine['cmds_used'] += 1
+            owner.mark(4, "cmds_used")
+        for _ in range(5):
+            theirs['cmds_used'] += 1
+            other.mark(4, "cmds_used")
+        await owner.sync.sync()
+        await other.sync.sync()
+        await owner.sync.sync()
+        await owner.flush()
+        return db, mine, theirs
+
+    db, mine, theirs = asyncio.run(run())
+    assert stored(db, 4)['cmds_used'] == 18
+    assert mine['cmds_used'] == theirs['cmds_used'] == 18
+
+
+def test_changes_reach_the_owner_and_the_mirrors():
+    async def run():
+        db, owner, other = make_clusters()
+        # 4 is owned by cluster 0, 5 by cluster 1, both are used on both
+        a0, b0 = await owner.sync.get(4), await owner.sync.get(5)
+        a1, b1 = await other.sync.get(4), await other.sync.get(5)
+        # marrying on cluster 1 changes its own profile and its mirror of the other one
+        a1.update({"married_to": 5, "married_at": 100})
+        b1.update({"married_to": 4, "married_at": 100})
+        other.mark(4, "married_to", "married_at")
+        other.mark(5, "married_to", "married_at")
+        await other.sync.sync()
+        await owner.sync.sync()
+        # the gc nick is changed on the owner
+        a0['gc_nick'] = "nick"
+        owner.mark(4, "gc_nick")
+        await owner.sync.sync()
+        await owner.flush()
+        await other.flush()
+        return db, a0, b0, a1, b1
+
+    db, a0, b0, a1, b1 = asyncio.run(run())
+    assert a0['married_to'] == 5 and b0['married_to'] == 4
+    assert a1['gc_nick'] == "nick"
+    assert stored(db, 4)['married_to'] == 5 and stored(db, 4)['gc_nick'] == "nick"
+    assert stored(db, 5)['married_to'] == 4
+
+
+def test_mirror_keeps_what_it_counted_when_the_owner_changes():
+    async def run():
+        db, owner, other = make_clusters()
+        mine = await owner.sync.get(4)
+        theirs = await other.sync.get(4)
+        theirs['hugs'] += 2  # not sent yet
+        mine['hugs'] += 1
+        owner.mark(4, "hugs")
+        await owner.sync.sync()
+        seen = theirs['hugs']
+        other.mark(4, "hugs")
+        await other.sync.sync()
+        await owner.sync.sync()
+        return seen, mine, theirs
+
+    seen, mine, theirs = asyncio.run(run())
+    assert seen == 3
+    assert mine['hugs'] == theirs['hugs'] == 3
+
+
+def test_owner_down_and_lost_replies():
+    async def run():
+        db, owner, other = make_clusters()
+        owner.up = False
+        theirs = await other.sync.get(4)  # straight from the db
+        assert other.sync.fetched_from_db == 1
+        theirs['times_thanked'] += 1
+        other.mark(4, "times_thanked")
+        await other.sync.sync()
+        assert other.sync.stats()['unacknowledged'] == 1
+
+        owner.up = True
+        # the owner applies it but the reply never makes it back, so it's sent again
+        other.sync.ipc.lose_replies = True
+        await other.sync.send_outbox()
+        other.sync.ipc.lose_replies = False
+        await other.sync.send_outbox()
+        await owner.sync.sync()
+        await owner.flush()
+        return db, owner, other, theirs
+
+    db, owner, other, theirs = asyncio.run(run())
+    assert stored(db, 4)['times_thanked'] == 1
+    assert owner.sync.duplicates == 1
+    assert other.sync.stats()['unacknowledged'] == 0
+    assert theirs['times_thanked'] == 1
+
+
+def test_new_profiles():
+    async def run():
+        db, owner, other = make_clusters()
+        owner.up = False
+        theirs = await other.sync.get(6)  # nobody has it, the defaults
+        theirs['cmds_used'] += 1
+        other.mark(6, "cmds_used")
+        await other.sync.sync()
+        owner.up = True
+        mine = await owner.sync.get(6)
+        mine['cmds_used'] += 1
+        await other.sync.send_outbox()
+        await owner.flush()
+        return db, mine
+
+    db, mine = asyncio.run(run())
+    assert mine['cmds_used'] == 2
+    assert stored(db, 6)['cmds_used'] == 2
@@ -0,0 +1,136 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import random
+import re
+import urllib.parse
+
+from collections import Counter
+
+import pytest
+
+emojis = pytest.importorskip("emojis")
+
+from utils.text_features import TextFeatures  # noqa: E402
+
+
+# the checks automod and global chat did on the raw content before TextFeatures
+def old_upper_ratio(content):
+    upper_count = 0
+    for h in content:
+        if h.isupper():
+            upper_count += 1
+    return upper_count / len(content)
+
+
+def old_duplicate_text(content, limit):
+    c_ = Counter(content.lower())
+    for c, n in c_.most_common(None):
+        if c != ' ' and len(content) / n < limit:
+            return True
+    return False
+
+
+def old_zalgo(content):
+    return bool(re.search(r"%CC%", urllib.parse.quote(content.encode("utf-8"))))
+
+
+def old_isinglish(s):
+    s = emojis.decode(s)
+    try:
+        s.encode(encoding='utf-8').decode('ascii')
+    except UnicodeDecodeError:
+        return False
+    else:
+        return True
+
+
+SAMPLES = [
+    "hello there",
+    "HELLO THERE",
+    "Hello There, General Kenobi",
+    "AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA",
+    "a b c d e f g h i j k l m n o p q r s t u v w x y z " * 4,
+    "lol " * 40,
+    "Z̤͔ͧ̑̓ä͖̭̈̇lͮ̒ͫǧ̗͚̚o̙̔ͮ̇͐̇",
+    "normal text with one combining mark: é",
+    "café with a real accent",
+    "😂😂😂😂 lmao",
+    "👍🏽 nice <:pog:123456789012345678> <a:dance:123456789012345678>",
+    "<@123456789012345678> <@!123456789012345678> <@&123456789012345678> @everyone @here",
+    "email me at someone@example.com",
+    "ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ ΣΑΣ",
+    "İSTANBUL İSTANBUL İSTANBUL İSTANBUL İSTANBUL İSTANBUL İSTANBUL İSTANBUL İSTANBUL İSTANBUL İSTANBUL İSTANBUL",
+    "こんにちは世界",
+    "ǅungla ǈudi ǋ",
+    "​​​ hidden",
+    "x",
+    " ",
+]
+
+
+def random_samples(n=500):
+    rng = random.Random(0)
+    pieces = [
+        "a", "B", "z", "Q", " ", "!", "@", "lol", "AAAA", "😂", "👍🏽", "é", "é", "̵", "̴", "ß",
+        "Σ", "σ", "ς", "İ", "ǅ", "中", "<@1234>", "<:x:1>", "@here", "\n",
+    ]
+    out = []
+    for _ in range(n):
+        out.append("".join(rng.choice(pieces) for _ in range(rng.randrange(1, 200))))
+    return out
+
+
+@pytest.mark.parametrize("content", SAMPLES + random_samples())
+def test_same_results_as_the_old_checks(content):
+    features = TextFeatures(content)
+    assert features.length == len(content)
+    assert features.upper_ratio == old_upper_ratio(content)
+    # automod's duplicate_text and global chat's spam check
+    for limit in (8, 9):
+        new = features.max_char_count > 0 and features.length / features.max_char_count < limit
+        assert new == old_duplicate_text(content, limit)
+    assert (features.combining_marks > 0) == old_zalgo(content)
+    assert (not features.non_ascii_text) == old_isinglish(content)
+
+
+def test_empty_message():
+    features = TextFeatures("")
+    assert (features.length, features.upper_ratio, features.max_char_count, features.combining_marks) == (0, 0, 0, 0)
+    assert (features.mentions, features.emoji_count, features.non_ascii_text) == (0, 0, False)
+
+
+@pytest.mark.parametrize("content,mentions", [
+    ("no mentions here", 0),
+    ("email me at someone@example.com", 0),
+    ("<@123456789012345678> hi", 1),
+    ("<@123456789012345678> <@!123456789012345678> <@&123456789012345678> @everyone @here", 5),
+    ("<@abc> isn't one", 0),
+])
+def test_mentions(content, mentions):
+    assert TextFeatures(content).mentions == mentions
+
+
+@pytest.mark.parametrize("content,count", [
+    ("no emojis", 0),
+    ("😂😂😂😂 lmao", 4),
+    ("<:pog:123456789012345678> and <a:dance:123456789012345678>", 2),
+    ("😂 nice <:pog:123456789012345678>", 2),
+    ("<:broken:abc>", 0),
+])
+def test_emoji_count(content, count):
+    assert TextFeatures(content).emoji_count == count
@@ -0,0 +1,103 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import random
+
+from config import AUTOMOD_AUTOMATON_MIN_WORDS, DEFAULT_BANNED_WORDS
+from utils.word_matcher import WordMatcher, compile_words, make_stripper
+
+# global chat's separators, before it used make_stripper they were removed with one str.replace each
+SEPARATORS = [
+    '\n', ' ', '~', '.', ',', '!', 'ㅤ',
+    '*', '@', '#', '$', '%', '^', '&', '(', ')', '-',
+    '_', '=', '+', '/', '\\', ';', ':', '[', ']', '{',
+    '}', '\'', '"', '<', '>', '?', '`', '|', '\t', '\r',
+    '​'
+]
+
+
+def old_strip(text):
+    for stuff in SEPARATORS:
+        text = text.replace(stuff, "")
+    return text
+
+
+def word_list(n=200):
+    # the default words plus made up ones that share prefixes and suffixes with each other,
+    # which is where the automaton's fail links matter
+    rng = random.Random(0)
+    words = list(DEFAULT_BANNED_WORDS) + ["ass", "assassin", "class", "sin", "sassy", "ssa", "aaab", "aab", "ab", "b"]
+    while len(words) < n:
+        words.append("".join(rng.choice("abcdeilnorst01!@$") for _ in range(rng.randrange(3, 9))))
+    return words
+
+
+def texts(words, n=3000):
+    rng = random.Random(1)
+    pieces = words + ["hello", "there", " ", ".", "1", "!", "@", "a", "s", "n i g g", "ｎ", "​", "class", "b.i.t.c.h", "sh1t"]
+    out = ["", "a", "clean message with nothing in it", "n1gga", "b!tch", "N I G G E R", "c0ck-a-doodle", "as.sas.sin"]
+    for _ in range(n):
+        out.append("".join(rng.choice(pieces) for _ in range(rng.randrange(1, 30))))
+    return out
+
+
+def check_same(words, corpus):
+    automaton = WordMatcher(words)
+    plain = WordMatcher(words, automaton_min_words=len(words) + 1)
+    assert automaton.use_automaton and not plain.use_automaton
+    for text in corpus:
+        found = automaton.find(text)
+        # the two can pick a different word when several are in there, but never disagree on whether there is one
+        assert (found is None) == (plain.find(text) is None), text
+        if found is not None:
+            assert found in text
+        assert (found is None) == (not any(w in text for w in words)), text
+
+
+def test_automaton_is_used_from_the_configured_size():
+    assert not WordMatcher(word_list(AUTOMOD_AUTOMATON_MIN_WORDS - 1)).use_automaton
+    assert WordMatcher(word_list(AUTOMOD_AUTOMATON_MIN_WORDS)).use_automaton
+
+
+def test_automaton_and_plain_find_the_same_things():
+    words = word_list()
+    check_same(words, texts(words))
+
+
+def test_automaton_and_plain_on_stripped_and_lowered_text():
+    words = word_list()
+    strip = make_stripper(SEPARATORS)
+    corpus = texts(words)
+    for text in corpus:
+        assert strip(text) == old_strip(text)
+    check_same(words, [strip(text.lower()) for text in corpus])
+    # leetspeak and separators, same answer as the old replace loop and `w in text` check
+    matcher = WordMatcher(words)
+    for text in ("n.1.g.g.a", "B * I * T * C * H", "c0ck", "f@ggot", "n i g g e r", "a$$hole", "r.a.p.e"):
+        stripped = strip(text.lower())
+        assert (matcher.find(stripped) is not None) == any(w in old_strip(text.lower()) for w in words), text
+
+
+def test_duplicates_and_empty_words():
+    matcher = WordMatcher(["", "abc", "abc", "b"])
+    assert matcher.words == ["abc", "b"]
+    assert matcher.find("") is None
+    assert matcher.find("xbx") == "b"
+
+
+def test_compile_words_is_shared():
+    assert compile_words(("a", "b")) is compile_words(("a", "b"))
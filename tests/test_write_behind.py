@@ -0,0 +1,89 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from utils.write_behind import DirtyTracker
+
+
+def flush(tracker, docs, fail=False):
+    # what EpicBot.flush_tracked does, minus the db
+    tracker.start_flush()
+    updates = {}
+    for key, fields in docs.items():
+        update = tracker.diff(key, fields)
+        if update is not None:
+            updates[key] = update
+    tracker.end_flush(success=not fail)
+    return updates
+
+
+def test_unseeded_documents_are_written_in_full():
+    tracker = DirtyTracker("test")
+    assert flush(tracker, {1: {"a": 1, "b": [1]}}) == {1: {"$set": {"a": 1, "b": [1]}}}
+    assert flush(tracker, {1: {"a": 1, "b": [1]}}) == {}
+
+
+def test_only_changed_fields_are_set():
+    tracker = DirtyTracker("test")
+    tracker.seed(1, {"a": 1, "b": {"c": 2}, "d": "x"})
+    tracker.seed(2, {"a": 1})
+    assert flush(tracker, {1: {"a": 1, "b": {"c": 3}, "d": "x"}, 2: {"a": 1}}) == {1: {"$set": {"b": {"c": 3}}}}
+
+
+def test_counters_are_set_to_their_new_value():
+    tracker = DirtyTracker("test")
+    tracker.seed((1, 2), {"xp": 100, "messages": 4})
+    assert flush(tracker, {(1, 2): {"xp": 125, "messages": 5}}) == {(1, 2): {"$set": {"xp": 125, "messages": 5}}}
+
+
+def test_in_place_mutations_are_seen():
+    # the snapshot is a copy, mutating the cached dict afterwards still shows up as a change
+    tracker = DirtyTracker("test")
+    doc = {"disabled_cmds": []}
+    tracker.seed(1, doc)
+    doc['disabled_cmds'].append("ping")
+    assert flush(tracker, {1: doc}) == {1: {"$set": {"disabled_cmds": ["ping"]}}}
+    doc['disabled_cmds'].append("help")
+    assert flush(tracker, {1: doc}) == {1: {"$set": {"disabled_cmds": ["ping", "help"]}}}
+
+
+def test_failed_flush_is_retried_with_the_same_values():
+    tracker = DirtyTracker("test")
+    tracker.seed(1, {"xp": 100, "name": "a"})
+    first = flush(tracker, {1: {"xp": 150, "name": "a"}}, fail=True)
+    assert first == {1: {"$set": {"xp": 150}}}
+    # it may or may not have reached the db, writing it again has to give the same result
+    assert flush(tracker, {1: {"xp": 150, "name": "a"}}) == first
+    assert flush(tracker, {1: {"xp": 150, "name": "a"}}) == {}
+
+
+def test_failed_flush_picks_up_later_changes():
+    tracker = DirtyTracker("test")
+    tracker.seed(1, {"xp": 100})
+    flush(tracker, {1: {"xp": 150}}, fail=True)
+    assert flush(tracker, {1: {"xp": 175}}) == {1: {"$set": {"xp": 175}}}
+
+
+def test_forget_and_stats():
+    tracker = DirtyTracker("test")
+    tracker.seed(1, {"a": 1})
+    tracker.seed(2, {"a": 1})
+    flush(tracker, {1: {"a": 2}, 2: {"a": 1}})
+    stats = tracker.stats()
+    assert (stats['tracked'], stats['scanned'], stats['dirty'], stats['flush_size'], stats['total_written']) == (2, 2, 1, 1, 1)
+    tracker.forget(1)
+    assert tracker.is_dirty(1, {"a": 2})
+    assert not tracker.is_dirty(2, {"a": 1})
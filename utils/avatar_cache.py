@@ -0,0 +1,104 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import time
+
+from collections import OrderedDict
+from typing import Optional
+from discord import Asset
+from utils.coalesce import Coalescer
+
+
+class AvatarCache:
+    # LRU of downloaded avatar bytes, keyed by (avatar hash, format, size).
+    # entries expire after `ttl` seconds and the whole thing stays under `max_bytes`.
+    # if the same avatar is requested while it's still downloading, everyone waits on that one download.
+    def __init__(self, max_items: int = 1024, max_bytes: int = 64 * 1024 * 1024, ttl: int = 300):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self.entries = OrderedDict()
+        self.downloads = Coalescer()
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.evictions = 0
+        self.expired = 0
+
+    async def read(self, asset: Asset, format: str = 'png', size: Optional[int] = None) -> bytes:
+        key = (asset.key, format, size)
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            data, expires_at = entry
+            if expires_at > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return data
+            self.expired += 1
+            self._remove(key)
+
+        return await self.downloads.run(key, lambda: self._fetch(key, asset, format, size))
+
+    async def _fetch(self, key, asset: Asset, format: str, size: Optional[int]) -> bytes:
+        if size is None:
+            data = await asset.with_format(format).read()
+        else:
+            data = await asset.replace(format=format, size=size).read()
+        self._store(key, data)
+        return data
+
+    def _store(self, key, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        self._remove(key)
+        self.entries[key] = (data, time.monotonic() + self.ttl)
+        self.total_bytes += len(data)
+        while len(self.entries) > self.max_items or self.total_bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= len(entry[0])
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+    @property
+    def misses(self) -> int:
+        return self.downloads.started
+
+    @property
+    def coalesced(self) -> int:
+        return self.downloads.joined
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "items": len(self.entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0,
+        }
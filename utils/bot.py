@@ -14,29 +14,66 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import asyncio
+import copy
 import motor.motor_asyncio as motor
 import time
 import os
-import re
+import signal
 import discord
 import aiohttp
 import sys
 import traceback
 
 from config import (
-    MONGO_DB_URL, MONGO_DB_URL_BETA, DEFAULT_AUTOMOD_CONFIG,
-    DB_UPDATE_INTERVAL, RED_COLOR, EMOJIS
+    MONGO_DB_URL, MONGO_DB_URL_BETA,
+    DB_UPDATE_INTERVAL, RED_COLOR, EMOJIS,
+    AVATAR_CACHE_MAX_ITEMS, AVATAR_CACHE_MAX_BYTES, AVATAR_CACHE_TTL,
+    INVITE_CACHE_MAX_ITEMS, INVITE_CACHE_TTL, INVITE_CACHE_NEGATIVE_TTL,
+    PROFILE_CACHE_MAX_ITEMS, PROFILE_CACHE_MAX_BYTES, PROFILE_CACHE_TTL,
+    SNAPSHOT_PATH, SNAPSHOT_INTERVAL, SNAPSHOT_MAX_AGE,
+    JOURNAL_PATH, JOURNAL_COMMIT_INTERVAL, JOURNAL_SEGMENT_MAX_BYTES,
+    SHUTDOWN_TIMEOUT, SHARD_COUNT, CLUSTER_IPC_HOST, CLUSTER_IPC_PORT,
+    CLUSTER_PROFILE_SYNC_DELAY, CLUSTER_PROFILE_TIMEOUT, PROFILE_MIRROR_TTL
 )
 from discord.ext import commands, tasks
 from pymongo import UpdateOne
 from utils.embed import success_embed
 from utils.ui import TicketView, DropDownSelfRoleView, ButtonSelfRoleView
 from utils.help import EpicBotHelp
+from utils.write_behind import DirtyTracker
+from utils.leaderboard import GuildLeaderboard
+from utils.avatar_cache import AvatarCache
+from utils.cluster import ClusterClient, owner_query, shard_id_for, shard_query
+from utils.invite_cache import InviteCache
+from utils.journal import Journal
+from utils.message_pipeline import MessagePipeline, MessageContext
+from utils.prefixes import PrefixMatcher
+from utils.profile_cache import ProfileCache
+from utils.profile_sync import ProfileSync
+from utils.migrations import (
+    MIGRATIONS, SCHEMA_FIELD, default_guild_config, default_user_profile,
+    schema_version, stamp, upgrade, migrate_collection
+)
+from utils.snapshot import SnapshotError, encode_snapshot, write_snapshot, read_snapshot
+
+# what gets written back to the db for each document, everything except the _id
+SERVERCONFIG_FIELDS = [k for k in default_guild_config(0) if k != "_id"] + [SCHEMA_FIELD]
+USER_PROFILE_FIELDS = [k for k in default_user_profile(0) if k != "_id"] + [SCHEMA_FIELD]
+# the ones that only ever go up, other clusters send us how much they did (see ProfileSync)
+USER_PROFILE_COUNTERS = [
+    "cmds_used", "bugs_reported", "suggestions_submitted", "times_thanked", "times_simped",
+    "bites", "cuddles", "winks", "hugs", "kisses", "pats", "slaps", "tickles", "licks", "feeds",
+    "facepalms", "blushes", "tail_wags", "cries"
+]
 
 
 class EpicBot(commands.AutoShardedBot):
-    def __init__(self, beta: bool = False):
+    def __init__(self, beta: bool = False, shard_ids=None, shard_count: int = SHARD_COUNT, cluster_id=None, cluster_count: int = 1):
         self.beta = beta
+        # set by cluster.py, a single process has every shard and no cluster
+        self.cluster_id = cluster_id
+        self.cluster_count = cluster_count
         intents = discord.Intents.default()
         intents.members = True
         super().__init__(
@@ -48,21 +85,72 @@ class EpicBot(commands.AutoShardedBot):
             help_command=EpicBotHelp(),
             cached_messages=10000,
             activity=discord.Activity(type=discord.ActivityType.playing, name="e!help | epic-bot.com" if not beta else "nirlep is doing some weird shit rn"),
-            shard_count=2  # remove this if your bot is under 1000 servers
+            shard_ids=shard_ids,
+            shard_count=shard_count
         )
         cluster = motor.AsyncIOMotorClient(MONGO_DB_URL if not beta else MONGO_DB_URL_BETA)
         self.session = aiohttp.ClientSession()
+        self.avatar_cache = AvatarCache(
+            max_items=AVATAR_CACHE_MAX_ITEMS,
+            max_bytes=AVATAR_CACHE_MAX_BYTES,
+            ttl=AVATAR_CACHE_TTL
+        )
+        self.invite_cache = InviteCache(
+            self.fetch_invite,
+            max_items=INVITE_CACHE_MAX_ITEMS,
+            ttl=INVITE_CACHE_TTL,
+            negative_ttl=INVITE_CACHE_NEGATIVE_TTL
+        )
         self.cache_loaded = False
         self.cogs_loaded = False
         self.views_loaded = False
         self.rolemenus_loaded = False
 
+        self.init_caches(cluster['EpicBot-V2'])
+
+        # the other processes when we're one cluster of many, see cluster.py
+        self.ipc = None
+        if cluster_id is not None:
+            self.ipc = ClusterClient(cluster_id, cluster_count, CLUSTER_IPC_HOST, CLUSTER_IPC_PORT, self.dispatch)
+            self.ipc.handlers["stats"] = self.cluster_stats
+            self.ipc.handlers["profile_get"] = self.profile_sync.on_get
+            self.ipc.handlers["profile_update"] = self.profile_sync.on_update
+            self.profile_sync.ipc = self.ipc
+
+        # every on_message handler of the bot goes through this, commands are always the last step
+        self.message_pipeline = MessagePipeline(self)
+        self.message_pipeline.register("commands", self.handle_commands, order=1000, dms=True)
+
+        self.update_prefixes_db.start()
+        self.update_serverconfig_db.start()
+        self.update_leveling_db.start()
+        self.update_user_profile_db.start()
+        self.save_snapshot_loop.start()
+
+        if not self.cache_loaded:
+            self.loop.run_until_complete(self.get_cache(use_snapshot=True))
+            self.cache_loaded = True
+
+        if not self.cogs_loaded:
+            self.load_extension('jishaku')
+            print("Loaded jsk!")
+            self.loaded, self.not_loaded = self.loop.run_until_complete(self.load_extensions('./cogs'))
+            self.loaded_hidden, self.not_loaded_hidden = self.loop.run_until_complete(self.load_extensions('./cogs_hidden'))
+            self.cogs_loaded = True
+
+    def init_caches(self, db):
+        # the collections and everything cached from them, on its own so the cache loading can run without logging in
         self.last_updated_serverconfig_db = 0
         self.last_updated_prefixes_db = 0
         self.last_updated_leveling_db = 0
         self.last_updated_user_profile_db = 0
 
-        self.db = cluster['EpicBot-V2']
+        self.serverconfig_tracker = DirtyTracker("serverconfig")
+        self.prefixes_tracker = DirtyTracker("prefixes")
+        self.leveling_tracker = DirtyTracker("leveling")
+        self.user_profile_tracker = DirtyTracker("user_profile")
+
+        self.db = db
 
         self.prefixes = self.db['prefixes']
         self.blacklisted = self.db['blacklisted']
@@ -79,158 +167,78 @@ class EpicBot(commands.AutoShardedBot):
         self.self_roles = self.db['self_roles']
 
         # i'm gonna fill these up with my cu- i mean cache!
-        self.prefixes_cache = []
-        self.blacklisted_cache = []
-        self.serverconfig_cache = []
+        self.prefixes_cache = {}
+        self.blacklisted_cache = {}  # user_id -> blacklist document (for the reason)
+        self.serverconfig_cache = {}
         self.leveling_cache = []
-        self.user_profile_cache = []
+        # profiles are loaded when they're first needed, see get_user_profile_
+        self.user_profile_cache = ProfileCache(
+            lambda user_id: self.user_profile_db.find_one({"_id": user_id}), self.user_profile_tracker, self.user_profile_fields,
+            lambda user_id: stamp("user_profile", default_user_profile(user_id)),
+            max_items=PROFILE_CACHE_MAX_ITEMS,
+            max_bytes=PROFILE_CACHE_MAX_BYTES,
+            ttl=PROFILE_CACHE_TTL,
+            upgrade=lambda doc: upgrade("user_profile", doc)
+        )
+        self.leveling_boards = {}
+        self.prefix_matchers = {}
+        self.cache_load_stats = {}  # collection -> {count, seconds} of the last get_cache
+
+        # set while a snapshot load is being checked against the db, the flush loops wait for it
+        self.reconciling = False
+        self.journal_replayed = False
+        # collection -> {key: fields when loaded} of the snapshot documents that weren't in the db yet
+        self.snapshot_dirty = {}
+        # collection -> {key: fields} the journal replay put on top of the snapshot
+        self.replayed_fields = {}
+        self.snapshot_stats = {}
+
+        # cache changes since the last flush, replayed by get_cache if we crashed before writing them
+        self.journal = Journal(self.local_path(JOURNAL_PATH), commit_interval=JOURNAL_COMMIT_INTERVAL, max_segment_bytes=JOURNAL_SEGMENT_MAX_BYTES)
+        self.journal.register("serverconfig", lambda k: self.serverconfig_cache.get(k), self.serverconfig_fields)
+        self.journal.register("leveling", lambda k: self.get_leveling_board(k[1]).get(k[0]), self.leveling_fields)
+        # only the profiles of the users we own are ours to write, see ProfileSync
+        self.profile_sync = None
+        if self.cluster_id is not None:
+            self.profile_sync = ProfileSync(
+                self.user_profile_cache, self.cluster_id, self.cluster_count, USER_PROFILE_COUNTERS,
+                lambda user_id: self.user_profile_db.find_one({"_id": user_id}),
+                lambda user_id, *fields: self.journal.mark("user_profile", user_id, *fields),
+                delay=CLUSTER_PROFILE_SYNC_DELAY,
+                timeout=CLUSTER_PROFILE_TIMEOUT,
+                max_items=PROFILE_CACHE_MAX_ITEMS,
+                max_bytes=PROFILE_CACHE_MAX_BYTES,
+                ttl=PROFILE_MIRROR_TTL
+            )
+        self.journal.register(
+            "user_profile", self.user_profile_cache.peek, self.user_profile_fields,
+            on_mark=self.profile_sync.mark if self.profile_sync is not None else None
+        )
 
         self.reminders = []
         self.alarms = []
 
-        self.update_prefixes_db.start()
-        self.update_serverconfig_db.start()
-        self.update_leveling_db.start()
-        self.update_user_profile_db.start()
-
-        if not self.cache_loaded:
-            self.loop.run_until_complete(self.get_cache())
-            self.loop.run_until_complete(self.get_blacklisted_users())
-            self.cache_loaded = True
-
-        if not self.cogs_loaded:
-            self.load_extension('jishaku')
-            print("Loaded jsk!")
-            self.loaded, self.not_loaded = self.loop.run_until_complete(self.load_extensions('./cogs'))
-            self.loaded_hidden, self.not_loaded_hidden = self.loop.run_until_complete(self.load_extensions('./cogs_hidden'))
-            self.cogs_loaded = True
+        # set by close(), nothing new gets handled after that
+        self.closing = False
+        self.shutdown_stats = {}
+        # the flush loops and the final flush in close() must never write the same collection at once
+        self.flush_locks = {}
 
     async def set_default_guild_config(self, guild_id):
-        pain = {
-            "_id": guild_id,
-            "disabled_cmds": [],
-            "disabled_channels": [],
-            "custom_cmds": [],
-            "welcome": {"channel_id": None, "message": None, "embed": False},
-            "leave": {"channel_id": None, "message": None, "embed": False},
-            "autorole": {"humans": [], "bots": [], "all": []},
-            "nqn": False,
-            "leveling": {"enabled": False, "channel_id": None, "message": None, " roles": {}},
-            "autoposting": [],
-            "youtube": {"channel_id": None, "youtube_id": None, "message": None},
-            "twitch": {"channel_id": None, "username": None, "message": None, "currently_live": False},
-            "starboard": {"enabled": False, "star_count": 3, "channel_id": None},
-            "logging": None,
-            "chatbot": None,
-            "automod": DEFAULT_AUTOMOD_CONFIG,
-            "ghost_ping": False,
-            "bump_reminders": False,
-            "antialts": False,
-            "globalchat": False,
-            "counting": None,
-            "antihoisting": False,
-            "tickets": {"message_id": None, "channel": None, "roles": []},
-            "counters": {"members": None, "huamns": None, "bots": None, "channels": None, "categories": None, "roles": None, "emojis": None}
-        }
-        self.serverconfig_cache.append(pain)
+        self.serverconfig_cache[guild_id] = stamp("serverconfig", default_guild_config(guild_id))
         return await self.get_guild_config(guild_id)
 
     async def get_guild_config(self, guild_id):
-        for e in self.serverconfig_cache:
-            if e['_id'] == guild_id:
-                if "disabled_channels" not in e:
-                    e.update({"disabled_channels": []})
-                if "logging" not in e:
-                    e.update({"logging": None})
-                if "chatbot" not in e:
-                    e.update({"chatbot": None})
-                if "automod" not in e:
-                    e.update({"automod": DEFAULT_AUTOMOD_CONFIG})
-                if "ghost_ping" not in e:
-                    e.update({"ghost_ping": False})
-                if "bump_reminders" not in e:
-                    e.update({"bump_reminders": False})
-                if "antialts" not in e:
-                    e.update({"antialts": False})
-                if "globalchat" not in e:
-                    e.update({"globalchat": False})
-                if "counting" not in e:
-                    e.update({"counting": None})
-                if "antihoisting" not in e:
-                    e.update({"antihoisting": False})
-                if "tickets" not in e:
-                    e.update({"tickets": {"message_id": None, "channel": None, "roles": []}})
-                if "counters" not in e:
-                    e.update({"counters": {"members": None, "huamns": None, "bots": None, "channels": None, "categories": None, "roles": None, "emojis": None}})
-                return e
+        # every document was brought up to date by the migrations in get_cache, no default filling here
+        e = self.serverconfig_cache.get(guild_id)
+        if e is not None:
+            return e
         return await self.set_default_guild_config(guild_id)
 
-    async def set_default_user_profile(self, user_id):
-        e = {
-            "_id": user_id,
-            "description": "A very cool EpicBot user!",
-            "badges": ['normie'],
-            "cmds_used": 0,
-            "bugs_reported": 0,
-            "suggestions_submitted": 0,
-            "rating": 0,
-            "rank_card_template": "default",
-
-            "times_thanked": 0,
-            "times_simped": 0,
-            "snipe": True,
-
-            "gc_nick": None,
-            "gc_avatar": None,
-            "gc_rules_accepted": False,
-
-            "bites": 0,
-            "cuddles": 0,
-            "winks": 0,
-            "hugs": 0,
-            "kisses": 0,
-            "pats": 0,
-            "slaps": 0,
-            "tickles": 0,
-            "licks": 0,
-            "feeds": 0,
-            "facepalms": 0,
-            "blushes": 0,
-            "tail_wags": 0,
-            "cries": 0,
-
-            "married_to": None,
-            "married_at": None
-        }
-        self.user_profile_cache.append(e)
-        return await self.get_user_profile_(user_id)
-
     async def get_user_profile_(self, user_id):
-        for e in self.user_profile_cache:
-            if e['_id'] == user_id:
-                if "times_thanked" not in e:
-                    e.update({"times_thanked": 0})
-                if "times_simped" not in e:
-                    e.update({"times_simped": 0})
-                if "snipe" not in e:
-                    e.update({"snipe": True})
-                if "gc_nick" not in e:
-                    e.update({"gc_nick": None})
-                if "gc_avatar" not in e:
-                    e.update({"gc_avatar": None})
-                if "gc_rules_accepted" not in e:
-                    e.update({"gc_rules_accepted": False})
-                if "married_to" not in e:
-                    e.update({"married_to": None})
-                if "married_at" not in e:
-                    e.update({"married_at": None})
-
-                bruh = ['bites', 'cuddles', 'winks', 'hugs', 'kisses', 'pats', 'slaps', 'tickles', 'licks', 'feeds', 'facepalms', 'blushes', 'tail_wags', 'cries']
-                for bru in bruh:
-                    if bru not in e:
-                        e.update({bru: 0})
-                return e
-        return await self.set_default_user_profile(user_id)
+        if self.profile_sync is not None:
+            return await self.profile_sync.get(user_id)
+        return await self.user_profile_cache.get(user_id)
 
     async def update_guild_before_invites(self, guild_id):
         invites = await self.before_invites.find_one({"_id": guild_id})
@@ -325,126 +333,89 @@ class EpicBot(commands.AutoShardedBot):
             }}
         )
 
+    def user_profile_fields(self, h):
+        return {k: h[k] for k in USER_PROFILE_FIELDS}
+
+    def serverconfig_fields(self, eee):
+        return {k: eee[k] for k in SERVERCONFIG_FIELDS}
+
+    def prefix_fields(self, e):
+        return {"prefix": e['prefix'], SCHEMA_FIELD: e[SCHEMA_FIELD]}
+
+    def leveling_fields(self, e):
+        return {
+            "xp": e['xp'],
+            "messages": e['messages']
+        }
+
+    async def flush_tracked(self, collection, tracker, docs, key, filter_, fields, segments=None):
+        # the journal is rotated before diffing, so once this is written its old segments can go.
+        # pass `segments` if you rotated it yourself before collecting `docs`.
+        if segments is None:
+            segments = await self.journal.rotate(tracker.name)
+        async with self.flush_locks.setdefault(tracker.name, asyncio.Lock()):
+            # only the documents that changed since the last flush get written
+            tracker.start_flush()
+            cancer = []
+            now = time.time()
+            for doc in docs:
+                update = tracker.diff(key(doc), fields(doc))
+                if update is not None:
+                    # lets a snapshot load find out what changed in the db after it was taken
+                    update.setdefault("$set", {})["_updated_at"] = now
+                    cancer.append(UpdateOne(filter_(doc), update, upsert=True))
+            try:
+                if len(cancer) != 0:
+                    await collection.bulk_write(cancer)
+            except Exception:
+                tracker.end_flush(success=False)
+                raise
+            tracker.end_flush()
+            self.journal.truncate(tracker.name, segments)
+
     @tasks.loop(seconds=DB_UPDATE_INTERVAL, reconnect=True)
     async def update_user_profile_db(self):
-        if self.cache_loaded:
-            cancer = []
-            for h in self.user_profile_cache:
-                hmm = UpdateOne(
-                    {"_id": h["_id"]},
-                    {"$set": {
-                        "description": h['description'],
-                        "badges": h['badges'],
-                        "cmds_used": h['cmds_used'],
-                        "bugs_reported": h['bugs_reported'],
-                        "suggestions_submitted": h['suggestions_submitted'],
-                        "rating": h['rating'],
-                        "rank_card_template": h['rank_card_template'],
-
-                        "times_thanked": 0 if "times_thanked" not in h else h['times_thanked'],
-                        "times_simped": 0 if "times_simped" not in h else h['times_simped'],
-                        "snipe": True if "snipe" not in h else h['snipe'],
-
-                        "gc_nick": None if "gc_nick" not in h else h['gc_nick'],
-                        "gc_avatar": None if "gc_avatar" not in h else h['gc_avatar'],
-                        "gc_rules_accepted": False if "gc_rules_accepted" not in h else h['gc_rules_accepted'],
-
-                        "bites": 0 if "bites" not in h else h['bites'],
-                        "cuddles": 0 if "cuddles" not in h else h['cuddles'],
-                        "winks": 0 if "winks" not in h else h['winks'],
-                        "hugs": 0 if "hugs" not in h else h['hugs'],
-                        "kisses": 0 if "kisses" not in h else h['kisses'],
-                        "pats": 0 if "pats" not in h else h['pats'],
-                        "slaps": 0 if "slaps" not in h else h['slaps'],
-                        "tickles": 0 if "tickles" not in h else h['tickles'],
-                        "licks": 0 if "licks" not in h else h['licks'],
-                        "feeds": 0 if "feeds" not in h else h['feeds'],
-                        "facepalms": 0 if "facepalms" not in h else h['facepalms'],
-                        "blushes": 0 if "blushes" not in h else h['blushes'],
-                        "tail_wags": 0 if "tail_wags" not in h else h['tail_wags'],
-                        "cries": 0 if "cries" not in h else h['cries'],
-
-                        "married_to": None if "married_to" not in h else h['married_to'],
-                        "married_at": None if "married_at" not in h else h['married_at']
-                    }},
-                    upsert=True
-                )
-                cancer.append(hmm)
-            if len(cancer) != 0:
-                await self.user_profile_db.bulk_write(cancer)
+        if self.cache_loaded and not self.reconciling:
+            # rotated first, a profile loaded and changed right after to_flush wouldn't be in `docs`
+            segments = await self.journal.rotate(self.user_profile_tracker.name)
+            docs = self.user_profile_cache.to_flush()
+            await self.flush_tracked(
+                self.user_profile_db, self.user_profile_tracker, docs.values(),
+                lambda h: h['_id'], lambda h: {"_id": h['_id']}, self.user_profile_fields, segments=segments
+            )
+            self.user_profile_cache.flushed(docs)
+            if self.profile_sync is not None:
+                # the other clusters' profiles go to them instead of the db
+                mirrors = self.profile_sync.mirrors.to_flush()
+                await self.profile_sync.forward(mirrors)
+                self.profile_sync.mirrors.flushed(mirrors)
             self.last_updated_user_profile_db = time.time()
 
     @tasks.loop(seconds=DB_UPDATE_INTERVAL, reconnect=True)
     async def update_serverconfig_db(self):
-        if self.cache_loaded:
-            cancer = []
-            for eee in self.serverconfig_cache:
-                hmm = UpdateOne(
-                    {"_id": eee['_id']},
-                    {"$set": {
-                        "disabled_cmds": eee['disabled_cmds'],
-                        "disabled_channels": eee.get('disabled_channels', []),
-                        "disabled_categories": eee.get('disabled_categories', []),
-                        "custom_cmds": eee.get("custom_cmds", []),
-                        "welcome": eee['welcome'],
-                        "leave": eee['leave'],
-                        "autorole": eee['autorole'],
-                        "nqn": eee['nqn'],
-                        "leveling": eee['leveling'],
-                        "autoposting": eee['autoposting'],
-                        "youtube": eee['youtube'],
-                        "twitch": eee['twitch'],
-                        "starboard": eee['starboard'],
-                        "logging": eee.get("logging", None),
-                        "chatbot": eee.get("chatbot", None),
-                        "automod": eee.get("automod", DEFAULT_AUTOMOD_CONFIG),
-                        "ghost_ping": eee.get("ghost_ping", False),
-                        "bump_reminders": eee.get("bump_reminders", False),
-                        "antialts": eee.get("antialts", False),
-                        "globalchat": eee.get("globalchat", False),
-                        "counting": eee.get("counting", None),
-                        "antihoisting": eee.get("antihoisting", False),
-                        "tickets": {"message_id": None, "channel": None, "roles": []} if "tickets" not in eee else eee['tickets'],
-                        "counters": {"members": None, "huamns": None, "bots": None, "channels": None, "categories": None, "roles": None, "emojis": None} if "counters" not in eee else eee['counters']
-                    }},
-                    upsert=True
-                )
-                cancer.append(hmm)
-            if len(cancer) != 0:
-                await self.serverconfig.bulk_write(cancer)
+        if self.cache_loaded and not self.reconciling:
+            await self.flush_tracked(
+                self.serverconfig, self.serverconfig_tracker, self.serverconfig_cache.values(),
+                lambda eee: eee['_id'], lambda eee: {"_id": eee['_id']}, self.serverconfig_fields
+            )
             self.last_updated_serverconfig_db = time.time()
 
     @tasks.loop(seconds=DB_UPDATE_INTERVAL, reconnect=True)
     async def update_prefixes_db(self):
-        if self.cache_loaded:
-            cancer = []
-            for e in self.prefixes_cache:
-                hmm = UpdateOne(
-                    {"_id": e["_id"]},
-                    {"$set": {"prefix": e['prefix']}},
-                    upsert=True
-                )
-                cancer.append(hmm)
-            if len(cancer) != 0:
-                await self.prefixes.bulk_write(cancer)
+        if self.cache_loaded and not self.reconciling:
+            await self.flush_tracked(
+                self.prefixes, self.prefixes_tracker, self.prefixes_cache.values(),
+                lambda e: e['_id'], lambda e: {"_id": e['_id']}, self.prefix_fields
+            )
             self.last_updated_prefixes_db = time.time()
 
     @tasks.loop(seconds=DB_UPDATE_INTERVAL, reconnect=True)
     async def update_leveling_db(self):
-        if self.cache_loaded:
-            cancer = []
-            for e in self.leveling_cache:
-                hmm = UpdateOne(
-                    {"id": e["id"], "guild_id": e['guild_id']},
-                    {"$set": {
-                        "xp": e['xp'],
-                        "messages": e['messages']
-                    }},
-                    upsert=True
-                )
-                cancer.append(hmm)
-            if len(cancer) != 0:
-                await self.leveling_db.bulk_write(cancer)
+        if self.cache_loaded and not self.reconciling:
+            await self.flush_tracked(
+                self.leveling_db, self.leveling_tracker, self.leveling_cache,
+                lambda e: (e['id'], e['guild_id']), lambda e: {"id": e["id"], "guild_id": e['guild_id']}, self.leveling_fields
+            )
             self.last_updated_leveling_db = time.time()
 
     @update_serverconfig_db.before_loop
@@ -463,31 +434,419 @@ class EpicBot(commands.AutoShardedBot):
     async def before_update_user_profile_db(self):
         await self.wait_until_ready()
 
-    async def get_cache(self):
-        cursor = self.prefixes.find({})
-        self.prefixes_cache = await cursor.to_list(length=None)
-        print(f"Prefixes cache has been loaded. | {len(self.prefixes_cache)} items")
-
-        cursor = self.serverconfig.find({})
-        self.serverconfig_cache = await cursor.to_list(length=None)
-        print(f"Server config cache has been loaded. | {len(self.serverconfig_cache)} configs")
-
+    async def get_cache(self, use_snapshot: bool = False):
+        start = time.perf_counter()
+        if not self.journal_replayed:
+            # reconcile_snapshot looks for what changed after the snapshot by _updated_at
+            await asyncio.gather(*[
+                collection.create_index("_updated_at")
+                for collection in (self.prefixes, self.serverconfig, self.leveling_db, self.user_profile_db)
+            ])
+        if use_snapshot and self.load_snapshot():
+            # the snapshot has the big ones, these are small enough to just load
+            await asyncio.gather(
+                self.load_collection("Reminders", self.load_reminders()),
+                self.load_collection("Blacklisted users", self.get_blacklisted_users()),
+            )
+            # checked against the db in the background once the journal is replayed, the flush loops wait until that's done
+            self.reconciling = True
+        else:
+            # every collection loads at the same time, straight from the cursor into its cache
+            await asyncio.gather(
+                self.load_collection("Prefixes", self.load_prefixes()),
+                self.load_collection("Server config", self.load_serverconfig()),
+                self.load_collection("Reminders", self.load_reminders()),
+                self.load_collection("Leveling", self.load_leveling()),
+                self.load_collection("User profile migration", self.load_user_profiles()),
+                self.load_collection("Blacklisted users", self.get_blacklisted_users()),
+            )
+        # only the first load, after that the journal is this run's own changes and they're all cached already
+        if not self.journal_replayed:
+            await self.load_collection("Journal replay", self.replay_journal())
+            self.journal_replayed = True
+        if self.reconciling:
+            self.loop.create_task(self.reconcile_snapshot(self.snapshot_stats['taken_at']))
+        self.cache_load_stats["Total"] = {"count": sum(e['count'] for e in self.cache_load_stats.values()), "seconds": round(time.perf_counter() - start, 3)}
+        print(f"All caches have been loaded in {self.cache_load_stats['Total']['seconds']}s")
+
+    async def load_collection(self, name, coro):
+        start = time.perf_counter()
+        count = await coro
+        took = round(time.perf_counter() - start, 3)
+        self.cache_load_stats[name] = {"count": count, "seconds": took}
+        print(f"{name} cache has been loaded. | {count} items in {took}s")
+
+    async def load_prefixes(self) -> int:
+        await migrate_collection(self.prefixes, "prefixes", self.guild_query())
+        cursor = self.prefixes.find(self.guild_query(), {"prefix": 1, SCHEMA_FIELD: 1})
+        self.prefixes_cache = {e['_id']: e async for e in cursor}
+        self.seed_tracker(self.prefixes_tracker, self.prefixes_cache.values(), lambda e: e['_id'], self.prefix_fields)
+        self.prefix_matchers = {}
+        return len(self.prefixes_cache)
+
+    async def load_serverconfig(self) -> int:
+        await migrate_collection(self.serverconfig, "serverconfig", self.guild_query())
+        # only what we write back, anything else in the documents is leftovers
+        cursor = self.serverconfig.find(self.guild_query(), dict.fromkeys(SERVERCONFIG_FIELDS, 1))
+        self.serverconfig_cache = {e['_id']: e async for e in cursor}
+        self.seed_tracker(self.serverconfig_tracker, self.serverconfig_cache.values(), lambda e: e['_id'], self.serverconfig_fields)
+        return len(self.serverconfig_cache)
+
+    async def load_reminders(self) -> int:
         cursor = self.reminders_db.find({})
-        self.reminders = await cursor.to_list(length=None)
-        print(f"Reminders cache has been loaded. | {len(self.reminders)} reminders")
+        self.reminders = [e async for e in cursor]
+        return len(self.reminders)
+
+    async def load_leveling(self) -> int:
+        cursor = self.leveling_db.find(self.guild_query("guild_id"), {"_id": 0, "id": 1, "guild_id": 1, "xp": 1, "messages": 1})
+        leveling_cache = []
+        leveling_boards = {}
+        async for e in cursor:
+            board = leveling_boards.get(e['guild_id'])
+            if board is None:
+                board = leveling_boards[e['guild_id']] = GuildLeaderboard(e['guild_id'])
+            # a duplicate row for the same member isn't cached, cogs only ever see the first one
+            # and flushing both would keep overwriting one with the other
+            if board.get(e['id']) is None:
+                board.add(e)
+                leveling_cache.append(e)
+        self.leveling_cache = leveling_cache
+        self.leveling_boards = leveling_boards
+        self.seed_tracker(self.leveling_tracker, self.leveling_cache, lambda e: (e['id'], e['guild_id']), self.leveling_fields)
+        return len(self.leveling_cache)
+
+    async def load_user_profiles(self) -> int:
+        # only the migration here, the profiles themselves are loaded on demand
+        return await migrate_collection(self.user_profile_db, "user_profile", self.user_query())
+
+    async def replay_journal(self) -> int:
+        # whatever changed after the last flush of the previous run, applied on top of what we just loaded.
+        # nothing is seeded, so the next flush writes all of it.
+        replayed = 0
+        touched = {}
+        for name, key, fields in self.journal.replay():
+            if name == "serverconfig":
+                # not loaded means the bot left the guild (its config is deleted) or it's on another cluster now
+                e = self.serverconfig_cache.get(key)
+                if e is None:
+                    continue
+                e.update(fields)
+            elif name == "user_profile":
+                if not self.owns_user(key):
+                    continue
+                (await self.user_profile_cache.get(key)).update(fields)
+            elif name == "leveling":
+                if not self.owns_guild(key[1]):
+                    continue
+                board = self.get_leveling_board(key[1])
+                e = board.get(key[0])
+                if e is None:
+                    e = {"id": key[0], "guild_id": key[1], "xp": 0, "messages": 0}
+                    self.leveling_cache.append(e)
+                    board.add(e)
+                e.update(fields)
+                board.refresh(e)
+            else:
+                continue
+            touched.setdefault(name, {}).setdefault(key, {}).update(fields)
+            replayed += 1
+        if self.reconciling:
+            # what we booted with is the snapshot plus the journal, reconcile_snapshot compares against that
+            # and puts the journal back on top of whatever it replaces with a newer version from the db
+            self.replayed_fields = touched
+            for name, keys in touched.items():
+                get_doc, fields = self.journal.collections[name]
+                boot = self.snapshot_dirty.setdefault(name, {})
+                for key in keys:
+                    doc = get_doc(key)
+                    if doc is not None:
+                        boot[key] = copy.deepcopy(fields(doc))
+        return replayed
+
+    def local_path(self, path: str) -> str:
+        # every cluster needs its own snapshot and journal
+        if self.cluster_id is None:
+            return path
+        base, ext = os.path.splitext(path)
+        return f"{base}.cluster{self.cluster_id}{ext}"
+
+    def guild_query(self, field: str = "_id") -> dict:
+        # only the documents of guilds on our shards, everything when we're not clustered
+        return shard_query(field, self.shard_ids, self.shard_count)
+
+    def user_query(self, field: str = "_id") -> dict:
+        # only the documents of users we own, so every cluster migrates and reconciles its own part
+        return owner_query(field, self.cluster_id, self.cluster_count)
+
+    def owns_guild(self, guild_id: int) -> bool:
+        return self.shard_ids is None or shard_id_for(guild_id, self.shard_count) in self.shard_ids
+
+    def owns_user(self, user_id: int) -> bool:
+        # user stuff that isn't tied to a guild (reminders, profiles) is handled by exactly one cluster
+        return self.cluster_id is None or user_id % self.cluster_count == self.cluster_id
+
+    def cluster_send(self, op: str, data):
+        # tells every other cluster, they get it as a `cluster_<op>` event
+        if self.ipc is not None:
+            self.ipc.send(op, data)
+
+    async def cluster_stats(self, data=None) -> dict:
+        return {
+            "cluster": self.cluster_id,
+            "shards": self.shard_ids if self.shard_ids is not None else list(range(self.shard_count)),
+            "guilds": len(self.guilds),
+            "users": len(self.users),
+            "latency_ms": round(self.latency * 1000) if self.is_ready() else None,
+            "server_configs": len(self.serverconfig_cache),
+            "leveling_rows": len(self.leveling_cache),
+        }
 
-        cursor = self.leveling_db.find({})
-        self.leveling_cache = await cursor.to_list(length=None)
-        print(f"Leveling cache has been loaded. | {len(self.leveling_cache)} items")
+    async def on_cluster_blacklist_add(self, doc):
+        self.blacklisted_cache[doc['_id']] = doc
+
+    async def on_cluster_blacklist_remove(self, data):
+        self.blacklisted_cache.pop(data['_id'], None)
+
+    async def on_cluster_reminder_add(self, doc):
+        self.reminders.append(doc)
+
+    async def on_cluster_reminder_remove(self, data):
+        for i, e in enumerate(self.reminders):
+            if e['_id'] == data['_id'] and e['user_id'] == data['user_id']:
+                self.reminders.pop(i)
+                break
+
+    async def on_cluster_profile_changed(self, changes):
+        if self.profile_sync is not None:
+            self.profile_sync.on_changed(changes)
+
+    async def on_cluster_reload_extension(self, data):
+        self.reload_extension(data['name'])
+
+    def get_leveling_board(self, guild_id) -> GuildLeaderboard:
+        board = self.leveling_boards.get(guild_id)
+        if board is None:
+            board = self.leveling_boards[guild_id] = GuildLeaderboard(guild_id)
+        return board
+
+    def seed_tracker(self, tracker, docs, key, fields):
+        # everything we just loaded is already in the db, so none of it is dirty
+        tracker.clear()
+        for doc in docs:
+            try:
+                tracker.seed(key(doc), fields(doc))
+            except KeyError:
+                pass  # incomplete document, leave it untracked so the next flush writes it in full
+
+    def snapshot_collection(self, tracker, docs, key, fields) -> dict:
+        # the documents plus which of them weren't written to the db yet
+        docs = list(docs)
+        dirty = []
+        for i, doc in enumerate(docs):
+            try:
+                if tracker.is_dirty(key(doc), fields(doc)):
+                    dirty.append(i)
+            except KeyError:
+                dirty.append(i)
+        return {"docs": docs, "dirty": dirty}
+
+    def build_snapshot(self) -> dict:
+        return {
+            "taken_at": time.time(),
+            "schema": {name: schema_version(name) for name in MIGRATIONS},
+            "shards": self.shard_layout(),
+            "prefixes": self.snapshot_collection(self.prefixes_tracker, self.prefixes_cache.values(), lambda e: e['_id'], self.prefix_fields),
+            "serverconfig": self.snapshot_collection(self.serverconfig_tracker, self.serverconfig_cache.values(), lambda e: e['_id'], self.serverconfig_fields),
+            "leveling": self.snapshot_collection(self.leveling_tracker, self.leveling_cache, lambda e: (e['id'], e['guild_id']), self.leveling_fields),
+            "user_profile": self.snapshot_collection(self.user_profile_tracker, self.user_profile_cache.snapshot_docs(), lambda h: h['_id'], self.user_profile_fields),
+        }
 
-        cursor = self.user_profile_db.find({})
-        self.user_profile_cache = await cursor.to_list(length=None)
-        print(f"User profile cache has been loaded. | {len(self.user_profile_cache)} profiles")
+    async def save_snapshot(self):
+        # encoded right here so it's one consistent picture of the caches, only the disk write leaves the loop
+        start = time.perf_counter()
+        payload = self.build_snapshot()
+        data = encode_snapshot(payload)
+        encoded = time.perf_counter()
+        await self.loop.run_in_executor(None, write_snapshot, self.local_path(SNAPSHOT_PATH), data)
+        self.snapshot_stats.update({
+            "bytes": len(data),
+            "encode_ms": round((encoded - start) * 1000, 2),
+            "write_ms": round((time.perf_counter() - encoded) * 1000, 2),
+            "saved_at": payload['taken_at'],
+        })
+
+    @tasks.loop(seconds=SNAPSHOT_INTERVAL, reconnect=True)
+    async def save_snapshot_loop(self):
+        if self.cache_loaded and not self.reconciling:
+            await self.save_snapshot()
+
+    @save_snapshot_loop.before_loop
+    async def before_save_snapshot_loop(self):
+        await self.wait_until_ready()
 
-    async def get_blacklisted_users(self):
+    def load_snapshot(self) -> bool:
+        # fills the caches from the snapshot file, returns False if it can't be used and get_cache has to load everything
+        start = time.perf_counter()
+        try:
+            payload = read_snapshot(self.local_path(SNAPSHOT_PATH))
+        except SnapshotError as e:
+            if os.path.exists(self.local_path(SNAPSHOT_PATH)):
+                print(f"Couldn't read the cache snapshot, loading from the db instead: {e}")
+            return False
+        age = time.time() - payload['taken_at']
+        if age > SNAPSHOT_MAX_AGE:
+            print(f"The cache snapshot is {round(age)}s old, loading from the db instead")
+            return False
+        if payload['schema'] != {name: schema_version(name) for name in MIGRATIONS}:
+            print("The cache snapshot was taken with different migrations, loading from the db instead")
+            return False
+        if payload.get('shards') != self.shard_layout():
+            print("The cache snapshot was taken with different shards, loading from the db instead")
+            return False
+
+        self.snapshot_dirty = {}
+        self.prefixes_cache = {e['_id']: e for e in self.restore_collection(
+            "prefixes", payload['prefixes'], self.prefixes_tracker, lambda e: e['_id'], self.prefix_fields
+        )}
+        self.prefix_matchers = {}
+        self.serverconfig_cache = {e['_id']: e for e in self.restore_collection(
+            "serverconfig", payload['serverconfig'], self.serverconfig_tracker, lambda e: e['_id'], self.serverconfig_fields
+        )}
+        self.leveling_cache = []
+        self.leveling_boards = {}
+        for e in self.restore_collection(
+            "leveling", payload['leveling'], self.leveling_tracker, lambda e: (e['id'], e['guild_id']), self.leveling_fields
+        ):
+            board = self.get_leveling_board(e['guild_id'])
+            if board.get(e['id']) is None:
+                board.add(e)
+                self.leveling_cache.append(e)
+        self.user_profile_cache.warm(self.restore_collection(
+            "user_profile", payload['user_profile'], self.user_profile_tracker, lambda h: h['_id'], self.user_profile_fields
+        ))
+
+        count = len(self.prefixes_cache) + len(self.serverconfig_cache) + len(self.leveling_cache) + len(self.user_profile_cache.entries)
+        took = round(time.perf_counter() - start, 3)
+        self.cache_load_stats = {"Snapshot": {"count": count, "seconds": took}}
+        self.snapshot_stats = {"taken_at": payload['taken_at'], "loaded_in": took, "age": round(age)}
+        print(f"Loaded {count} items from the cache snapshot ({round(age)}s old) in {took}s")
+        return True
+
+    def shard_layout(self) -> list:
+        return [self.shard_count, sorted(self.shard_ids) if self.shard_ids is not None else None]
+
+    def restore_collection(self, name, section, tracker, key, fields) -> list:
+        # clean documents are what the db has, the dirty ones stay untracked so the next flush writes them
+        docs = section['docs']
+        dirty = set(section['dirty'])
+        tracker.clear()
+        boot = self.snapshot_dirty[name] = {}
+        for i, doc in enumerate(docs):
+            # a document behind the current schema can't be seeded, its fields aren't all there yet
+            if name in MIGRATIONS and upgrade(name, doc):
+                dirty.add(i)
+            if i in dirty:
+                try:
+                    boot[key(doc)] = copy.deepcopy(fields(doc))
+                except KeyError:
+                    pass
+            else:
+                tracker.seed(key(doc), fields(doc))
+        return docs
+
+    def untouched_since_boot(self, name, tracker, k, fields: dict) -> bool:
+        # whether the cached document is still exactly what the snapshot gave us
+        boot = self.snapshot_dirty[name].get(k)
+        if boot is not None:
+            return boot == fields
+        return k in tracker.snapshots and not tracker.is_dirty(k, fields)
+
+    async def reconcile_snapshot(self, taken_at: float):
+        # the old process might have flushed after the snapshot was taken, those documents are newer
+        # in the db. they only replace the cached ones nobody touched since we started, anything
+        # changed in the meantime is newer still and gets written by the next flush.
+        start = time.perf_counter()
+        query = {"_updated_at": {"$gt": taken_at}}
+        replaced = 0
+        try:
+            await migrate_collection(self.user_profile_db, "user_profile", self.user_query())
+
+            async for e in self.prefixes.find({**query, **self.guild_query()}, {"prefix": 1, SCHEMA_FIELD: 1}):
+                if self.replace_if_untouched("prefixes", self.prefixes_cache, self.prefixes_tracker, e['_id'], e, self.prefix_fields):
+                    self.invalidate_prefix(e['_id'])
+                    replaced += 1
+
+            async for e in self.serverconfig.find({**query, **self.guild_query()}, dict.fromkeys(SERVERCONFIG_FIELDS, 1)):
+                if self.replace_if_untouched("serverconfig", self.serverconfig_cache, self.serverconfig_tracker, e['_id'], e, self.serverconfig_fields):
+                    replaced += 1
+
+            leveling = {(e['id'], e['guild_id']): e for e in self.leveling_cache}
+            async for e in self.leveling_db.find({**query, **self.guild_query("guild_id")}, {"_id": 0, "id": 1, "guild_id": 1, "xp": 1, "messages": 1}):
+                k = (e['id'], e['guild_id'])
+                cached = leveling.get(k)
+                if cached is None:
+                    self.leveling_cache.append(e)
+                    self.get_leveling_board(e['guild_id']).add(e)
+                elif self.untouched_since_boot("leveling", self.leveling_tracker, k, self.leveling_fields(cached)):
+                    cached.update(e)
+                    self.reapply_journal("leveling", k, cached)
+                    self.get_leveling_board(e['guild_id']).refresh(cached)
+                else:
+                    continue
+                self.leveling_tracker.seed(k, self.leveling_fields(e))
+                self.snapshot_dirty["leveling"].pop(k, None)
+                replaced += 1
+
+            async for h in self.user_profile_db.find({**query, **self.user_query()}, {"_updated_at": 0}):
+                cached = self.user_profile_cache.peek(h['_id'])
+                # profiles that aren't cached get loaded from the db when they're needed anyway
+                if cached is not None and self.untouched_since_boot("user_profile", self.user_profile_tracker, h['_id'], self.user_profile_fields(cached)):
+                    cached.update(h)
+                    self.user_profile_tracker.seed(h['_id'], self.user_profile_fields(h))
+                    self.reapply_journal("user_profile", h['_id'], cached)
+                    self.snapshot_dirty["user_profile"].pop(h['_id'], None)
+                    replaced += 1
+        finally:
+            self.reconciling = False
+            self.replayed_fields = {}
+        self.snapshot_stats["reconciled"] = replaced
+        self.snapshot_stats["reconciled_in"] = round(time.perf_counter() - start, 3)
+        print(f"Cache snapshot reconciled with the db, {replaced} newer documents in {self.snapshot_stats['reconciled_in']}s")
+
+    def replace_if_untouched(self, name, cache, tracker, k, doc, fields) -> bool:
+        cached = cache.get(k)
+        if cached is not None and not self.untouched_since_boot(name, tracker, k, fields(cached)):
+            return False
+        cache[k] = doc
+        tracker.seed(k, fields(doc))
+        self.reapply_journal(name, k, doc)
+        self.snapshot_dirty[name].pop(k, None)
+        return True
+
+    def reapply_journal(self, name, k, doc):
+        # the journal is newer than anything in the db (it's truncated by every flush), so it stays on top
+        fields = self.replayed_fields.get(name, {}).get(k)
+        if fields:
+            doc.update(copy.deepcopy(fields))
+
+    async def get_blacklisted_users(self) -> int:
         cursor = self.blacklisted.find({})
-        self.blacklisted_cache = await cursor.to_list(length=None)
-        print(f"Blacklisted users cache has been loaded. | {len(self.blacklisted_cache)} users")
+        self.blacklisted_cache = {e['_id']: e async for e in cursor}
+        return len(self.blacklisted_cache)
+
+    def is_blacklisted(self, user_id: int) -> bool:
+        return user_id in self.blacklisted_cache
+
+    async def add_to_blacklist(self, user_id: int, reason: str):
+        doc = {"_id": user_id, "reason": reason}
+        await self.blacklisted.insert_one(doc)
+        self.blacklisted_cache[user_id] = doc
+        self.cluster_send("blacklist_add", doc)
+
+    async def remove_from_blacklist(self, user_id: int):
+        await self.blacklisted.delete_one({"_id": user_id})
+        self.cluster_send("blacklist_remove", {"_id": user_id})
+        return self.blacklisted_cache.pop(user_id, None)
 
     async def load_extensions(self, filename_):
         loaded = []
@@ -512,31 +871,29 @@ class EpicBot(commands.AutoShardedBot):
             return ["e!"]
 
         guild_id = message.guild.id
-        prefix_cache = self.prefixes_cache
-
-        for ee in prefix_cache:
-            if ee['_id'] == guild_id:
-                if isinstance(ee['prefix'], str):
-                    str_prefix = ee['prefix']
-                    ee.update({"prefix": [str_prefix]})
-                return ee['prefix']
-
-        prefix_cache.append({"_id": guild_id, "prefix": ["e!"]})
-        return ["e!"]
+        ee = self.prefixes_cache.get(guild_id)
+        if ee is None:
+            ee = self.prefixes_cache[guild_id] = stamp("prefixes", {"_id": guild_id, "prefix": ["e!"]})
+        return ee['prefix']
+
+    def get_prefix_matcher(self, guild_id, prefix) -> PrefixMatcher:
+        matcher = self.prefix_matchers.get(guild_id)
+        if matcher is None:
+            bot_id = self.user.id
+            matcher = self.prefix_matchers[guild_id] = PrefixMatcher([f"<@{bot_id}> ", f"<@!{bot_id}> "] + list(prefix))
+        return matcher
+
+    def invalidate_prefix(self, guild_id):
+        # call this whenever a guild's prefixes change
+        self.prefix_matchers.pop(guild_id, None)
 
     async def get_custom_prefix(self, message: discord.Message):
         prefix = await self.fetch_prefix(message)
-        bot_id = self.user.id
-        prefixes = [f"<@{bot_id}> ", f"<@!{bot_id}> "]
-        for h in prefix:
-            prefixes.append(h)
-
-        comp = re.compile(
-            "^(" + "|".join(re.escape(p) for p in prefixes) + ").*", flags=re.I
-        )
-        match = comp.match(message.content)
+        # dms all share the default prefix, they go under 0
+        matcher = self.get_prefix_matcher(message.guild.id if message.guild else 0, prefix)
+        match = matcher.match(message.content)
         if match is not None:
-            return match.group(1)
+            return match
         return prefix
 
     async def load_rolemenus(self, dropdown_view, button_view):
@@ -558,6 +915,78 @@ class EpicBot(commands.AutoShardedBot):
 
         print(f"Self role views has been loaded. | {i} views")
 
+    async def start(self, *args, **kwargs):
+        # client.run() just stops the event loop on SIGTERM, which kills everything before close() can drain
+        try:
+            self.loop.add_signal_handler(signal.SIGTERM, lambda: self.loop.create_task(self.close()))
+        except NotImplementedError:
+            pass  # windows
+        if self.ipc is not None:
+            self.loop.create_task(self.ipc.run())
+        await super().start(*args, **kwargs)
+
+    async def close(self):
+        if self.closing:
+            return
+        self.closing = True
+        start = time.perf_counter()
+        print("Shutting down, flushing the caches...")
+        timed_out = False
+        try:
+            await asyncio.wait_for(self.drain(), timeout=SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            timed_out = True
+            print(f"The final flush didn't finish in {SHUTDOWN_TIMEOUT}s, the journal has whatever is missing")
+        except Exception:
+            traceback.print_exc()
+
+        leveling = self.get_cog("Leveling")
+        if leveling is not None:
+            leveling.renderer.shutdown()
+        await self.session.close()
+        if self.ipc is not None:
+            self.ipc.close()
+
+        self.shutdown_stats = {"seconds": round(time.perf_counter() - start, 3), "timed_out": timed_out}
+        print(f"Drained in {self.shutdown_stats['seconds']}s")
+        await super().close()
+
+    def background_loops(self) -> list:
+        # every tasks.loop of the bot and the cogs, except the db flush loops
+        loops = [self.save_snapshot_loop]
+        for cog in self.cogs.values():
+            for name, attr in type(cog).__dict__.items():
+                if isinstance(attr, tasks.Loop):
+                    loops.append(getattr(cog, name))
+        return loops
+
+    async def drain(self):
+        for loop in self.background_loops():
+            loop.cancel()
+
+        # a flush that's already running finishes first instead of racing the final one below
+        flush_loops = [self.update_prefixes_db, self.update_serverconfig_db, self.update_leveling_db, self.update_user_profile_db]
+        trackers = [self.prefixes_tracker, self.serverconfig_tracker, self.leveling_tracker, self.user_profile_tracker]
+        locks = [self.flush_locks.setdefault(t.name, asyncio.Lock()) for t in trackers]
+        for lock in locks:
+            await lock.acquire()
+        for loop in flush_loops:
+            loop.cancel()
+        for lock in locks:
+            lock.release()
+
+        # in case the db is down, everything changed since the last flush is on disk first
+        await self.journal.commit()
+        if self.cache_loaded and not self.reconciling:
+            for flush in flush_loops:
+                try:
+                    await flush()
+                except Exception:
+                    traceback.print_exc()
+            # everything is clean now, so the next start can come up from this
+            await self.save_snapshot()
+        self.journal.close()
+
     async def on_error(self, event_method: str, *args, **kwargs) -> None:
         (exc_type, exc, tb) = sys.exc_info()
         if isinstance(exc, commands.CommandInvokeError):
@@ -580,13 +1009,13 @@ class EpicBot(commands.AutoShardedBot):
             return await super().on_error(event_method, *args, **kwargs)
 
     async def on_message(self, message: discord.Message):
-        if not self.cache_loaded:
+        if not self.cache_loaded or self.closing:
             return
-        if message.author.bot:
+        await self.message_pipeline.dispatch(message)
+
+    async def handle_commands(self, message: discord.Message, mctx: MessageContext):
+        if mctx.blacklisted:
             return
-        for e in self.blacklisted_cache:
-            if message.author.id == e['_id']:
-                return
         if message.content.lower() in [f'<@{self.user.id}>', f'<@!{self.user.id}>']:
             prefixes = await self.fetch_prefix(message)
             prefix_text = ""
@@ -0,0 +1,209 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import itertools
+import json
+
+from typing import Callable, Dict, List, Optional
+
+
+def shard_id_for(guild_id: int, shard_count: int) -> int:
+    # the same formula discord uses to pick the shard of a guild
+    return (guild_id >> 22) % shard_count
+
+
+def split_shards(shard_count: int, cluster_count: int) -> List[List[int]]:
+    # consecutive shard ranges, as even as possible
+    per_cluster, extra = divmod(shard_count, cluster_count)
+    clusters = []
+    start = 0
+    for i in range(cluster_count):
+        end = start + per_cluster + (1 if i < extra else 0)
+        clusters.append(list(range(start, end)))
+        start = end
+    return clusters
+
+
+def shard_query(field: str, shard_ids: Optional[List[int]], shard_count: int) -> dict:
+    # mongo filter for the documents whose guild is on one of `shard_ids`, {} when we have all the shards.
+    # it goes through decimal because ids are too big to divide as doubles without losing the low bits.
+    if shard_ids is None:
+        return {}
+    return {"$expr": {"$in": [
+        {"$mod": [{"$floor": {"$divide": [{"$toDecimal": f"${field}"}, 1 << 22]}}, shard_count]},
+        list(shard_ids)
+    ]}}
+
+
+def owner_query(field: str, cluster_id: Optional[int], cluster_count: int) -> dict:
+    # mongo filter for the users `cluster_id` owns (user_id % cluster_count), {} when we're not clustered
+    if cluster_id is None:
+        return {}
+    return {"$expr": {"$eq": [{"$mod": [f"${field}", cluster_count]}, cluster_id]}}
+
+
+async def read_messages(reader: asyncio.StreamReader):
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        yield json.loads(line)
+
+
+def encode_message(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+class ClusterHub:
+    # runs in the launcher. every worker connects and says who it is, after that the hub just
+    # forwards: messages with a "to" go to that cluster, everything else goes to all the others.
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.writers = {}  # cluster id -> StreamWriter
+        self.server = None
+        self.forwarded = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        cluster_id = None
+        try:
+            async for message in read_messages(reader):
+                if message.get("op") == "identify":
+                    cluster_id = message['from']
+                    self.writers[cluster_id] = writer
+                    continue
+                targets = [message['to']] if "to" in message else [c for c in self.writers if c != cluster_id]
+                data = encode_message(message)
+                for target in targets:
+                    w = self.writers.get(target)
+                    if w is not None:
+                        w.write(data)
+                self.forwarded += 1
+        except (ConnectionError, json.JSONDecodeError):
+            pass
+        finally:
+            if cluster_id is not None and self.writers.get(cluster_id) is writer:
+                del self.writers[cluster_id]
+            writer.close()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+class ClusterClient:
+    # a worker's connection to the hub. send() is fire and forget, request() asks every other cluster
+    # (or just the one in `to`) and returns their answers. incoming messages become `cluster_<op>` events through `dispatch`,
+    # requests are answered by the coroutine registered for their op in `handlers`.
+    def __init__(self, cluster_id: int, cluster_count: int, host: str, port: int, dispatch: Callable):
+        self.cluster_id = cluster_id
+        self.cluster_count = cluster_count
+        self.host = host
+        self.port = port
+        self.dispatch = dispatch
+        self.handlers: Dict[str, Callable] = {}
+        self.writer = None
+        self.connected = asyncio.Event()
+        self.nonces = itertools.count()
+        self.waiting = {}  # nonce -> [future, replies, how many replies it's waiting for]
+        self.closed = False
+
+        self.sent = 0
+        self.received = 0
+
+    async def run(self):
+        # reconnects forever, the launcher might still be starting or restarting
+        while not self.closed:
+            try:
+                reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            except OSError:
+                await asyncio.sleep(1)
+                continue
+            self.writer.write(encode_message({"op": "identify", "from": self.cluster_id}))
+            self.connected.set()
+            try:
+                async for message in read_messages(reader):
+                    self.received += 1
+                    asyncio.ensure_future(self.handle(message))
+            except (ConnectionError, json.JSONDecodeError):
+                pass
+            self.connected.clear()
+            self.writer = None
+            await asyncio.sleep(1)
+
+    async def handle(self, message: dict):
+        op = message['op']
+        if op == "reply":
+            waiting = self.waiting.get(message['nonce'])
+            if waiting is not None:
+                waiting[1].append(message['data'])
+                if len(waiting[1]) >= waiting[2] and not waiting[0].done():
+                    waiting[0].set_result(None)
+            return
+        if "nonce" in message:
+            handler = self.handlers.get(op)
+            data = await handler(message['data']) if handler is not None else None
+            self._write({"op": "reply", "to": message['from'], "nonce": message['nonce'], "data": data})
+            return
+        self.dispatch(f"cluster_{op}", message['data'])
+
+    def _write(self, message: dict):
+        if self.writer is None:
+            return False
+        message['from'] = self.cluster_id
+        self.writer.write(encode_message(message))
+        self.sent += 1
+        return True
+
+    def send(self, op: str, data) -> bool:
+        return self._write({"op": op, "data": data})
+
+    async def request(self, op: str, data=None, timeout: float = 5, to: Optional[int] = None) -> list:
+        # whatever the other clusters answered within `timeout`, a cluster that's down just isn't in the list
+        nonce = next(self.nonces)
+        future = asyncio.get_event_loop().create_future()
+        self.waiting[nonce] = [future, [], 1 if to is not None else self.cluster_count - 1]
+        message = {"op": op, "data": data, "nonce": nonce}
+        if to is not None:
+            message['to'] = to
+        try:
+            if self.cluster_count > 1 and self._write(message):
+                try:
+                    await asyncio.wait_for(future, timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            return self.waiting[nonce][1]
+        finally:
+            del self.waiting[nonce]
+
+    def close(self):
+        self.closed = True
+        if self.writer is not None:
+            self.writer.close()
+
+    def stats(self) -> dict:
+        return {
+            "cluster": self.cluster_id,
+            "clusters": self.cluster_count,
+            "connected": self.connected.is_set(),
+            "sent": self.sent,
+            "received": self.received,
+        }
@@ -0,0 +1,48 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+
+from typing import Awaitable, Callable, Hashable
+
+
+class Coalescer:
+    # one fetch per key at a time: whoever asks for a key that's already being fetched waits on
+    # that fetch instead of starting another one. the caches use it for their misses.
+    def __init__(self):
+        self.pending = {}
+        self.started = 0
+        self.joined = 0
+
+    async def run(self, key: Hashable, fetch: Callable[[], Awaitable]):
+        task = self.pending.get(key)
+        if task is None:
+            self.started += 1
+            task = self.pending[key] = asyncio.ensure_future(fetch())
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.joined += 1
+        # shielded so one cancelled caller doesn't cancel it for everyone else
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Future):
+        self.pending.pop(key, None)
+        # everyone waiting on it might have been cancelled, this keeps a failure from being logged as never retrieved
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self):
+        return len(self.pending)
@@ -0,0 +1,152 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import discord
+import time
+
+from typing import Iterable, Optional
+from utils.metrics import Histogram
+
+
+class ChannelBatch:
+    def __init__(self, channel):
+        self.channel = channel
+        self.messages = {}  # message_id -> when it was queued, a dict so the same message isn't deleted twice
+        self.warnings = {}  # warning -> {user mention: None}, every offender once per warning
+        self.task = None
+
+
+class EnforcementQueue:
+    # collects what automod wants to delete in a channel for `window` seconds and then does it
+    # all at once: one delete_messages call per 100 messages and one warning naming every offender,
+    # instead of a delete and a warning per message, which eats the channel's rate limit during raids.
+    # a single message while nothing else is queued anywhere and nothing is being deleted in its channel
+    # isn't a raid, that one goes out right away.
+    def __init__(self, window: float = 1, allowed_mentions: Optional[discord.AllowedMentions] = None, warning_delete_after: float = 5):
+        self.window = window
+        self.allowed_mentions = allowed_mentions
+        self.warning_delete_after = warning_delete_after
+        self.batches = {}
+        self.in_flight = {}  # channel_id -> flushes still waiting on discord there
+
+        self.queued = 0
+        self.deleted = 0
+        self.failed = 0
+        self.fallbacks = 0
+        self.flushes = 0
+        self.immediate = 0
+        self.warnings_sent = 0
+        self.latency = Histogram(buckets_ms=(100, 250, 500, 1000, 2000, 5000, 10000, 30000))
+
+    def enqueue(self, channel, message_ids: Iterable[int], mention: Optional[str] = None, warning: Optional[str] = None):
+        batch = self.batches.get(channel.id)
+        if batch is None:
+            batch = self.batches[channel.id] = ChannelBatch(channel)
+            batch.task = asyncio.ensure_future(self._flush_later(channel.id))
+        now = time.monotonic()
+        for message_id in message_ids:
+            if message_id not in batch.messages:
+                batch.messages[message_id] = now
+                self.queued += 1
+        if mention is not None and warning is not None:
+            batch.warnings.setdefault(warning, {})[mention] = None
+
+    async def _flush_later(self, channel_id: int):
+        # lets whatever the same message queues right after (its warning) get in first
+        await asyncio.sleep(0)
+        batch = self.batches.get(channel_id)
+        if batch is not None and len(batch.messages) <= 1 and len(self.batches) == 1 and channel_id not in self.in_flight:
+            self.immediate += 1
+        else:
+            # the channel is busy, whatever comes in after this waits out the window together with it
+            await asyncio.sleep(self.window)
+        batch = self.batches.pop(channel_id, None)
+        if batch is None:
+            return
+        self.in_flight[channel_id] = self.in_flight.get(channel_id, 0) + 1
+        try:
+            await self.flush(batch)
+        finally:
+            self.in_flight[channel_id] -= 1
+            if not self.in_flight[channel_id]:
+                del self.in_flight[channel_id]
+
+    async def flush(self, batch: ChannelBatch):
+        self.flushes += 1
+        ids = list(batch.messages)
+        for i in range(0, len(ids), 100):
+            chunk = ids[i:i + 100]
+            try:
+                await batch.channel.delete_messages([discord.Object(id=message_id) for message_id in chunk])
+            except discord.NotFound:
+                # already gone, which is what we wanted anyway
+                pass
+            except discord.Forbidden:
+                # one at a time wouldn't be allowed either
+                self.failed += len(chunk)
+                continue
+            except discord.HTTPException:
+                # one deleted message in the chunk makes the whole bulk delete fail, so do them one by one
+                self.fallbacks += 1
+                await self.delete_one_by_one(batch, chunk)
+                continue
+            self.record_deleted(batch, chunk)
+
+        if batch.warnings:
+            text = "\n".join(f"{' '.join(mentions)}, {warning}" for warning, mentions in batch.warnings.items())
+            try:
+                await batch.channel.send(text[:2000], delete_after=self.warning_delete_after, allowed_mentions=self.allowed_mentions)
+            except discord.HTTPException:
+                pass
+            else:
+                self.warnings_sent += 1
+
+    async def delete_one_by_one(self, batch: ChannelBatch, message_ids: list):
+        for message_id in message_ids:
+            try:
+                await batch.channel.get_partial_message(message_id).delete()
+            except discord.NotFound:
+                pass
+            except discord.HTTPException:
+                self.failed += 1
+                continue
+            self.record_deleted(batch, [message_id])
+
+    def record_deleted(self, batch: ChannelBatch, message_ids: list):
+        now = time.monotonic()
+        self.deleted += len(message_ids)
+        for message_id in message_ids:
+            self.latency.record(now - batch.messages[message_id])
+
+    @property
+    def depth(self) -> int:
+        return sum(len(b.messages) for b in self.batches.values())
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "pending_channels": len(self.batches),
+            "flushing_channels": len(self.in_flight),
+            "queued": self.queued,
+            "deleted": self.deleted,
+            "failed": self.failed,
+            "fallbacks": self.fallbacks,
+            "flushes": self.flushes,
+            "immediate": self.immediate,
+            "warnings_sent": self.warnings_sent,
+            "latency": self.latency.to_dict(),
+        }
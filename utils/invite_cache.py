@@ -0,0 +1,100 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import discord
+import time
+
+from collections import OrderedDict
+from typing import Callable, Optional
+from utils.coalesce import Coalescer
+
+
+class InviteCache:
+    # invite code -> id of the guild it points to, so the same invite posted a thousand times
+    # during a raid is only fetched once. codes that don't exist are remembered too (as None)
+    # but for a shorter time, since someone could create them later.
+    # group dm invites don't have a guild, they're stored as 0.
+    def __init__(self, fetch: Callable, max_items: int = 4096, ttl: int = 3600, negative_ttl: int = 600):
+        self.fetch = fetch
+        self.max_items = max_items
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self.entries = OrderedDict()
+        self.lookups = Coalescer()
+
+        self.hits = 0
+        self.evictions = 0
+        self.expired = 0
+
+    async def resolve(self, code: str) -> Optional[int]:
+        entry = self.entries.get(code)
+        if entry is not None:
+            guild_id, expires_at = entry
+            if expires_at > time.monotonic():
+                self.entries.move_to_end(code)
+                self.hits += 1
+                return guild_id
+            self.expired += 1
+            del self.entries[code]
+
+        return await self.lookups.run(code, lambda: self._fetch(code))
+
+    async def _fetch(self, code: str) -> Optional[int]:
+        try:
+            invite = await self.fetch(code)
+        except discord.NotFound:
+            guild_id = None
+        else:
+            guild_id = invite.guild.id if invite.guild is not None else 0
+        # anything else (rate limits, discord being down) isn't cached and goes to the caller
+        self.put(code, guild_id)
+        return guild_id
+
+    def put(self, code: str, guild_id: Optional[int]):
+        ttl = self.ttl if guild_id is not None else self.negative_ttl
+        self.entries.pop(code, None)
+        self.entries[code] = (guild_id, time.monotonic() + ttl)
+        while len(self.entries) > self.max_items:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def forget(self, code: str):
+        self.entries.pop(code, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    @property
+    def misses(self) -> int:
+        return self.lookups.started
+
+    @property
+    def coalesced(self) -> int:
+        return self.lookups.joined
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "items": len(self.entries),
+            "invalid_codes": sum(1 for guild_id, _ in self.entries.values() if guild_id is None),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0,
+        }
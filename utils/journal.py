@@ -0,0 +1,228 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import bson
+import os
+import struct
+import time
+import zlib
+
+from typing import Callable, Iterator, Optional, Tuple
+from utils.metrics import Histogram
+
+# every record is its length and crc32, then one bson document: {"c": collection, "k": key, "f": fields}
+RECORD_HEADER = struct.Struct(">II")
+
+
+def encode_record(name: str, key, fields: dict) -> bytes:
+    body = bson.encode({"c": name, "k": list(key) if isinstance(key, tuple) else key, "f": fields})
+    return RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+
+def read_records(path: str) -> Iterator[Tuple[str, object, dict]]:
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = 0
+    while pos + RECORD_HEADER.size <= len(data):
+        length, crc = RECORD_HEADER.unpack_from(data, pos)
+        body = data[pos + RECORD_HEADER.size:pos + RECORD_HEADER.size + length]
+        # a torn write at the end from the crash, everything before it is fine
+        if len(body) != length or zlib.crc32(body) != crc:
+            return
+        record = bson.decode(body)
+        key = record['k']
+        yield record['c'], tuple(key) if isinstance(key, list) else key, record['f']
+        pos += RECORD_HEADER.size + length
+
+
+class Journal:
+    # the cache changes that happened since the last flush, on disk, so a crash between two flushes
+    # doesn't lose them. cogs call mark() after changing a cached document, every `commit_interval`
+    # seconds everything marked is written and fsynced in one go (group commit). every collection
+    # has its own segment files, the flush loop rotates them before it diffs and deletes the old
+    # ones once its bulk_write went through.
+    def __init__(self, path: str, commit_interval: float = 0.05, max_segment_bytes: int = 4 * 1024 * 1024):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.max_segment_bytes = max_segment_bytes
+
+        self.collections = {}  # name -> (get_doc, fields)
+        self.on_mark = {}  # name -> what else wants to know right away when something in it changes
+        self.pending = {}  # name -> {key: set of changed fields, or None for all of them}
+        self.current = {}  # name -> [path, file, size] of the segment being written
+        self.closed = {}  # name -> segments that are waiting for the next successful flush
+        self.next_segment = 0
+        self.lock = asyncio.Lock()
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+        self.records = 0
+        self.commits = 0
+        self.bytes_written = 0
+        self.rotations = 0
+        self.truncated = 0
+        self.errors = 0
+        self.replayed = 0
+        self.fsync_latency = Histogram(buckets_ms=(1, 2, 5, 10, 25, 50, 100, 250, 1000))
+
+        os.makedirs(path, exist_ok=True)
+
+    def register(self, name: str, get_doc: Callable, fields: Callable, on_mark: Optional[Callable] = None):
+        # get_doc(key) returns the cached document or None, fields(doc) what gets written for it.
+        # on_mark(key, fields) is called by every mark() of the collection.
+        self.collections[name] = (get_doc, fields)
+        if on_mark is not None:
+            self.on_mark[name] = on_mark
+
+    def mark(self, name: str, key, *fields: str):
+        # no fields means the whole document changed
+        keys = self.pending.setdefault(name, {})
+        if not fields:
+            keys[key] = None
+        elif key not in keys:
+            keys[key] = set(fields)
+        elif keys[key] is not None:
+            keys[key].update(fields)
+        on_mark = self.on_mark.get(name)
+        if on_mark is not None:
+            on_mark(key, fields)
+        if self.task is None:
+            self.task = asyncio.ensure_future(self._run())
+        self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self.wakeup.wait()
+            # everything marked in this window goes out with the same fsync
+            await asyncio.sleep(self.commit_interval)
+            self.wakeup.clear()
+            try:
+                await self.commit()
+            except Exception as e:
+                self.errors += 1
+                print(f"Couldn't write the cache journal: {e}")
+
+    async def commit(self):
+        async with self.lock:
+            pending, self.pending = self.pending, {}
+            chunks = {}
+            for name, keys in pending.items():
+                get_doc, fields = self.collections[name]
+                out = []
+                for key, changed in keys.items():
+                    doc = get_doc(key)
+                    if doc is None:
+                        continue
+                    values = fields(doc)
+                    if changed is not None:
+                        values = {k: values[k] for k in changed if k in values}
+                    out.append(encode_record(name, key, values))
+                if out:
+                    chunks[name] = b"".join(out)
+                    self.records += len(out)
+            if not chunks:
+                return
+            start = time.perf_counter()
+            await asyncio.get_event_loop().run_in_executor(None, self._write, chunks)
+            self.fsync_latency.record(time.perf_counter() - start)
+            self.commits += 1
+
+    def _write(self, chunks: dict):
+        for name, data in chunks.items():
+            segment = self.current.get(name)
+            if segment is None:
+                segment = self.current[name] = self._open_segment(name)
+            segment[1].write(data)
+            segment[1].flush()
+            os.fsync(segment[1].fileno())
+            segment[2] += len(data)
+            self.bytes_written += len(data)
+            if segment[2] >= self.max_segment_bytes:
+                self._close_segment(name)
+
+    def _open_segment(self, name: str) -> list:
+        path = os.path.join(self.path, f"{self.next_segment:08d}.{name}.log")
+        self.next_segment += 1
+        return [path, open(path, "ab"), 0]
+
+    def _close_segment(self, name: str):
+        segment = self.current.pop(name, None)
+        if segment is not None:
+            segment[1].close()
+            self.closed.setdefault(name, []).append(segment[0])
+            self.rotations += 1
+
+    async def rotate(self, name: str) -> list:
+        # call this right before diffing the collection for a flush. whatever was committed so far
+        # is in the segments this returns, and the diff is going to include all of it.
+        async with self.lock:
+            self._close_segment(name)
+            return list(self.closed.get(name, ()))
+
+    def truncate(self, name: str, segments: Optional[list]):
+        # the flush that started after rotate() went through, these aren't needed anymore
+        if not segments:
+            return
+        closed = self.closed.get(name, [])
+        for path in segments:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            if path in closed:
+                closed.remove(path)
+            self.truncated += 1
+
+    def replay(self) -> Iterator[Tuple[str, object, dict]]:
+        # every record left over from the last run, in the order they were written.
+        # the segments are kept until the next flush of their collection has written them to the db.
+        # the ones this run wrote (or already replayed) aren't leftovers, they're skipped.
+        known = {path for paths in self.closed.values() for path in paths}
+        known.update(segment[0] for segment in self.current.values())
+        segments = []
+        for filename in os.listdir(self.path):
+            parts = filename.split(".")
+            path = os.path.join(self.path, filename)
+            if len(parts) == 3 and parts[0].isdigit() and parts[2] == "log" and path not in known:
+                segments.append((int(parts[0]), parts[1], path))
+        segments.sort()
+        for seq, name, path in segments:
+            self.next_segment = max(self.next_segment, seq + 1)
+            self.closed.setdefault(name, []).append(path)
+            for record in read_records(path):
+                self.replayed += 1
+                yield record
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+        for name in list(self.current):
+            self._close_segment(name)
+
+    def stats(self) -> dict:
+        return {
+            "records": self.records,
+            "commits": self.commits,
+            "bytes_written": self.bytes_written,
+            "pending": sum(len(keys) for keys in self.pending.values()),
+            "segments": sum(len(s) for s in self.closed.values()) + len(self.current),
+            "rotations": self.rotations,
+            "truncated": self.truncated,
+            "replayed": self.replayed,
+            "errors": self.errors,
+            "fsync": self.fsync_latency.to_dict(),
+        }
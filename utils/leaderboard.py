@@ -0,0 +1,96 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from bisect import bisect_left, insort
+from typing import List, Optional, Tuple
+
+
+class RankedIndex:
+    # a sorted list of (-score, seq, user_id), so the highest score is always at index 0.
+    # seq is the order the user was first seen in, it keeps ties in the same order
+    # the old "sort the whole cache" code used to give them.
+    def __init__(self):
+        self.entries = []
+        self.keys = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def set(self, user_id: int, score: int, seq: int):
+        old = self.keys.get(user_id)
+        if old is not None:
+            if old[0] == -score:
+                return
+            del self.entries[bisect_left(self.entries, old)]
+        new = (-score, seq, user_id)
+        insort(self.entries, new)
+        self.keys[user_id] = new
+
+    def remove(self, user_id: int):
+        old = self.keys.pop(user_id, None)
+        if old is not None:
+            del self.entries[bisect_left(self.entries, old)]
+
+    def rank(self, user_id: int) -> Optional[int]:
+        key = self.keys.get(user_id)
+        if key is None:
+            return None
+        return bisect_left(self.entries, key) + 1
+
+    def top(self, n: int = 10) -> List[Tuple[int, int]]:
+        return [(user_id, -score) for score, _, user_id in self.entries[:n]]
+
+    def page(self, k: int, per_page: int = 10) -> List[Tuple[int, int]]:
+        # k starts from 1, just like the page numbers we show people
+        start = (k - 1) * per_page
+        return [(user_id, -score) for score, _, user_id in self.entries[start:start + per_page]]
+
+
+class GuildLeaderboard:
+    # all the leveling documents of one guild, plus a ranked index for xp and for messages
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.docs = {}
+        self.seqs = {}
+        self.xp = RankedIndex()
+        self.messages = RankedIndex()
+        self._next_seq = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def get(self, user_id: int) -> Optional[dict]:
+        return self.docs.get(user_id)
+
+    def add(self, doc: dict):
+        user_id = doc['id']
+        if user_id not in self.seqs:
+            self.seqs[user_id] = self._next_seq
+            self._next_seq += 1
+        self.docs[user_id] = doc
+        self.refresh(doc)
+
+    def refresh(self, doc: dict):
+        # call this after changing "xp" or "messages" of a document
+        seq = self.seqs[doc['id']]
+        self.xp.set(doc['id'], doc['xp'], seq)
+        self.messages.set(doc['id'], doc['messages'], seq)
+
+    def remove(self, user_id: int):
+        self.docs.pop(user_id, None)
+        self.seqs.pop(user_id, None)
+        self.xp.remove(user_id)
+        self.messages.remove(user_id)
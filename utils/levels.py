@@ -0,0 +1,43 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from math import isqrt
+from typing import Tuple
+
+# you reach level `lvl + 1` once you have 50 * lvl * (lvl + 1) xp,
+# so every level takes 100 * lvl more xp than the one before it.
+
+
+def xp_for_level(lvl: int) -> int:
+    # total xp needed to reach `lvl`
+    if lvl <= 1:
+        return 0
+    return 50 * (lvl - 1) * lvl
+
+
+def level_for_xp(xp) -> int:
+    # closed form of the old "keep adding 1 until it doesn't fit" loop:
+    # the biggest n with 50 * n * (n + 1) <= xp, plus one.
+    if xp < 0:
+        return 0
+    q = int(xp // 50)
+    return (isqrt(4 * q + 1) - 1) // 2 + 1
+
+
+def progress_in_level(xp) -> Tuple[int, int]:
+    # (xp earned in the current level, xp needed to finish the current level)
+    lvl = level_for_xp(xp)
+    return xp - xp_for_level(lvl), 100 * lvl
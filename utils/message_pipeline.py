@@ -0,0 +1,163 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import discord
+import time
+
+from functools import cached_property
+from typing import Callable, Optional
+from utils.text_features import TextFeatures
+
+
+class MessageContext:
+    # everything the message handlers used to look up on their own, fetched once per message
+    def __init__(self, client, message: discord.Message):
+        self.client = client
+        self.message = message
+        self.guild_config = None
+        self.stopped = False
+        self._profile = None
+
+    @cached_property
+    def is_bot(self) -> bool:
+        return self.message.author.bot
+
+    @cached_property
+    def blacklisted(self) -> bool:
+        return self.message.author.id in self.client.blacklisted_cache
+
+    @cached_property
+    def text_features(self) -> TextFeatures:
+        return TextFeatures(self.message.content)
+
+    @cached_property
+    def is_mod(self) -> bool:
+        if not self.message.guild or not isinstance(self.message.author, discord.Member):
+            return False
+        p = self.message.author.guild_permissions
+        return p.kick_members or p.administrator or p.ban_members or p.manage_guild or self.message.author == self.message.guild.owner
+
+    async def get_profile(self) -> dict:
+        # loaded on first use, most messages never need it
+        if self._profile is None:
+            self._profile = await self.client.get_user_profile_(self.message.author.id)
+        return self._profile
+
+    def stop(self):
+        # none of the handlers after the current one will see this message
+        self.stopped = True
+
+
+class MessageHandler:
+    def __init__(self, name: str, callback: Callable, order: int, bots: bool, dms: bool, guilds: bool, background: bool):
+        self.name = name
+        self.callback = callback
+        self.order = order
+        self.bots = bots
+        self.dms = dms
+        self.guilds = guilds
+        self.background = background
+
+        self.calls = 0
+        self.errors = 0
+        self.stops = 0
+        self.total_time = 0
+        self.max_time = 0
+
+    def wants(self, mctx: MessageContext) -> bool:
+        if mctx.is_bot and not self.bots:
+            return False
+        if mctx.message.guild is None:
+            return self.dms
+        return self.guilds
+
+
+class MessagePipeline:
+    # one on_message for the whole bot, the cogs register their handlers here instead of
+    # adding their own listeners. handlers run in `order`, any of them can call `mctx.stop()`
+    # to keep the message away from the rest, and `background` handlers get their own task
+    # so slow stuff (webhooks, http calls, commands) doesn't hold up the handlers after them.
+    def __init__(self, client):
+        self.client = client
+        self.handlers = []
+
+    def register(
+        self, name: str, callback: Callable, *, order: int = 100,
+        bots: bool = False, dms: bool = False, guilds: bool = True, background: bool = False
+    ):
+        self.unregister(name)
+        self.handlers.append(MessageHandler(name, callback, order, bots, dms, guilds, background))
+        self.handlers.sort(key=lambda h: h.order)
+
+    def unregister(self, name: str):
+        self.handlers = [h for h in self.handlers if h.name != name]
+
+    def get_handler(self, name: str) -> Optional[MessageHandler]:
+        for h in self.handlers:
+            if h.name == name:
+                return h
+        return None
+
+    async def dispatch(self, message: discord.Message):
+        mctx = MessageContext(self.client, message)
+        if message.guild is not None:
+            mctx.guild_config = await self.client.get_guild_config(message.guild.id)
+
+        for handler in self.handlers:
+            if mctx.stopped:
+                break
+            if not handler.wants(mctx):
+                continue
+            if handler.background:
+                self.client.loop.create_task(self._run(handler, mctx))
+            else:
+                await self._run(handler, mctx)
+        return mctx
+
+    async def _run(self, handler: MessageHandler, mctx: MessageContext):
+        was_stopped = mctx.stopped
+        start = time.perf_counter()
+        try:
+            await handler.callback(mctx.message, mctx)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            handler.errors += 1
+            try:
+                await self.client.on_error(f"on_message ({handler.name})", mctx.message)
+            except Exception:
+                pass
+        finally:
+            elapsed = time.perf_counter() - start
+            handler.calls += 1
+            handler.total_time += elapsed
+            handler.max_time = max(handler.max_time, elapsed)
+            if mctx.stopped and not was_stopped:
+                handler.stops += 1
+
+    def stats(self) -> dict:
+        return {
+            h.name: {
+                "order": h.order,
+                "calls": h.calls,
+                "errors": h.errors,
+                "stops": h.stops,
+                "avg_ms": round(h.total_time / h.calls * 1000, 3) if h.calls else 0,
+                "max_ms": round(h.max_time * 1000, 3),
+                "total_ms": round(h.total_time * 1000, 1),
+            } for h in self.handlers
+        }
@@ -0,0 +1,64 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from bisect import bisect_left
+from typing import Sequence
+
+# upper bounds of the buckets in milliseconds, anything slower goes in the last "inf" bucket
+DEFAULT_BUCKETS_MS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+
+class Histogram:
+    # fixed buckets, so recording is a bisect and an increment no matter how many samples there are
+    def __init__(self, buckets_ms: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.total_ms = 0
+        self.max_ms = 0
+
+    def record(self, seconds: float):
+        ms = seconds * 1000
+        self.counts[bisect_left(self.buckets_ms, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, p: float) -> float:
+        # the upper bound of the bucket the p-th percentile falls in
+        if not self.count:
+            return 0
+        wanted = self.count * p / 100
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= wanted:
+                return self.buckets_ms[i] if i < len(self.buckets_ms) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 4) if self.count else 0,
+            "max_ms": round(self.max_ms, 4),
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "buckets": {
+                **{f"<={b}ms": n for b, n in zip(self.buckets_ms, self.counts)},
+                "inf": self.counts[-1],
+            },
+        }
@@ -0,0 +1,172 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import time
+
+from copy import deepcopy
+from pymongo import UpdateOne
+from typing import Optional
+from config import DEFAULT_AUTOMOD_CONFIG
+
+# every document remembers how many of its collection's migrations it already went through
+SCHEMA_FIELD = "_schema"
+
+
+def default_guild_config(guild_id: int) -> dict:
+    return {
+        "_id": guild_id,
+        "disabled_cmds": [],
+        "disabled_channels": [],
+        "disabled_categories": [],
+        "custom_cmds": [],
+        "welcome": {"channel_id": None, "message": None, "embed": False},
+        "leave": {"channel_id": None, "message": None, "embed": False},
+        "autorole": {"humans": [], "bots": [], "all": []},
+        "nqn": False,
+        "leveling": {"enabled": False, "channel_id": None, "message": None, " roles": {}},
+        "autoposting": [],
+        "youtube": {"channel_id": None, "youtube_id": None, "message": None},
+        "twitch": {"channel_id": None, "username": None, "message": None, "currently_live": False},
+        "starboard": {"enabled": False, "star_count": 3, "channel_id": None},
+        "logging": None,
+        "chatbot": None,
+        "automod": deepcopy(DEFAULT_AUTOMOD_CONFIG),
+        "ghost_ping": False,
+        "bump_reminders": False,
+        "antialts": False,
+        "globalchat": False,
+        "counting": None,
+        "antihoisting": False,
+        "tickets": {"message_id": None, "channel": None, "roles": []},
+        "counters": {"members": None, "huamns": None, "bots": None, "channels": None, "categories": None, "roles": None, "emojis": None}
+    }
+
+
+def default_user_profile(user_id: int) -> dict:
+    return {
+        "_id": user_id,
+        "description": "A very cool EpicBot user!",
+        "badges": ['normie'],
+        "cmds_used": 0,
+        "bugs_reported": 0,
+        "suggestions_submitted": 0,
+        "rating": 0,
+        "rank_card_template": "default",
+
+        "times_thanked": 0,
+        "times_simped": 0,
+        "snipe": True,
+
+        "gc_nick": None,
+        "gc_avatar": None,
+        "gc_rules_accepted": False,
+
+        "bites": 0,
+        "cuddles": 0,
+        "winks": 0,
+        "hugs": 0,
+        "kisses": 0,
+        "pats": 0,
+        "slaps": 0,
+        "tickles": 0,
+        "licks": 0,
+        "feeds": 0,
+        "facepalms": 0,
+        "blushes": 0,
+        "tail_wags": 0,
+        "cries": 0,
+
+        "married_to": None,
+        "married_at": None
+    }
+
+
+def fill_defaults(default_factory):
+    # adds every key the document is missing, with its default value
+    def migrate(doc: dict) -> dict:
+        return {k: v for k, v in default_factory(doc['_id']).items() if k not in doc}
+    return migrate
+
+
+def prefix_to_list(doc: dict) -> dict:
+    # really old prefix documents have a single string instead of a list
+    if 'prefix' not in doc:
+        return {"prefix": ["e!"]}
+    if isinstance(doc['prefix'], str):
+        return {"prefix": [doc['prefix']]}
+    return {}
+
+
+# collection -> its migrations in order. a migration gets the document and returns the fields to $set.
+# never change or remove one that already ran, add a new one at the end instead.
+MIGRATIONS = {
+    "serverconfig": [fill_defaults(default_guild_config)],
+    "user_profile": [fill_defaults(default_user_profile)],
+    "prefixes": [prefix_to_list],
+}
+
+
+def schema_version(name: str) -> int:
+    return len(MIGRATIONS[name])
+
+
+def stamp(name: str, doc: dict) -> dict:
+    # for documents the bot creates itself, they're born at the current version
+    doc[SCHEMA_FIELD] = schema_version(name)
+    return doc
+
+
+def upgrade(name: str, doc: dict) -> dict:
+    # runs the migrations `doc` is missing on it in place, returns the fields they changed ({} if it was up to date)
+    migrations = MIGRATIONS[name]
+    version = len(migrations)
+    if doc.get(SCHEMA_FIELD, 0) >= version:
+        return {}
+    changes = {}
+    for migration in migrations[doc.get(SCHEMA_FIELD, 0):]:
+        update = migration(doc)
+        doc.update(update)
+        changes.update(update)
+    changes[SCHEMA_FIELD] = doc[SCHEMA_FIELD] = version
+    return changes
+
+
+async def migrate_collection(collection, name: str, partition: Optional[dict] = None, batch_size: int = 500) -> int:
+    # brings every document of the collection (or of `partition`, a filter) up to the current schema,
+    # `batch_size` at a time. each batch is written before the next one is read and only documents
+    # behind the current version are queried, so if this dies halfway the next start just carries on from there.
+    version = schema_version(name)
+    # without it finding what's left to migrate is a scan of the whole collection on every start
+    await collection.create_index(SCHEMA_FIELD)
+    query = {"$or": [{SCHEMA_FIELD: {"$exists": False}}, {SCHEMA_FIELD: {"$lt": version}}], **(partition or {})}
+
+    start = time.perf_counter()
+    migrated = 0
+    batch = []
+    async for doc in collection.find(query).sort("_id", 1).batch_size(batch_size):
+        changes = upgrade(name, doc)
+        batch.append(UpdateOne({"_id": doc['_id']}, {"$set": changes}))
+        if len(batch) >= batch_size:
+            await collection.bulk_write(batch, ordered=False)
+            migrated += len(batch)
+            batch = []
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        migrated += len(batch)
+
+    if migrated:
+        print(f"Migrated {migrated} {name} documents to schema v{version} in {round(time.perf_counter() - start, 2)}s")
+    return migrated
@@ -0,0 +1,49 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import re
+
+from typing import Iterable, Optional
+
+
+class PrefixMatcher:
+    # the compiled prefix regex of one guild, built when the prefixes change instead of on every message.
+    # most messages aren't commands, so anything that doesn't start with the first character
+    # of one of the prefixes is thrown out before the regex even runs.
+    # case works like it always did (re.I), "E!help" is a command when the prefix is "e!".
+    def __init__(self, prefixes: Iterable[str]):
+        self.prefixes = list(prefixes)
+        # an empty prefix makes every message a command, it's only the answer when no real prefix is there
+        self.allow_empty = "" in self.prefixes
+        prefixes = [p for p in self.prefixes if p]
+        # the ascii characters a message can start with, worked out by re itself since re.I
+        # also lets a few non ascii characters through ("ſ" for "s", the kelvin sign for "k").
+        # messages starting with anything else that isn't ascii just go to the regex.
+        self.first_chars = {
+            c for c in map(chr, range(128))
+            if any(re.match(re.escape(p[0]), c, flags=re.I) for p in prefixes)
+        }
+        self.regex = re.compile(
+            "^(" + "|".join(re.escape(p) for p in prefixes) + ").*", flags=re.I
+        ) if prefixes else None
+
+    def match(self, content: str) -> Optional[str]:
+        first = content[:1]
+        if self.regex is not None and (first in self.first_chars or not first.isascii()):
+            match = self.regex.match(content)
+            if match is not None:
+                return match.group(1)
+        return "" if self.allow_empty else None
@@ -0,0 +1,195 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import bson
+import time
+import weakref
+
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+from utils.coalesce import Coalescer
+from utils.write_behind import DirtyTracker
+
+
+class Profile(dict):
+    # a plain dict can't be weakly referenced, see ProfileCache.released
+    __slots__ = ("__weakref__",)
+
+
+class ProfileCache:
+    # user profiles, fetched from the db the first time they're needed instead of all of them at boot.
+    # it's an LRU: profiles nobody used for `ttl` seconds, or the oldest ones once we're over
+    # `max_items` / `max_bytes`, get dropped. dropped profiles wait in `evicted` until the next
+    # flush has written whatever changed in them, so nothing is lost when one gets evicted.
+    # after that they're only weakly referenced in `released`: a cog that still holds one (across
+    # a view wait or so) keeps it alive, its changes keep getting flushed and get() hands that
+    # same dict back instead of loading a second copy from the db.
+    # `fetch(user_id)` loads a profile, None if there isn't one yet.
+    def __init__(
+        self, fetch: Callable[[int], Awaitable[Optional[dict]]], tracker: DirtyTracker, fields: Callable, default_factory: Callable,
+        max_items: int = 20000, max_bytes: int = 32 * 1024 * 1024, ttl: int = 1800,
+        upgrade: Optional[Callable] = None
+    ):
+        self.fetch = fetch
+        self.tracker = tracker
+        self.fields = fields
+        self.default_factory = default_factory
+        self.upgrade = upgrade  # brings a document from the db up to the current schema, returns what it changed
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self.entries = OrderedDict()  # user_id -> [profile, last used, size]
+        self.evicted = {}
+        self.released = weakref.WeakValueDictionary()
+        self.loads = Coalescer()
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.created = 0
+        self.evictions = 0
+        self.expired = 0
+        self.written_back = 0
+
+    async def get(self, user_id: int) -> dict:
+        entry = self.entries.get(user_id)
+        if entry is not None:
+            if time.monotonic() - entry[1] < self.ttl:
+                entry[1] = time.monotonic()
+                self.entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.expired += 1
+            self._evict(user_id)
+
+        # evicted but not written yet (or written and still held somewhere), this is still the newest version of it
+        doc = self.evicted.pop(user_id, None)
+        if doc is None:
+            doc = self.released.pop(user_id, None)
+        if doc is not None:
+            self.hits += 1
+            self._store(user_id, doc)
+            return doc
+
+        return await self.loads.run(user_id, lambda: self._load(user_id))
+
+    async def _load(self, user_id: int) -> dict:
+        doc = await self.fetch(user_id)
+        if doc is None:
+            # not seeded, so the next flush writes the whole thing
+            doc = Profile(self.default_factory(user_id))
+            self.created += 1
+        else:
+            doc = Profile(doc)
+            # it might be behind the current schema (written after the boot migration by something older),
+            # what the migrations changed isn't seeded so the next flush writes the migrated version
+            changed = self.upgrade(doc) if self.upgrade is not None else {}
+            self.tracker.seed(user_id, {k: v for k, v in self.fields(doc).items() if k not in changed})
+        # someone could have put it back from `evicted` while we were waiting on the db
+        entry = self.entries.get(user_id)
+        if entry is not None:
+            return entry[0]
+        held = self.released.pop(user_id, None)
+        if held is not None:
+            self._store(user_id, held)
+            return held
+        self._store(user_id, doc)
+        return doc
+
+    def _store(self, user_id: int, doc: dict):
+        size = len(bson.encode(doc))
+        self.entries[user_id] = [doc, time.monotonic(), size]
+        self.total_bytes += size
+        while len(self.entries) > self.max_items or (self.total_bytes > self.max_bytes and len(self.entries) > 1):
+            self._evict(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _evict(self, user_id: int):
+        entry = self.entries.pop(user_id, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
+            self.evicted[user_id] = entry[0]
+
+    def expire(self):
+        now = time.monotonic()
+        for user_id in [k for k, e in self.entries.items() if now - e[1] >= self.ttl]:
+            self.expired += 1
+            self._evict(user_id)
+
+    def peek(self, user_id: int):
+        # the cached profile without loading it or counting as a use
+        entry = self.entries.get(user_id)
+        if entry is not None:
+            return entry[0]
+        doc = self.evicted.get(user_id)
+        if doc is not None:
+            return doc
+        return self.released.get(user_id)
+
+    def warm(self, docs):
+        # fills the cache with profiles that didn't come from the db (the startup snapshot)
+        for doc in docs:
+            self._store(doc['_id'], Profile(doc))
+
+    def snapshot_docs(self) -> list:
+        return [entry[0] for entry in self.entries.values()] + list(self.evicted.values()) + list(self.released.values())
+
+    def to_flush(self) -> dict:
+        # everything the flush loop has to look at: what's cached plus what's waiting to be written back
+        self.expire()
+        docs = {user_id: entry[0] for user_id, entry in self.entries.items()}
+        docs.update(self.released.items())
+        docs.update(self.evicted)
+        return docs
+
+    def flushed(self, docs: dict):
+        # call this after `docs` (from to_flush) were written, the evicted ones can go for good now
+        for user_id, doc in docs.items():
+            if self.evicted.get(user_id) is doc:
+                del self.evicted[user_id]
+                self.released[user_id] = doc
+                # the tracker keeps its snapshot until nobody holds the dict anymore
+                weakref.finalize(doc, self._gone, user_id)
+                self.written_back += 1
+
+    def _gone(self, user_id: int):
+        if user_id not in self.entries and user_id not in self.evicted and user_id not in self.released:
+            self.tracker.forget(user_id)
+
+    @property
+    def misses(self) -> int:
+        return self.loads.started
+
+    @property
+    def coalesced(self) -> int:
+        return self.loads.joined
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "items": len(self.entries),
+            "bytes": self.total_bytes,
+            "waiting_write_back": len(self.evicted),
+            "held_after_write_back": len(self.released),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "created": self.created,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "written_back": self.written_back,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0,
+        }
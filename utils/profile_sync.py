@@ -0,0 +1,238 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import copy
+import itertools
+import time
+
+from typing import Awaitable, Callable, Iterable, Optional
+from utils.profile_cache import ProfileCache
+from utils.write_behind import DirtyTracker
+
+
+class ProfileSync:
+    # user profiles aren't tied to a guild, so with several clusters the same user shows up on more than one.
+    # every profile belongs to one cluster (user_id % cluster_count, like EpicBot.owns_user) and only that
+    # one caches the real thing, journals it and flushes it to the db. the others keep a mirror they got
+    # from the owner and send it whatever they change in it: counters as how much they went up, so two
+    # clusters counting at the same time both count, everything else as its new value. the owner tells
+    # every other cluster what changed in its profiles so the mirrors don't go stale.
+    def __init__(
+        self, owned: ProfileCache, cluster_id: int, cluster_count: int, counters: Iterable[str],
+        db_fetch: Callable[[int], Awaitable[Optional[dict]]], mark: Callable,
+        delay: float = 0.1, timeout: float = 2, **cache_options
+    ):
+        self.owned = owned
+        self.cluster_id = cluster_id
+        self.cluster_count = cluster_count
+        self.counters = set(counters)
+        self.db_fetch = db_fetch
+        self.mark_owned = mark  # journal.mark for the owned profiles, that's also what tells the others
+        self.delay = delay
+        self.timeout = timeout
+        self.fields = owned.fields
+        self.default_factory = owned.default_factory
+        self.mirrors = ProfileCache(
+            self.fetch, DirtyTracker("user_profile_mirrors"), owned.fields, owned.default_factory,
+            upgrade=owned.upgrade, **cache_options
+        )
+        self.ipc = None  # set once the bot has its ClusterClient
+
+        self.marked = {}  # user_id -> fields changed since the last sync, None for all of them
+        self.outbox = {}  # owner -> [[batch id, changes]] not acknowledged yet, sent in order
+        self.applied = {}  # cluster -> id of the last batch we applied from it
+        # ids have to keep going up across restarts, the owner skips anything it already applied
+        self.batch_ids = itertools.count(time.time_ns())
+        self.send_lock = asyncio.Lock()
+        self.update_locks = {}  # cluster -> lock, a batch sent again waits for the first try to finish
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+        self.fetched = 0
+        self.fetched_from_db = 0
+        self.forwarded = 0
+        self.received = 0
+        self.duplicates = 0
+        self.broadcasts = 0
+        self.refreshed = 0
+
+    def owner(self, user_id: int) -> int:
+        return user_id % self.cluster_count
+
+    async def get(self, user_id: int) -> dict:
+        if self.owner(user_id) == self.cluster_id:
+            return await self.owned.get(user_id)
+        return await self.mirrors.get(user_id)
+
+    def peek(self, user_id: int):
+        if self.owner(user_id) == self.cluster_id:
+            return self.owned.peek(user_id)
+        return self.mirrors.peek(user_id)
+
+    async def fetch(self, user_id: int) -> dict:
+        # the mirrors' loader: the owner's version, or what the db has while the owner doesn't answer
+        if self.ipc is not None:
+            replies = await self.ipc.request("profile_get", user_id, timeout=self.timeout, to=self.owner(user_id))
+            if replies and replies[0] is not None:
+                self.fetched += 1
+                return replies[0]
+        self.fetched_from_db += 1
+        doc = await self.db_fetch(user_id)
+        # a new profile is seeded as the defaults, so its counters go to the owner as how much they went up
+        return doc if doc is not None else self.default_factory(user_id)
+
+    def mark(self, user_id: int, fields):
+        # the journal's on_mark for user_profile
+        marked = self.marked.get(user_id, set())
+        if marked is not None:
+            self.marked[user_id] = set(fields) | marked if fields else None
+        if self.task is None:
+            self.task = asyncio.ensure_future(self._run())
+        self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self.wakeup.wait()
+            # whatever else changes in the meantime goes out with it
+            await asyncio.sleep(self.delay)
+            self.wakeup.clear()
+            try:
+                await self.sync()
+            except Exception as e:
+                print(f"Couldn't sync user profiles with the other clusters: {e}")
+
+    async def sync(self):
+        marked, self.marked = self.marked, {}
+        changed = []
+        mirrored = {}
+        for user_id, fields in marked.items():
+            if self.owner(user_id) == self.cluster_id:
+                doc = self.owned.peek(user_id)
+                if doc is None:
+                    continue
+                values = self.fields(doc)
+                if fields is not None:
+                    values = {k: values[k] for k in fields if k in values}
+                changed.append({"_id": user_id, "set": values})
+            else:
+                doc = self.mirrors.peek(user_id)
+                if doc is not None:
+                    mirrored[user_id] = doc
+        if changed and self.ipc is not None:
+            self.ipc.send("profile_changed", changed)
+            self.broadcasts += 1
+        if mirrored:
+            await self.forward(mirrored)
+
+    async def forward(self, docs: dict):
+        # sends what changed in these mirrors to their owners. the flush loop calls this with every
+        # mirror, so changes nobody marked get there too, just later.
+        tracker = self.mirrors.tracker
+        tracker.start_flush()
+        batches = {}
+        for user_id, doc in docs.items():
+            old = tracker.snapshots.get(user_id, {})
+            update = tracker.diff(user_id, self.fields(doc))
+            if update is None:
+                continue
+            change = {"_id": user_id, "set": {}, "inc": {}}
+            for k, v in update["$set"].items():
+                before = old.get(k, 0)
+                if k in self.counters and isinstance(v, int) and isinstance(before, int):
+                    if v != before:
+                        change['inc'][k] = v - before
+                else:
+                    change['set'][k] = copy.deepcopy(v)
+            batches.setdefault(self.owner(user_id), []).append(change)
+        # the outbox keeps them until the owner has them, so the mirrors are clean from here on
+        tracker.end_flush()
+        for owner, changes in batches.items():
+            self.outbox.setdefault(owner, []).append([next(self.batch_ids), changes])
+            self.forwarded += len(changes)
+        await self.send_outbox()
+
+    async def send_outbox(self):
+        if self.ipc is None:
+            return
+        async with self.send_lock:
+            for owner, batches in list(self.outbox.items()):
+                while batches:
+                    batch_id, changes = batches[0]
+                    replies = await self.ipc.request(
+                        "profile_update", {"cluster": self.cluster_id, "id": batch_id, "changes": changes},
+                        timeout=self.timeout, to=owner
+                    )
+                    if not replies or not replies[0]:
+                        break  # the owner is down or restarting, the next sync tries again
+                    batches.pop(0)
+
+    async def on_get(self, user_id: int) -> dict:
+        # "profile_get" from a cluster that needs one of our profiles
+        doc = await self.owned.get(user_id)
+        return {"_id": user_id, **self.fields(doc)}
+
+    async def on_update(self, data: dict) -> bool:
+        # "profile_update": what a cluster changed in its mirrors of our profiles. a batch that timed out
+        # on their end is sent again, it's only applied once.
+        async with self.update_locks.setdefault(data['cluster'], asyncio.Lock()):
+            last = self.applied.get(data['cluster'])
+            if last is not None and data['id'] <= last:
+                self.duplicates += 1
+                return True
+            # everything loaded first, if the db fails halfway none of it is applied and they send it again
+            changes = [c for c in data['changes'] if self.owner(c['_id']) == self.cluster_id]
+            docs = [await self.owned.get(c['_id']) for c in changes]
+            for change, doc in zip(changes, docs):
+                doc.update(change['set'])
+                for k, delta in change['inc'].items():
+                    doc[k] = doc.get(k, 0) + delta
+                self.mark_owned(change['_id'], *change['set'], *change['inc'])
+            self.applied[data['cluster']] = data['id']
+            self.received += len(changes)
+            return True
+
+    def on_changed(self, changes: list):
+        # "profile_changed" from an owner, the mirrors we have of those profiles catch up
+        tracker = self.mirrors.tracker
+        for change in changes:
+            doc = self.mirrors.peek(change['_id'])
+            if doc is None:
+                continue
+            old = tracker.snapshots.setdefault(change['_id'], {})
+            for k, v in change['set'].items():
+                before = old.get(k, 0)
+                if k in self.counters and isinstance(v, int) and isinstance(before, int) and isinstance(doc.get(k), int):
+                    # keeps whatever we counted that isn't at the owner yet
+                    doc[k] = v + doc[k] - before
+                elif k not in old or doc.get(k) == old[k]:
+                    doc[k] = copy.deepcopy(v)
+                # else we changed it ourselves since the last sync, ours goes to the owner next
+                old[k] = copy.deepcopy(v)
+            self.refreshed += 1
+
+    def stats(self) -> dict:
+        return {
+            "mirrors": len(self.mirrors.entries),
+            "fetched": self.fetched,
+            "fetched_from_db": self.fetched_from_db,
+            "forwarded": self.forwarded,
+            "unacknowledged": sum(len(changes) for batches in self.outbox.values() for _, changes in batches),
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "broadcasts": self.broadcasts,
+            "refreshed": self.refreshed,
+        }
@@ -0,0 +1,435 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from PIL import Image, ImageDraw, ImageFont
+
+
+rank_card_templates = {
+    "default": {
+        "owner": 529995365714231327,
+        "description": "The default rank card!",
+
+        "avatar_resize": 162,
+        "avatar_xy": (30, 30),
+
+        "progress_bar_width": 485,
+        "progress_bar_height": 18,
+        "progress_bar_start_x": 210,
+        "progress_bar_start_y": 146,
+        "progress_bar_color": (169, 197, 255),
+
+        "username_x": 225,
+        "username_y": 90,
+        "username_font": ("assets/fonts/arial-rounded-mt-bold.ttf", 30),
+
+        "rank_xy": (540, 25),
+        "level_xy": (680, 25),
+        "xp_xy": (550, 100),
+        "no_xp_text": False,
+
+        "rank_and_level_font": ("assets/fonts/berlin-sans.ttf", 30),
+        "xp_font": ("assets/fonts/berlin-sans.ttf", 24)
+    },
+    "awish": {
+        "owner": 671355502399193128,
+        "description": "Rank card made by Aw||oo||sh.",
+
+        "avatar_resize": 110,
+        "avatar_xy": (222, 35),
+
+        "progress_bar_width": 480,
+        "progress_bar_height": 5,
+        "progress_bar_start_x": 170,
+        "progress_bar_start_y": 165,
+        "progress_bar_color": (55, 152, 255),
+
+        "username_x": 350,
+        "username_y": 50,
+        "username_font": ("assets/fonts/red-hat-display-bold.ttf", 30),
+
+        "rank_xy": (105, 112),
+        "level_xy": (105, 25),
+        "xp_xy": (425, 104),
+        "no_xp_text": True,
+
+        "rank_and_level_font": ("assets/fonts/red-hat-display-bold.ttf", 30),
+        "xp_font": ("assets/fonts/red-hat-display-bold.ttf", 27)
+    },
+    "arto": {
+        "owner": 729765852030828674,
+        "description": "A Rank card by Arto",
+
+        "avatar_resize": 94,
+        "avatar_xy": (31, 51),
+
+        "progress_bar_width": 195,
+        "progress_bar_height": 28,
+        "progress_bar_start_x": 132,
+        "progress_bar_start_y": 147,
+        "progress_bar_color": (0, 0, 0),
+
+        "username_x": 255,
+        "username_y": 35,
+        "username_font": ("assets/fonts/gotham_bold.ttf", 17),
+        "username_color": (78, 79, 81),
+
+        "level_xy": (305, 122),
+        "level_color": (78, 79, 81),
+        "xp_xy": (440, 160),
+        "xp_color": (0, 0, 0),
+        "no_xp_text": True,
+
+        "rank_and_level_font": ("assets/fonts/gotham_bold.ttf", 17),
+        "xp_font": ("assets/fonts/gotham_bold.ttf", 17)
+    },
+    "yummy": {
+        "owner": 529995365714231327,
+        "description": "something yummy i did <:poglep_triggered:845559288503992330>",
+
+        "avatar_resize": 164,
+        "avatar_xy": (39, 29),
+
+        "progress_bar_width": 489,
+        "progress_bar_height": 21,
+        "progress_bar_start_x": 217,
+        "progress_bar_start_y": 145,
+        "progress_bar_color": (255, 255, 255),
+
+        "username_x": 325,
+        "username_y": 25,
+        "username_font": ("assets/fonts/eras-bold-itc.ttf", 40),
+
+        "rank_xy": (370, 100),
+        "level_xy": (660, 100),
+        "xp_xy": (550, 180),
+        "no_xp_text": False,
+
+        "rank_and_level_font": ("assets/fonts/berlin-sans.ttf", 30),
+        "xp_font": ("assets/fonts/berlin-sans.ttf", 20)
+    },
+    "alien": {
+        "owner": 739440618107043901,
+        "description": "alien look rankcard by SylmFox",
+
+        "avatar_resize": 325,
+        "avatar_xy": (1500, 80),
+
+        "progress_bar_width": 1355 - 9 - 786,
+        "progress_bar_height": 436 - 9 - 325,
+        "progress_bar_start_x": 786,
+        "progress_bar_start_y": 325,
+        "progress_bar_color": (30, 213, 195),
+
+        "username_x": 380,
+        "username_y": 100,
+        "username_font": ("assets/fonts/Roboto-Bold.ttf", 70),
+
+        "rank_xy": (1160, 75),
+        "level_xy": (1160, 195),
+        "xp_xy": (325, 350),
+        "no_xp_text": False,
+
+        "rank_and_level_font": ("assets/fonts/Roboto-Bold.ttf", 50),
+        "xp_font": ("assets/fonts/Roboto-Bold.ttf", 55)
+    },
+    "brixk": {
+        "owner": 595490455844683778,
+        "description": "Red rankcard using EpicBot logo colour palette",
+
+        "avatar_resize": 442,
+        "avatar_xy": (158, 140),
+
+        "progress_bar_width": 1359 - 5 - (737 + 5),
+        "progress_bar_height": 575 - 5 - (484 + 5),
+        "progress_bar_start_x": 737 + 5,
+        "progress_bar_start_y": 484 + 5,
+        "progress_bar_color": (145, 28, 37),
+
+        "username_x": 800,
+        "username_y": 400,
+        "username_font": ("assets/fonts/Roboto-Bold.ttf", 65),
+
+        "rank_xy": (1050, 240),
+        "level_xy": (1050, 120),
+        "xp_xy": (1020, 590),
+        "xp_color": (255, 255, 255),
+        "no_xp_text": True,
+
+        "rank_and_level_font": ("assets/fonts/Roboto-Bold.ttf", 50),
+        "xp_font": ("assets/fonts/Roboto-Bold.ttf", 30)
+    },
+    "bloo": {
+        "owner": 729765852030828674,
+        "description": "A blue colored rank-card",
+
+        "avatar_resize": 189 - 58,
+        "avatar_xy": (467, 58),
+
+        "progress_bar_width": 897 - 689 - 10,
+        "progress_bar_height": 181 - 156 - 10,
+        "progress_bar_start_x": 689 + 5,
+        "progress_bar_start_y": 156 + 5,
+        "progress_bar_color": (255, 255, 255),
+
+        "username_x": 120,
+        "username_y": 130,
+        "username_font": ("assets/fonts/Roboto-Bold.ttf", 45),
+
+        "rank_xy": (780, 87),
+        "level_xy": (780, 50),
+        "xp_xy": (725, 125),
+        "no_xp_text": False,
+
+        "rank_and_level_font": ("assets/fonts/Roboto-Bold.ttf", 25),
+        "xp_font": ("assets/fonts/Roboto-Medium.ttf", 20),
+        "xp_color": (255, 255, 255)
+    },
+    "e": {
+        "owner": 835374941095460916,
+        "description": "nice rank card by Qyin :>",
+
+        "avatar_resize": 215 - 70,
+        "avatar_xy": (20, 70),
+
+        "progress_bar_width": 636 - 263 - 4,
+        "progress_bar_height": 137 - 121 - 4,
+        "progress_bar_start_x": 263 + 2,
+        "progress_bar_start_y": 121 + 2,
+        "progress_bar_color": (255, 255, 255),
+
+        "username_x": 400,
+        "username_y": 5,
+        "username_font": ("assets/fonts/consolab.ttf", 30),
+
+        "rank_xy": (355, 155),
+        "level_xy": (355, 185),
+        "xp_xy": (500, 150),
+        "no_xp_text": False,
+
+        "rank_and_level_font": ("assets/fonts/consolab.ttf", 25),
+        "xp_font": ("assets/fonts/consolab.ttf", 17),
+        "xp_color": (255, 255, 255),
+    },
+    "clippy": {
+        "owner": 561863298887450644,
+        "description": "Rankcard by clippy",
+
+        "avatar_resize": 301 - 55,
+        "avatar_xy": (40, 63),
+
+        "progress_bar_width": 913 - 334,
+        "progress_bar_height": 238 - 227,
+        "progress_bar_start_x": 334,
+        "progress_bar_start_y": 227,
+        "progress_bar_color": (61, 45, 149),
+
+        "username_x": 335,
+        "username_y": 150,
+        "username_font": ("assets/fonts/Roboto-Bold.ttf", 55),
+
+        "rank_xy": (750, 15),
+        "level_xy": (870, 15),
+        "xp_xy": (720, 245),
+        "no_xp_text": False,
+
+        "rank_and_level_font": ("assets/fonts/Roboto-Bold.ttf", 25),
+        "xp_font": ("assets/fonts/Roboto-Bold.ttf", 20),
+        "xp_color": (255, 255, 255)
+    }
+}
+
+
+# fonts are (path, size) in the templates and only get loaded the first time they're drawn with
+@lru_cache(maxsize=None)
+def get_font(path: str, size: int):
+    return ImageFont.truetype(path, size=size)
+
+
+# template name -> (decoded base image, circle mask for the avatar)
+# each worker process has its own copy, filled lazily or by warm_up_templates
+template_assets = {}
+
+
+def get_template_assets(template_name):
+    assets = template_assets.get(template_name)
+    if assets is None:
+        t = rank_card_templates[template_name]
+
+        base = Image.open(f"assets/images/rank_cards/{template_name}.png")
+        base.load()
+
+        # mask for circle avatar
+        mask = Image.new("L", (t['avatar_resize'], t['avatar_resize']), 0)
+        draw = ImageDraw.Draw(mask)
+        draw.ellipse((0, 0, t['avatar_resize'], t['avatar_resize']), fill=255)
+
+        assets = template_assets[template_name] = (base, mask)
+    return assets
+
+
+def template_memory_footprint() -> dict:
+    # rough size in bytes of the decoded images we keep around for each loaded template
+    footprint = {}
+    for name, (base, mask) in template_assets.items():
+        footprint[name] = base.width * base.height * len(base.getbands()) + mask.width * mask.height
+    return footprint
+
+
+def worker_footprint() -> tuple:
+    # which worker answered, so the renderer can tell them apart
+    return os.getpid(), template_memory_footprint()
+
+
+def warm_up_templates(template_names=None) -> dict:
+    for name in (template_names or rank_card_templates):
+        t = rank_card_templates[name]
+        get_template_assets(name)
+        for key in ('username_font', 'rank_and_level_font', 'xp_font'):
+            get_font(*t[key])
+    return template_memory_footprint()
+
+
+def render_rank_card(template_name, avatar_bytes, username, rank, lvl, xp_in_level, xp_needed) -> bytes:
+    # runs inside the worker processes, so it only gets plain data and only returns png bytes
+    t = rank_card_templates[template_name]
+    rank_template, mask_img = get_template_assets(template_name)
+
+    username_color = (255, 255, 255) if "username_color" not in t else t['username_color']
+    level_color = (255, 255, 255) if "level_color" not in t else t['level_color']
+    xp_color = (211, 211, 211) if "xp_color" not in t else t['xp_color']
+
+    user_avatar = Image.open(BytesIO(avatar_bytes))
+    user_avatar = user_avatar.resize((t['avatar_resize'], t['avatar_resize']))
+
+    # pasting avatar in image
+    temp_rank = rank_template.copy()
+    temp_rank.paste(user_avatar, t['avatar_xy'], mask_img)
+
+    # progress bar
+    draw2 = ImageDraw.Draw(temp_rank)
+    draw2.rectangle(
+        [
+            (t['progress_bar_start_x'], t['progress_bar_start_y']),
+            (t['progress_bar_start_x'] + (t['progress_bar_width'] * xp_in_level / xp_needed), t['progress_bar_start_y'] + t['progress_bar_height'])
+        ],
+        fill=t['progress_bar_color']
+    )
+
+    # addings text
+    draw2.text((t['username_x'], t['username_y']), username, username_color, font=get_font(*t['username_font']))  # name
+
+    if "rank_xy" in t:
+        draw2.text(t['rank_xy'], f"#{rank}", (255, 255, 255), font=get_font(*t['rank_and_level_font']))  # rank
+    draw2.text(t['level_xy'], str(lvl), level_color, font=get_font(*t['rank_and_level_font']))  # level
+
+    # xp text
+    draw2.text(
+        t['xp_xy'],
+        f"{xp_in_level} / {xp_needed} {'XP' if t['no_xp_text'] == False else ''}",
+        xp_color,
+        font=get_font(*t['xp_font'])
+    )
+
+    output = BytesIO()
+    temp_rank.save(output, format='png')
+    return output.getvalue()
+
+
+class RankCardRenderer:
+    # renders rank cards in a small process pool so PIL doesn't block the event loop,
+    # every card is its own bytes object so two people running rank at once can't swap cards.
+    def __init__(self, max_workers: int = 2, preload=None):
+        self.max_workers = max_workers
+        # every worker decodes the templates once when it starts, not on its first card.
+        # spawned and not forked: by the time the cog loads motor and aiohttp have threads running,
+        # and a forked worker would get a copy of the bot's whole cache for nothing.
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_up_templates,
+            initargs=(preload,)
+        )
+        self.template_footprint = {}  # worker pid -> {template: bytes}
+
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rendered = 0
+        self.failed = 0
+        self.total_latency = 0
+        self.last_latency = 0
+        self.max_latency = 0
+
+    @property
+    def queue_depth(self) -> int:
+        # cards that are waiting for a free worker
+        return max(0, self.in_flight - self.max_workers)
+
+    async def render(self, template_name, avatar_bytes, username, rank, lvl, xp_in_level, xp_needed) -> BytesIO:
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        start = time.perf_counter()
+        try:
+            data = await loop.run_in_executor(
+                self.executor, render_rank_card,
+                template_name, avatar_bytes, username, rank, lvl, xp_in_level, xp_needed
+            )
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        latency = time.perf_counter() - start
+        self.rendered += 1
+        self.total_latency += latency
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        return BytesIO(data)
+
+    async def warm_up(self):
+        # as many jobs as workers at once, so the pool starts all of them (warmed up by the initializer)
+        # right away. which worker runs which job is up to the pool, so the footprint is kept per worker
+        # that answered, not assumed to be the same everywhere.
+        loop = asyncio.get_running_loop()
+        footprints = await asyncio.gather(*[
+            loop.run_in_executor(self.executor, worker_footprint)
+            for _ in range(self.max_workers)
+        ])
+        self.template_footprint = dict(footprints)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_in_flight": self.max_in_flight,
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "avg_latency_ms": round(self.total_latency / self.rendered * 1000, 2) if self.rendered else 0,
+            "last_latency_ms": round(self.last_latency * 1000, 2),
+            "max_latency_ms": round(self.max_latency * 1000, 2),
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
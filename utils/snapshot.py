@@ -0,0 +1,71 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import bson
+import mmap
+import os
+import struct
+import zlib
+
+# file layout: magic, format version, crc32 of the body, length of the body, then the body (one bson document)
+MAGIC = b"EBSNAP"
+FORMAT_VERSION = 1
+HEADER = struct.Struct(">6sHIQ")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def encode_snapshot(payload: dict) -> bytes:
+    body = bson.encode(payload)
+    return HEADER.pack(MAGIC, FORMAT_VERSION, zlib.crc32(body), len(body)) + body
+
+
+def write_snapshot(path: str, data: bytes):
+    # written next to the real file and then renamed over it, so a crash halfway
+    # through leaves the old snapshot instead of half of a new one
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_snapshot(path: str) -> dict:
+    try:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                if len(m) < HEADER.size:
+                    raise SnapshotError("file is too short")
+                magic, version, crc, length = HEADER.unpack_from(m, 0)
+                if magic != MAGIC:
+                    raise SnapshotError("not a snapshot file")
+                if version != FORMAT_VERSION:
+                    raise SnapshotError(f"unknown format version {version}")
+                body = m[HEADER.size:HEADER.size + length]
+    except (OSError, ValueError) as e:
+        raise SnapshotError(str(e)) from e
+
+    if len(body) != length:
+        raise SnapshotError("file is truncated")
+    if zlib.crc32(body) != crc:
+        raise SnapshotError("checksum mismatch")
+    try:
+        return bson.decode(body)
+    except Exception as e:
+        raise SnapshotError(f"couldn't decode the body: {e}") from e
@@ -0,0 +1,86 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import time
+
+from collections import OrderedDict, deque
+from typing import List, Optional, Tuple
+
+
+class SpamTracker:
+    # the recent messages of every (guild, user) pair, so spam checks don't have to
+    # look through the whole message cache. each user keeps at most `max_per_user`
+    # messages, and only `max_users` users are tracked at once (least recently active go first).
+    def __init__(self, window: float = 7, max_per_user: int = 20, max_users: int = 50000):
+        self.window = window
+        self.max_per_user = max_per_user
+        self.max_users = max_users
+        self.buckets = OrderedDict()
+
+        self.evictions = 0
+
+    def add(self, guild_id: int, user_id: int, channel_id: int, message_id: int, created_at: float, now: Optional[float] = None) -> int:
+        # returns how many messages the user sent in this guild within the window
+        now = time.time() if now is None else now
+        key = (guild_id, user_id)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = deque(maxlen=self.max_per_user)
+            if len(self.buckets) > self.max_users:
+                self.buckets.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.buckets.move_to_end(key)
+
+        # edited messages come through on_message again, they shouldn't count twice
+        if not any(e[2] == message_id for e in bucket):
+            bucket.append((created_at, channel_id, message_id))
+        while bucket and now - bucket[0][0] >= self.window:
+            bucket.popleft()
+        return len(bucket)
+
+    def count(self, guild_id: int, user_id: int, now: Optional[float] = None) -> int:
+        bucket = self.buckets.get((guild_id, user_id))
+        if not bucket:
+            return 0
+        now = time.time() if now is None else now
+        while bucket and now - bucket[0][0] >= self.window:
+            bucket.popleft()
+        return len(bucket)
+
+    def pop(self, guild_id: int, user_id: int) -> List[Tuple[int, int]]:
+        # (channel_id, message_id) of everything in the window, and forget about them
+        bucket = self.buckets.pop((guild_id, user_id), None)
+        if not bucket:
+            return []
+        return [(channel_id, message_id) for _, channel_id, message_id in bucket]
+
+    def prune(self, now: Optional[float] = None):
+        # drops users that haven't sent anything within the window
+        now = time.time() if now is None else now
+        for key in list(self.buckets):
+            bucket = self.buckets[key]
+            if not bucket or now - bucket[-1][0] >= self.window:
+                del self.buckets[key]
+
+    def stats(self) -> dict:
+        return {
+            "tracked_users": len(self.buckets),
+            "tracked_messages": sum(len(b) for b in self.buckets.values()),
+            "max_users": self.max_users,
+            "max_per_user": self.max_per_user,
+            "evictions": self.evictions,
+        }
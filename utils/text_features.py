@@ -0,0 +1,86 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import emojis
+import re
+
+from collections import Counter
+
+mention_regex = re.compile(r"<@[!&]?\d+>|@everyone|@here")
+custom_emoji_regex = re.compile(r"<a?:\w+:\d+>")
+
+
+def is_zalgo_mark(c: str) -> bool:
+    # U+0300 - U+033F, the characters that start with the byte 0xCC in utf-8,
+    # which is what the old `%CC%` search on the url encoded message was catching
+    return '̀' <= c <= '̿'
+
+
+class TextFeatures:
+    # everything automod and global chat want to know about a message's content.
+    # the text itself is only walked once (by Counter, in C), the rest is worked out
+    # from the character counts, which are a lot smaller than the text for anything long.
+    __slots__ = (
+        'text', 'lower', 'length', 'upper_count', 'upper_ratio', 'max_char_count',
+        'combining_marks', 'mentions', 'custom_emojis', 'unicode_emojis', 'non_ascii', 'non_ascii_text'
+    )
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lower = text.lower()
+        self.length = len(text)
+
+        counts = Counter(text)
+        upper_count = 0
+        combining_marks = 0
+        lower_counts = Counter()
+        for c, n in counts.items():
+            if c.isupper():
+                upper_count += n
+            elif is_zalgo_mark(c):
+                combining_marks += n
+            low = c.lower()
+            if len(low) == 1:
+                lower_counts[low] += n
+            else:
+                for x in low:
+                    lower_counts[x] += n
+        if 'Σ' in counts:
+            # the only character whose lowercase depends on what's around it (a final sigma becomes ς),
+            # the old code lowered the whole text first so that's what gets counted
+            lower_counts = Counter(self.lower)
+        lower_counts.pop(' ', None)
+
+        self.upper_count = upper_count
+        self.upper_ratio = upper_count / self.length if self.length else 0
+        self.max_char_count = max(lower_counts.values(), default=0)
+        self.combining_marks = combining_marks
+
+        self.mentions = len(mention_regex.findall(text)) if '@' in text else 0
+        self.custom_emojis = len(custom_emoji_regex.findall(text)) if '<' in text else 0
+
+        self.non_ascii = not text.isascii()
+        if self.non_ascii:
+            self.unicode_emojis = emojis.count(text)
+            # non ascii characters that aren't just emojis
+            self.non_ascii_text = not emojis.decode(text).isascii()
+        else:
+            self.unicode_emojis = 0
+            self.non_ascii_text = False
+
+    @property
+    def emoji_count(self) -> int:
+        return self.custom_emojis + self.unicode_emojis
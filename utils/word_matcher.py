@@ -0,0 +1,105 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from collections import deque
+from functools import lru_cache
+from typing import Iterable, Optional
+from config import AUTOMOD_AUTOMATON_MIN_WORDS
+
+
+class WordMatcher:
+    # finds the first banned word in a piece of text.
+    # big word lists get an aho-corasick automaton so the cost is one step per character
+    # no matter how many words there are, small lists just use substring checks
+    # (below `automaton_min_words` a `w in text` loop, which runs in C, beats walking the automaton in python).
+    def __init__(self, words: Iterable[str], automaton_min_words: int = AUTOMOD_AUTOMATON_MIN_WORDS):
+        self.words = [w for w in dict.fromkeys(words) if w]
+        self.use_automaton = len(self.words) >= automaton_min_words
+        if self.use_automaton:
+            self._build()
+
+    def _build(self):
+        goto = [{}]
+        out = [None]
+        for w in self.words:
+            state = 0
+            for ch in w:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append(None)
+                state = nxt
+            if out[state] is None:
+                out[state] = w
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            r = queue.popleft()
+            for ch, state in goto[r].items():
+                queue.append(state)
+                f = fail[r]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[state] = goto[f].get(ch, 0)
+                if out[state] is None:
+                    out[state] = out[fail[state]]
+
+        self.goto = goto
+        self.fail = fail
+        self.out = out
+
+    def find(self, text: str) -> Optional[str]:
+        if not self.use_automaton:
+            for w in self.words:
+                if w in text:
+                    return w
+            return None
+
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state] is not None:
+                return out[state]
+        return None
+
+    def __contains__(self, text: str) -> bool:
+        return self.find(text) is not None
+
+    def __len__(self):
+        return len(self.words)
+
+
+@lru_cache(maxsize=1024)
+def compile_words(words: tuple) -> WordMatcher:
+    # most guilds end up with the exact same list, so they share one matcher
+    return WordMatcher(words)
+
+
+def make_stripper(chars: Iterable[str]):
+    # one str.translate call instead of a str.replace for every separator
+    table = {ord(c): None for c in chars}
+
+    def strip(text: str) -> str:
+        return text.translate(table)
+    return strip
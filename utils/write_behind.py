@@ -0,0 +1,99 @@
+"""
+Copyright 2021 Nirlep_5252_
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import copy
+import time
+
+
+class DirtyTracker:
+    # remembers what was last written for every cached document, so the db flush loops
+    # only send the documents (and fields) that actually changed since the last flush.
+    # cogs mutate the cached dicts in place all over the place, so instead of hooking
+    # every mutation we diff against a private copy of the last written values.
+    # counters get a $set of their new value too, not an $inc: a bulk_write that partly went
+    # through is retried on the next flush, and that has to be safe to apply twice.
+    def __init__(self, name: str):
+        self.name = name
+        self.snapshots = {}
+        self.pending = {}
+
+        self.last_flush_size = 0
+        self.last_flush_duration = 0
+        self.last_dirty_count = 0
+        self.last_scanned_count = 0
+        self.total_written = 0
+        self._flush_started = 0
+
+    def seed(self, key, fields: dict):
+        # call this for documents that came straight from the db, they're already up to date
+        self.snapshots[key] = copy.deepcopy(fields)
+
+    def forget(self, key):
+        self.snapshots.pop(key, None)
+        self.pending.pop(key, None)
+
+    def clear(self):
+        self.snapshots.clear()
+        self.pending.clear()
+
+    def is_dirty(self, key, fields: dict) -> bool:
+        # same question as diff() without touching the flush state
+        old = self.snapshots.get(key)
+        if old is None:
+            return True
+        return any(k not in old or old[k] != v for k, v in fields.items())
+
+    def start_flush(self):
+        self.pending = {}
+        self.last_scanned_count = 0
+        self._flush_started = time.perf_counter()
+
+    def diff(self, key, fields: dict):
+        # returns the mongo update document for `fields`, or None if nothing changed
+        self.last_scanned_count += 1
+        old = self.snapshots.get(key)
+        if old is None:
+            self.pending[key] = copy.deepcopy(fields)
+            return {"$set": fields}
+
+        to_set = {k: v for k, v in fields.items() if k not in old or old[k] != v}
+        if not to_set:
+            return None
+        self.pending[key] = copy.deepcopy(to_set)
+        return {"$set": to_set}
+
+    def end_flush(self, success: bool = True):
+        # only move the snapshots forward once the bulk write actually went through,
+        # otherwise the next flush will just diff against the old values and retry
+        if success:
+            for key, fields in self.pending.items():
+                self.snapshots.setdefault(key, {}).update(fields)
+            self.total_written += len(self.pending)
+        self.last_dirty_count = len(self.pending)
+        self.last_flush_size = len(self.pending) if success else 0
+        self.last_flush_duration = time.perf_counter() - self._flush_started
+        self.pending = {}
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "tracked": len(self.snapshots),
+            "scanned": self.last_scanned_count,
+            "dirty": self.last_dirty_count,
+            "flush_size": self.last_flush_size,
+            "flush_duration_ms": round(self.last_flush_duration * 1000, 2),
+            "total_written": self.total_written,
+        }